@@ -0,0 +1,216 @@
+"""The asyncio (grpc.aio) implementation of the route guide server.
+
+Every RPC runs as a coroutine or async generator on one event loop, so
+long-lived RecordRoute and RouteChat streams do not hold a thread each and
+cannot starve GetFeature the way they exhaust the ThreadPoolExecutor of
+route_guide_server.serve().
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import time
+
+import grpc
+
+import route_guide_pb2
+import route_guide_pb2_grpc
+import route_guide_cache
+import route_guide_distance
+import route_guide_notes
+import route_guide_server
+
+
+class RouteGuideServicer(route_guide_server.RouteGuideServicer):
+    """Provides asyncio methods that implement the route guide server."""
+
+    async def GetFeature(self, request, context):
+        feature = self.find_feature(request)
+        if feature is None:
+            return route_guide_pb2.Feature(name="", location=request)
+        else:
+            return feature
+
+    async def CachedGetFeature(self, request, context):
+        return self.cached_feature(request)
+
+    async def ListFeatures(self, request, context):
+        left, right, bottom, top = route_guide_server.rectangle_bounds(
+            request)
+        database = self.database
+        for row in database.index.query(left, right, bottom, top):
+            yield database.db[row]
+
+    async def CachedListFeatures(self, request, context):
+        for response in self.cached_features(request):
+            yield response
+
+    async def RecordRoute(self, request_iterator, context):
+        point_count = 0
+        feature_count = 0
+        distance = route_guide_distance.RouteDistance()
+        index = self.database.index
+
+        start_time = time.time()
+        async for point in request_iterator:
+            point_count += 1
+            if index.lookup(point.latitude, point.longitude) is not None:
+                feature_count += 1
+            distance.add(point.latitude, point.longitude)
+
+        elapsed_time = time.time() - start_time
+        return route_guide_pb2.RouteSummary(
+            point_count=point_count,
+            feature_count=feature_count,
+            distance=int(distance.total()),
+            elapsed_time=int(elapsed_time))
+
+    async def GetFeatures(self, request, context):
+        return self.find_features(request.points)
+
+    async def StreamFeatures(self, request_iterator, context):
+        database = self.database
+        async for request in request_iterator:
+            yield self.find_features(request.points, database)
+
+    async def GetNearestFeature(self, request, context):
+        nearby = self.find_nearest(request).features
+        return nearby[0] if nearby else route_guide_pb2.NearbyFeature()
+
+    async def ListNearestFeatures(self, request, context):
+        if request.k < 0 or request.max_distance < 0:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                "negative k or max_distance")
+        return self.find_nearest(request.point, request.k or 1,
+                                 request.max_distance or None)
+
+    async def ListFeaturePages(self, request, context):
+        if request.page_size < 0 or request.max_results < 0:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                "negative page_size or max_results")
+        database = self.database
+        try:
+            start = route_guide_server.page_start(database,
+                                                  request.page_token)
+        except ValueError:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                "invalid page token")
+        except LookupError:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION,
+                                "the database was reloaded; list again")
+        # Each yield waits until the page has been written, so a slow
+        # client delays only its own stream.
+        for page in self.feature_pages(request, start, database):
+            yield page
+
+    async def RouteChat(self, request_iterator, context):
+        if self.note_store is not None:
+            notes = self._shared_route_chat(request_iterator, context)
+        else:
+            notes = self._route_chat(request_iterator, context)
+        async for note in notes:
+            yield note
+
+    async def _route_chat(self, request_iterator, context):
+        notes = route_guide_notes.NoteIndex(self.chat_max_notes,
+                                            self.chat_max_age)
+        async for new_note in request_iterator:
+            for prev_note in notes.notes_at(new_note.location):
+                yield prev_note
+            notes.add(new_note)
+
+    async def _shared_route_chat(self, request_iterator, context):
+        # Every stream runs on the event loop thread, so other streams can
+        # deliver straight into this one's asyncio.Queue.
+        outbox = asyncio.Queue(maxsize=route_guide_notes.OUTBOX_SIZE)
+        end_of_requests = object()
+        stopped = asyncio.Event()
+        dropped = [0]
+
+        def deliver(note):
+            # Other streams must not wait for this one; a stream too slow
+            # to keep up loses the notes pushed to it.
+            try:
+                outbox.put_nowait(note)
+            except asyncio.QueueFull:
+                dropped[0] += 1
+
+        subscription = self.note_store.subscribe(deliver)
+
+        async def read_requests():
+            # The notes of this stream's own requests wait for room instead.
+            try:
+                async for new_note in request_iterator:
+                    for prev_note in subscription.publish(new_note):
+                        await outbox.put(prev_note)
+            finally:
+                if not stopped.is_set():
+                    await outbox.put(end_of_requests)
+
+        reader = asyncio.ensure_future(read_requests())
+        try:
+            while True:
+                note = await outbox.get()
+                if note is end_of_requests:
+                    break
+                yield note
+        finally:
+            stopped.set()
+            reader.cancel()
+            subscription.close()
+            if dropped[0]:
+                logging.warning("RouteChat stream fell behind and dropped "
+                                "%d notes", dropped[0])
+
+
+async def serve(db_path="route_guide_db.json", port=50051,
+                shared_notes=False, reload_interval=None, cache_bytes=0,
+                grace=route_guide_server._SHUTDOWN_GRACE):
+    """Serves the route guide until SIGINT or SIGTERM.
+
+    RPCs in flight are then given grace seconds to finish.
+    """
+    note_store = route_guide_notes.SharedNoteStore() if shared_notes else None
+    cache = (route_guide_cache.ResponseCache(cache_bytes) if cache_bytes
+             else None)
+    servicer = RouteGuideServicer(db_path, note_store=note_store, cache=cache)
+    if reload_interval:
+        # Reloads on a thread of its own so that loading a large database
+        # does not stall the event loop.
+        servicer.watch_database(reload_interval)
+    server = grpc.aio.server()
+    if cache is not None:
+        route_guide_server.add_cached_handlers(servicer, server)
+    route_guide_pb2_grpc.add_RouteGuideServicer_to_server(servicer, server)
+    server.add_insecure_port('[::]:%d' % port)
+    await server.start()
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        await server.stop(grace)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="route_guide_db.json",
+                        help="JSON or binary route guide database")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--shared-notes", action="store_true",
+                        help="share RouteChat notes between streams")
+    parser.add_argument("--reload-interval", type=float,
+                        help="seconds between checks for a changed database")
+    parser.add_argument("--cache-mb", type=int, default=0,
+                        help="megabytes of GetFeature and ListFeatures "
+                        "responses to cache")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.db, args.port, args.shared_notes,
+                          args.reload_interval, args.cache_mb * 1024 * 1024))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,772 @@
+"""Benchmarks for the route guide server.
+
+Usage:
+  python route_guide_benchmark.py --features 1000000 index
+  python route_guide_benchmark.py --features 1000000 store
+  python route_guide_benchmark.py --features 1000000 binary
+  python route_guide_benchmark.py distance --points 500000
+  python route_guide_benchmark.py streams --streams 100
+  python route_guide_benchmark.py processes --processes 1 2 4
+  python route_guide_benchmark.py chat --notes 20000
+  python route_guide_benchmark.py fanout --streams 5000
+  python route_guide_benchmark.py --calls 100000 metrics
+  python route_guide_benchmark.py --features 1000000 --calls 100000 cache
+  python route_guide_benchmark.py --calls 20000 pool --processes 4
+  python route_guide_benchmark.py --features 1000000 --calls 1000 nearest
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import grpc
+
+import route_guide_pb2
+import route_guide_pb2_grpc
+import route_guide_server
+import route_guide_cache
+import route_guide_index
+import route_guide_store
+import route_guide_resources
+import route_guide_binary
+import route_guide_distance
+import route_guide_notes
+import route_guide_metrics
+import route_guide_pool
+
+# Roughly the continental United States, in E7 coordinates.
+_LATITUDE_RANGE = (250000000, 490000000)
+_LONGITUDE_RANGE = (-1250000000, -670000000)
+
+
+def random_items(count, seed=0):
+    """Yields count (name, latitude, longitude) tuples at random locations.
+
+    Like the real database, about a third of the features have no name.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        name = "feature %d" % i if rng.random() < 0.65 else ""
+        yield (name, rng.randint(*_LATITUDE_RANGE),
+               rng.randint(*_LONGITUDE_RANGE))
+
+
+def random_features(count, seed=0):
+    """Returns count route_guide_pb2.Features at random locations."""
+    return [
+        route_guide_pb2.Feature(
+            name=name,
+            location=route_guide_pb2.Point(latitude=latitude,
+                                           longitude=longitude))
+        for name, latitude, longitude in random_items(count, seed)
+    ]
+
+
+def random_rectangle(rng, span):
+    """Returns (left, right, bottom, top) of a span x span E7 rectangle."""
+    bottom = rng.randint(_LATITUDE_RANGE[0], _LATITUDE_RANGE[1] - span)
+    left = rng.randint(_LONGITUDE_RANGE[0], _LONGITUDE_RANGE[1] - span)
+    return left, left + span, bottom, bottom + span
+
+
+def _report(name, seconds, calls):
+    print("%-32s %12.2f us/call" % (name, seconds / calls * 1e6))
+
+
+def _rss_bytes():
+    """Resident set size of this process.
+
+    Protobuf messages live in C memory with the upb and cpp backends, so the
+    RSS is used instead of tracemalloc.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return float("nan")
+    rank = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def free_port():
+    sock = socket.socket()
+    try:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def start_server(script, port, *extra_args):
+    """Runs a route guide server script in a subprocess on port."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(
+        [sys.executable, script, "--port", str(port)] + list(extra_args),
+        cwd=directory)
+    with grpc.insecure_channel("localhost:%d" % port) as channel:
+        try:
+            grpc.channel_ready_future(channel).result(timeout=30)
+        except grpc.FutureTimeoutError:
+            process.kill()
+            raise RuntimeError("%s did not start" % script)
+    return process
+
+
+def _measure_memory(build):
+    gc.collect()
+    before = _rss_bytes()
+    value = build()
+    gc.collect()
+    return value, _rss_bytes() - before
+
+
+def bench_index(args):
+    db = random_features(args.features, args.seed)
+    latitudes = [feature.location.latitude for feature in db]
+    longitudes = [feature.location.longitude for feature in db]
+    rng = random.Random(args.seed)
+    hits = [db[rng.randrange(len(db))].location for _ in range(args.calls)]
+    rectangles = [random_rectangle(rng, args.span)
+                  for _ in range(args.calls)]
+
+    def scan_rectangles():
+        for left, right, bottom, top in rectangles:
+            for feature in db:
+                if (left <= feature.location.longitude <= right and
+                        bottom <= feature.location.latitude <= top):
+                    pass
+
+    def index_lookups(index):
+        for point in hits:
+            index.lookup(point.latitude, point.longitude)
+
+    def index_queries(index):
+        for rectangle in rectangles:
+            for _ in index.query(*rectangle):
+                pass
+
+    print("%d features, %d calls" % (len(db), args.calls))
+    start = timeit.default_timer()
+    index = route_guide_index.GridIndex(latitudes, longitudes,
+                                        cell_size=args.cell_size)
+    print("GridIndex build: %.3f s" % (timeit.default_timer() - start))
+
+    _report("get_feature (linear scan)",
+            timeit.timeit(
+                lambda: [route_guide_server.get_feature(db, point)
+                         for point in hits], number=1), len(hits))
+    _report("GridIndex.lookup",
+            timeit.timeit(lambda: index_lookups(index), number=1), len(hits))
+    _report("ListFeatures (linear scan)",
+            timeit.timeit(scan_rectangles, number=1), len(rectangles))
+    _report("GridIndex.query",
+            timeit.timeit(lambda: index_queries(index), number=1),
+            len(rectangles))
+
+
+def bench_store(args):
+    # The store is measured first so the protobuf list cannot leave freed
+    # pages behind for it to reuse.
+    store, store_bytes = _measure_memory(
+        lambda: route_guide_store.FeatureStore.from_items(
+            random_items(args.features, args.seed)))
+    db, db_bytes = _measure_memory(
+        lambda: random_features(args.features, args.seed))
+    print("%d features" % len(db))
+    print("%-32s %12.1f bytes/feature" % (
+        "list of Feature", float(db_bytes) / len(db)))
+    print("%-32s %12.1f bytes/feature" % (
+        "FeatureStore", float(store_bytes) / len(store)))
+
+    rng = random.Random(args.seed)
+    rectangles = [random_rectangle(rng, args.span)
+                  for _ in range(args.calls)]
+    results = [0]
+
+    def list_features_scan():
+        count = 0
+        for left, right, bottom, top in rectangles:
+            for feature in db:
+                if (left <= feature.location.longitude <= right and
+                        bottom <= feature.location.latitude <= top):
+                    count += 1
+        results[0] = count
+
+    def store_scan():
+        latitudes = store.latitudes
+        longitudes = store.longitudes
+        count = 0
+        for left, right, bottom, top in rectangles:
+            for row in range(len(store)):
+                if (left <= longitudes[row] <= right and
+                        bottom <= latitudes[row] <= top):
+                    store.feature(row)
+                    count += 1
+        results[0] = count
+
+    seconds = timeit.timeit(list_features_scan, number=1)
+    print("%-32s %12.0f features scanned/s (%d sent)" % (
+        "ListFeatures over Features", len(db) * len(rectangles) / seconds,
+        results[0]))
+    seconds = timeit.timeit(store_scan, number=1)
+    print("%-32s %12.0f features scanned/s (%d sent)" % (
+        "ListFeatures over FeatureStore",
+        len(store) * len(rectangles) / seconds, results[0]))
+
+
+def bench_binary(args):
+    directory = tempfile.mkdtemp()
+    try:
+        json_path = os.path.join(directory, "route_guide_db.json")
+        binary_path = os.path.join(directory, "route_guide_db.bin")
+        with open(json_path, "w") as json_file:
+            json.dump([{"name": name,
+                        "location": {"latitude": latitude,
+                                     "longitude": longitude}}
+                       for name, latitude, longitude in random_items(
+                           args.features, args.seed)], json_file)
+        store = route_guide_store.FeatureStore.from_items(
+            random_items(args.features, args.seed))
+        route_guide_binary.write_database(
+            binary_path, store,
+            route_guide_index.GridIndex(store.latitudes, store.longitudes))
+        print("%d features: %.1f MB JSON, %.1f MB binary" % (
+            len(store), os.path.getsize(json_path) / 1e6,
+            os.path.getsize(binary_path) / 1e6))
+
+        def load_json():
+            store = route_guide_resources.read_feature_store(json_path)
+            route_guide_index.GridIndex(store.latitudes, store.longitudes)
+
+        print("%-32s %12.3f s" % ("JSON load and index build",
+                                  timeit.timeit(load_json, number=1)))
+        print("%-32s %12.3f s" % (
+            "binary open", timeit.timeit(
+                lambda: route_guide_binary.open_database(binary_path),
+                number=1)))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_distance(args):
+    route = [route_guide_pb2.Point(latitude=latitude, longitude=longitude)
+             for _, latitude, longitude in random_items(args.points,
+                                                        args.seed)]
+    results = {}
+
+    def per_point():
+        distance = 0.0
+        prev_point = None
+        for point in route:
+            if prev_point:
+                distance += route_guide_server.get_distance(prev_point,
+                                                            point)
+            prev_point = point
+        results["per-point get_distance"] = distance
+
+    def batched():
+        distance = route_guide_distance.RouteDistance(args.chunk_size)
+        for point in route:
+            distance.add(point.latitude, point.longitude)
+        results["RouteDistance"] = distance.total()
+
+    print("%d points, chunks of %d, numpy %s" % (
+        len(route), args.chunk_size,
+        "available" if route_guide_distance.numpy is not None else
+        "missing"))
+    for name, run in (("per-point get_distance", per_point),
+                      ("RouteDistance", batched)):
+        seconds = timeit.timeit(run, number=1)
+        print("%-32s %12.0f points/s  %d metres" % (
+            name, len(route) / seconds, int(results[name])))
+
+
+def bench_streams(args):
+    point = route_guide_pb2.Point(latitude=409146138, longitude=-746188906)
+    print("%d idle RecordRoute streams, %d GetFeature calls, %.1f s "
+          "deadline" % (args.streams, args.calls, args.deadline))
+    for name, script in (("ThreadPoolExecutor", "route_guide_server.py"),
+                         ("grpc.aio", "route_guide_asyncio_server.py")):
+        port = free_port()
+        process = start_server(script, port)
+        release = threading.Event()
+
+        def idle_route():
+            release.wait()
+            return
+            yield
+
+        try:
+            with grpc.insecure_channel("localhost:%d" % port) as channel:
+                stub = route_guide_pb2_grpc.RouteGuideStub(channel)
+                routes = [stub.RecordRoute.future(idle_route())
+                          for _ in range(args.streams)]
+                time.sleep(1)
+                latencies = []
+                failures = 0
+                for _ in range(args.calls):
+                    start = timeit.default_timer()
+                    try:
+                        stub.GetFeature(point, timeout=args.deadline)
+                    except grpc.RpcError:
+                        failures += 1
+                    latencies.append(timeit.default_timer() - start)
+                release.set()
+                finished = 0
+                for route in routes:
+                    try:
+                        route.result(timeout=60)
+                        finished += 1
+                    except (grpc.RpcError, grpc.FutureTimeoutError):
+                        pass
+        finally:
+            release.set()
+            process.terminate()
+            process.wait()
+        latencies.sort()
+        print("%-20s GetFeature failed %d/%d  p50 %8.2f ms  p99 %8.2f ms  "
+              "streams finished %d/%d" % (
+                  name, failures, args.calls,
+                  percentile(latencies, 50) * 1e3,
+                  percentile(latencies, 99) * 1e3, finished, args.streams))
+
+
+def _get_feature_load(port, seconds):
+    """Calls GetFeature over one connection for seconds; returns the count."""
+    point = route_guide_pb2.Point(latitude=409146138, longitude=-746188906)
+    calls = 0
+    with grpc.insecure_channel("localhost:%d" % port) as channel:
+        stub = route_guide_pb2_grpc.RouteGuideStub(channel)
+        deadline = timeit.default_timer() + seconds
+        while timeit.default_timer() < deadline:
+            stub.GetFeature(point)
+            calls += 1
+    return calls
+
+
+def bench_processes(args):
+    # Client processes are spawned, not forked, because this process has
+    # already started gRPC.
+    context = multiprocessing.get_context("spawn")
+    print("%d client processes, %.0f s per run" % (args.clients,
+                                                  args.seconds))
+    for processes in args.processes:
+        port = free_port()
+        server = start_server("route_guide_server.py", port, "--processes",
+                              str(processes))
+        try:
+            pool = context.Pool(args.clients)
+            try:
+                calls = sum(pool.starmap(
+                    _get_feature_load, [(port, args.seconds)] * args.clients))
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            server.terminate()
+            server.wait()
+        print("%2d server processes %12.0f GetFeature/s" % (
+            processes, calls / args.seconds))
+
+
+def bench_chat(args):
+    rng = random.Random(args.seed)
+    notes = [
+        route_guide_pb2.RouteNote(
+            message="note %d" % i,
+            location=route_guide_pb2.Point(
+                latitude=rng.randrange(args.locations), longitude=0))
+        for i in range(args.notes)
+    ]
+    counts = {}
+
+    def note_list():
+        sent = 0
+        prev_notes = []
+        for new_note in notes:
+            for prev_note in prev_notes:
+                if prev_note.location == new_note.location:
+                    sent += 1
+            prev_notes.append(new_note)
+        counts["prev_notes list"] = sent
+
+    def note_index():
+        sent = 0
+        index = route_guide_notes.NoteIndex(max_notes=None)
+        for new_note in notes:
+            sent += len(index.notes_at(new_note.location))
+            index.add(new_note)
+        counts["NoteIndex"] = sent
+
+    print("%d notes at %d locations" % (len(notes), args.locations))
+    for name, run in (("prev_notes list", note_list),
+                      ("NoteIndex", note_index)):
+        seconds = timeit.timeit(run, number=1)
+        print("%-32s %12.0f notes/s  %d sent" % (
+            name, len(notes) / seconds, counts[name]))
+
+
+def bench_fanout(args):
+    store = route_guide_notes.SharedNoteStore()
+    locations = [route_guide_pb2.Point(latitude=i, longitude=0)
+                 for i in range(args.locations)]
+    delivered = [itertools.count()]
+
+    def deliver(note):
+        # next() on a count is atomic, so publisher threads can share it.
+        next(delivered[0])
+
+    # Every stream visits one location, so each published note reaches
+    # about streams / locations streams.
+    subscriptions = []
+    for i in range(args.streams):
+        subscription = store.subscribe(deliver)
+        subscription.publish(route_guide_pb2.RouteNote(
+            message="hello", location=locations[i % len(locations)]))
+        subscriptions.append(subscription)
+    delivered[0] = itertools.count()
+
+    def publisher(seed):
+        rng = random.Random(seed)
+        for _ in range(args.notes):
+            rng.choice(subscriptions).publish(route_guide_pb2.RouteNote(
+                message="note",
+                location=locations[rng.randrange(len(locations))]))
+
+    threads = [threading.Thread(target=publisher, args=(seed,))
+               for seed in range(args.publishers)]
+    start = timeit.default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = timeit.default_timer() - start
+    published = args.notes * args.publishers
+    print("%d streams at %d locations, %d publisher threads" % (
+        args.streams, args.locations, args.publishers))
+    print("%-32s %12.0f notes/s" % ("published", published / seconds))
+    print("%-32s %12.0f notes/s" % ("delivered",
+                                     next(delivered[0]) / seconds))
+    for subscription in subscriptions:
+        subscription.close()
+
+
+_CallDetails = collections.namedtuple("_CallDetails",
+                                      ("method", "invocation_metadata"))
+
+
+def bench_metrics(args):
+    servicer = route_guide_server.RouteGuideServicer()
+    point = route_guide_pb2.Point(latitude=409146138, longitude=-746188906)
+    handler = grpc.unary_unary_rpc_method_handler(servicer.GetFeature)
+    interceptor = route_guide_metrics.MetricsInterceptor(
+        route_guide_metrics.MetricsRegistry())
+    intercepted = interceptor.intercept_service(
+        lambda details: handler,
+        _CallDetails("/routeguide.RouteGuide/GetFeature", ()))
+
+    def call(method_handler):
+        behavior = method_handler.unary_unary
+        for _ in range(args.calls):
+            behavior(point, None)
+
+    plain = timeit.timeit(lambda: call(handler), number=1)
+    measured = timeit.timeit(lambda: call(intercepted), number=1)
+    print("%d GetFeature handler calls" % args.calls)
+    _report("without MetricsInterceptor", plain, args.calls)
+    _report("with MetricsInterceptor", measured, args.calls)
+    _report("overhead", measured - plain, args.calls)
+
+
+def bench_cache(args):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "route_guide_db.bin")
+        store = route_guide_store.FeatureStore.from_items(
+            random_items(args.features, args.seed))
+        route_guide_binary.write_database(
+            path, store,
+            route_guide_index.GridIndex(store.latitudes, store.longitudes))
+        servicer = route_guide_server.RouteGuideServicer(
+            path, cache=route_guide_cache.ResponseCache())
+    finally:
+        shutil.rmtree(directory)
+    rng = random.Random(args.seed)
+    # Every call goes to one of a few hot keys, so nearly all hit.
+    points = [store.location(rng.randrange(len(store)))
+              for _ in range(args.hot)]
+    rectangles = []
+    for _ in range(args.hot):
+        left, right, bottom, top = random_rectangle(rng, args.span)
+        rectangles.append(route_guide_pb2.Rectangle(
+            lo=route_guide_pb2.Point(latitude=bottom, longitude=left),
+            hi=route_guide_pb2.Point(latitude=top, longitude=right)))
+    point_calls = [rng.choice(points) for _ in range(args.calls)]
+    rectangle_calls = [rng.choice(rectangles)
+                       for _ in range(max(args.calls // 10, 1))]
+
+    # Handler plus response serialization, as the gRPC server runs them.
+    def get_feature():
+        for point in point_calls:
+            servicer.GetFeature(point, None).SerializeToString()
+
+    def cached_get_feature():
+        for point in point_calls:
+            servicer.CachedGetFeature(point, None)
+
+    def list_features():
+        for rectangle in rectangle_calls:
+            for feature in servicer.ListFeatures(rectangle, None):
+                feature.SerializeToString()
+
+    def cached_list_features():
+        for rectangle in rectangle_calls:
+            for _ in servicer.CachedListFeatures(rectangle, None):
+                pass
+
+    print("%d features, %d hot keys" % (len(store), args.hot))
+    _report("GetFeature", timeit.timeit(get_feature, number=1),
+            len(point_calls))
+    _report("GetFeature cached", timeit.timeit(cached_get_feature, number=1),
+            len(point_calls))
+    _report("ListFeatures", timeit.timeit(list_features, number=1),
+            len(rectangle_calls))
+    _report("ListFeatures cached",
+            timeit.timeit(cached_list_features, number=1),
+            len(rectangle_calls))
+    cache = servicer.cache
+    print("hit rate %.3f, %d entries, %.1f MB" % (
+        cache.hit_rate(), len(cache), cache.size / 1e6))
+
+
+def bench_pool(args):
+    port = free_port()
+    server = start_server("route_guide_server.py", port, "--processes",
+                          str(args.processes))
+    target = "localhost:%d" % port
+    point = route_guide_pb2.Point(latitude=409146138, longitude=-746188906)
+    points = [point] * args.calls
+    try:
+        with grpc.insecure_channel(target) as channel:
+            stub = route_guide_pb2_grpc.RouteGuideStub(channel)
+
+            def serial():
+                for point in points:
+                    stub.GetFeature(point)
+
+            serial_seconds = timeit.timeit(serial, number=1)
+        with route_guide_pool.RouteGuidePool(
+                target, channels_per_target=args.channels,
+                policy=args.policy) as pool:
+            pool.wait_for_ready(timeout=30)
+            pooled_seconds = timeit.timeit(
+                lambda: collections.deque(
+                    pool.map("GetFeature", points, args.concurrency),
+                    maxlen=0),
+                number=1)
+    finally:
+        server.terminate()
+        server.wait()
+    print("%d server processes, %d GetFeature calls" % (args.processes,
+                                                         args.calls))
+    print("%-40s %12.0f calls/s" % ("one channel, serial",
+                                    args.calls / serial_seconds))
+    print("%-40s %12.0f calls/s" % (
+        "pool of %d, %d in flight" % (args.channels, args.concurrency),
+        args.calls / pooled_seconds))
+
+
+def bench_nearest(args):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "route_guide_db.bin")
+        store = route_guide_store.FeatureStore.from_items(
+            random_items(args.features, args.seed))
+        route_guide_binary.write_database(
+            path, store,
+            route_guide_index.GridIndex(store.latitudes, store.longitudes))
+        port = free_port()
+        server = start_server("route_guide_server.py", port, "--db", path)
+    finally:
+        shutil.rmtree(directory)
+    rng = random.Random(args.seed)
+    points = [route_guide_pb2.Point(
+        latitude=rng.randint(*_LATITUDE_RANGE),
+        longitude=rng.randint(*_LONGITUDE_RANGE)) for _ in range(args.calls)]
+    half = args.span // 2
+    try:
+        with grpc.insecure_channel("localhost:%d" % port) as channel:
+            stub = route_guide_pb2_grpc.RouteGuideStub(channel)
+
+            def nearest_rpc():
+                return [[(nearby.distance, nearby.feature.location.latitude,
+                          nearby.feature.location.longitude)
+                         for nearby in stub.ListNearestFeatures(
+                             route_guide_pb2.NearestRequest(
+                                 point=point, k=args.k)).features]
+                        for point in points]
+
+            # What clients did before: list a rectangle around the point
+            # and keep the k nearest of its features.
+            def rectangle_workaround():
+                results = []
+                for point in points:
+                    rectangle = route_guide_pb2.Rectangle(
+                        lo=route_guide_pb2.Point(
+                            latitude=point.latitude - half,
+                            longitude=point.longitude - half),
+                        hi=route_guide_pb2.Point(
+                            latitude=point.latitude + half,
+                            longitude=point.longitude + half))
+                    results.append(sorted(
+                        (route_guide_server.get_distance(point,
+                                                         feature.location),
+                         feature.location.latitude,
+                         feature.location.longitude)
+                        for feature in stub.ListFeatures(rectangle))[:args.k])
+                return results
+
+            start = timeit.default_timer()
+            exact = nearest_rpc()
+            rpc_seconds = timeit.default_timer() - start
+            start = timeit.default_timer()
+            listed = rectangle_workaround()
+            workaround_seconds = timeit.default_timer() - start
+    finally:
+        server.terminate()
+        server.wait()
+    print("%d features, %d nearest to %d points" % (len(store), args.k,
+                                                   args.calls))
+    _report("ListNearestFeatures", rpc_seconds, args.calls)
+    _report("ListFeatures %d E7 square" % args.span, workaround_seconds,
+            args.calls)
+    print("rectangle answers matching ListNearestFeatures: %.1f%%" % (
+        100.0 * sum(1 for a, b in zip(exact, listed) if a == b) /
+        args.calls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--features", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    subparsers = parser.add_subparsers(dest="benchmark")
+    subparsers.required = True
+
+    index_parser = subparsers.add_parser(
+        "index", help="GridIndex against the linear scan")
+    index_parser.add_argument("--cell-size", type=int,
+                              default=route_guide_index.DEFAULT_CELL_SIZE)
+    index_parser.add_argument("--span", type=int, default=5000000,
+                              help="rectangle side in E7 units")
+    index_parser.set_defaults(func=bench_index)
+
+    store_parser = subparsers.add_parser(
+        "store", help="FeatureStore against a list of Features")
+    store_parser.add_argument("--span", type=int, default=5000000,
+                              help="rectangle side in E7 units")
+    store_parser.set_defaults(func=bench_store)
+
+    binary_parser = subparsers.add_parser(
+        "binary", help="server startup from JSON against the binary format")
+    binary_parser.set_defaults(func=bench_binary)
+
+    distance_parser = subparsers.add_parser(
+        "distance", help="RouteDistance against per-point get_distance")
+    distance_parser.add_argument("--points", type=int, default=500000)
+    distance_parser.add_argument(
+        "--chunk-size", type=int,
+        default=route_guide_distance.DEFAULT_CHUNK_SIZE)
+    distance_parser.set_defaults(func=bench_distance)
+
+    streams_parser = subparsers.add_parser(
+        "streams", help="GetFeature latency under long-lived streams, "
+        "thread pool server against grpc.aio")
+    streams_parser.add_argument("--streams", type=int, default=100)
+    streams_parser.add_argument("--deadline", type=float, default=1.0,
+                                help="GetFeature deadline in seconds")
+    streams_parser.set_defaults(func=bench_streams)
+
+    processes_parser = subparsers.add_parser(
+        "processes", help="GetFeature throughput by server process count")
+    processes_parser.add_argument("--processes", type=int, nargs="+",
+                                  default=[1, 2, 4])
+    processes_parser.add_argument("--clients", type=int,
+                                  default=multiprocessing.cpu_count())
+    processes_parser.add_argument("--seconds", type=float, default=5.0)
+    processes_parser.set_defaults(func=bench_processes)
+
+    chat_parser = subparsers.add_parser(
+        "chat", help="RouteChat NoteIndex against the prev_notes scan")
+    chat_parser.add_argument("--notes", type=int, default=20000)
+    chat_parser.add_argument("--locations", type=int, default=10000)
+    chat_parser.set_defaults(func=bench_chat)
+
+    fanout_parser = subparsers.add_parser(
+        "fanout", help="SharedNoteStore publish and fan-out rate")
+    fanout_parser.add_argument("--streams", type=int, default=5000)
+    fanout_parser.add_argument("--locations", type=int, default=500)
+    fanout_parser.add_argument("--notes", type=int, default=20000,
+                               help="notes per publisher thread")
+    fanout_parser.add_argument("--publishers", type=int, default=4)
+    fanout_parser.set_defaults(func=bench_fanout)
+
+    metrics_parser = subparsers.add_parser(
+        "metrics", help="per-call cost of MetricsInterceptor")
+    metrics_parser.set_defaults(func=bench_metrics)
+
+    cache_parser = subparsers.add_parser(
+        "cache", help="hot GetFeature and ListFeatures with the response "
+        "cache")
+    cache_parser.add_argument("--hot", type=int, default=100,
+                              help="distinct points and rectangles")
+    cache_parser.add_argument("--span", type=int, default=5000000,
+                              help="rectangle side in E7 units")
+    cache_parser.set_defaults(func=bench_cache)
+
+    pool_parser = subparsers.add_parser(
+        "pool", help="GetFeature throughput of RouteGuidePool against one "
+        "channel")
+    pool_parser.add_argument("--processes", type=int, default=4,
+                             help="server processes")
+    pool_parser.add_argument("--channels", type=int, default=8)
+    pool_parser.add_argument("--concurrency", type=int, default=64)
+    pool_parser.add_argument("--policy", choices=route_guide_pool.POLICIES,
+                             default="round_robin")
+    pool_parser.set_defaults(func=bench_pool)
+
+    nearest_parser = subparsers.add_parser(
+        "nearest", help="ListNearestFeatures against filtering a "
+        "ListFeatures rectangle on the client")
+    nearest_parser.add_argument("--k", type=int, default=10)
+    nearest_parser.add_argument("--span", type=int, default=5000000,
+                                help="rectangle side in E7 units")
+    nearest_parser.set_defaults(func=bench_nearest)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Binary, memory-mappable route guide database.
+
+The file is little-endian and made of a 32 byte header followed by
+8 byte aligned sections:
+
+  header        magic, version, feature count, distinct name count, name
+                blob size, grid cell count (0 without an index) and grid
+                cell size
+  latitudes     int32[count]
+  longitudes    int32[count]
+  name_ids      int32[count]
+  name_offsets  uint32[names + 1]
+  names         UTF-8 blob of the distinct names
+  cell_keys     int64[cells]      \\
+  cell_starts   int32[cells + 1]   > optional route_guide_index.GridIndex
+  rows          int32[count]      /
+
+open_database() maps the file read-only and hands memoryviews over it to
+route_guide_store.FeatureStore and route_guide_index.GridIndex, so nothing
+is parsed or copied at startup and every process serving the same file
+shares one copy of it in the page cache.
+
+Convert the JSON database with:
+  python route_guide_binary.py route_guide_db.json route_guide_db.bin
+"""
+
+from __future__ import print_function
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import route_guide_index
+import route_guide_resources
+import route_guide_store
+
+MAGIC = b'RTGUIDE\x00'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sIIIIIi')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(count, name_count, names_size, cells):
+    """Returns the (offset, size) of every section, in file order."""
+    sizes = [4 * count, 4 * count, 4 * count, 4 * (name_count + 1),
+             names_size]
+    if cells:
+        sizes += [8 * cells, 4 * (cells + 1), 4 * count]
+    sections = []
+    offset = _HEADER.size
+    for size in sizes:
+        offset = _align(offset)
+        sections.append((offset, size))
+        offset += size
+    return sections
+
+
+def _column_bytes(column, typecode):
+    values = array(typecode, column)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _column(view, typecode):
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    values = array(typecode)
+    values.frombytes(view)
+    values.byteswap()
+    return values
+
+
+def write_database(path, store, index=None):
+    """Writes a FeatureStore, and optionally its GridIndex, to path.
+
+    The file is written next to path and renamed over it, so a server
+    reloading path never sees it half written.
+    """
+    cells = len(index.cell_keys) if index is not None else 0
+    cell_size = index.cell_size if index is not None else 0
+    name_count = len(store.name_offsets) - 1
+    sections = [
+        _column_bytes(store.latitudes, 'i'),
+        _column_bytes(store.longitudes, 'i'),
+        _column_bytes(store.name_ids, 'i'),
+        _column_bytes(store.name_offsets, 'I'),
+        bytes(store.names),
+    ]
+    if index is not None:
+        sections += [
+            _column_bytes(index.cell_keys, 'q'),
+            _column_bytes(index.cell_starts, 'i'),
+            _column_bytes(index.rows, 'i'),
+        ]
+    layout = _layout(len(store), name_count, len(store.names), cells)
+    temporary_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(temporary_path, 'wb') as db_file:
+            db_file.write(_HEADER.pack(MAGIC, VERSION, len(store), name_count,
+                                       len(store.names), cells, cell_size))
+            for (offset, _), data in zip(layout, sections):
+                db_file.write(b'\x00' * (offset - db_file.tell()))
+                db_file.write(data)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def is_database(path):
+    """Whether path starts with the binary database magic."""
+    with open(path, 'rb') as db_file:
+        return db_file.read(len(MAGIC)) == MAGIC
+
+
+def open_database(path):
+    """Maps a binary database.
+
+  Returns:
+    A (route_guide_store.FeatureStore, route_guide_index.GridIndex) pair;
+      the index is None when the file was written without one.
+  """
+    with open(path, 'rb') as db_file:
+        mapped = mmap.mmap(db_file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    (magic, version, count, name_count, names_size, cells,
+     cell_size) = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("%s is not a route guide database" % path)
+    if version != VERSION:
+        raise ValueError("%s has unsupported version %d" % (path, version))
+    layout = _layout(count, name_count, names_size, cells)
+    if layout[-1][0] + layout[-1][1] > len(view):
+        raise ValueError("%s is truncated" % path)
+    sections = [view[offset:offset + size] for offset, size in layout]
+    store = route_guide_store.FeatureStore(
+        _column(sections[0], 'i'), _column(sections[1], 'i'),
+        _column(sections[2], 'i'), _column(sections[3], 'I'), sections[4])
+    index = None
+    if cells:
+        index = route_guide_index.GridIndex(
+            store.latitudes, store.longitudes, cell_size=cell_size,
+            cell_keys=_column(sections[5], 'q'),
+            cell_starts=_column(sections[6], 'i'),
+            rows=_column(sections[7], 'i'))
+    return store, index
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converts route_guide_db.json to the binary format.")
+    parser.add_argument("source", help="JSON route guide database")
+    parser.add_argument("destination", help="binary database to write")
+    parser.add_argument("--no-index", dest="index", action="store_false",
+                        help="do not store a prebuilt GridIndex")
+    parser.add_argument("--cell-size", type=int,
+                        default=route_guide_index.DEFAULT_CELL_SIZE,
+                        help="GridIndex cell size in E7 units")
+    args = parser.parse_args()
+
+    store = route_guide_resources.read_feature_store(args.source)
+    index = None
+    if args.index:
+        index = route_guide_index.GridIndex(
+            store.latitudes, store.longitudes, cell_size=args.cell_size)
+    write_database(args.destination, store, index)
+    print("Wrote %d features to %s" % (len(store), args.destination))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""A response cache holding serialized route guide responses.
+
+Handlers registered by route_guide_server.add_cached_handlers() return the
+bytes they find here as is, so a hit costs a dictionary lookup instead of
+an index lookup and a protobuf serialization.  Keys carry the generation
+of the database snapshot they were built from, so a reload never serves
+stale responses even if an RPC still running on the old snapshot adds to
+the cache after it was cleared.
+"""
+
+import collections
+import threading
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Bookkeeping counted against max_bytes for every cached response.
+_ENTRY_OVERHEAD = 100
+
+
+def serialized(response):
+    """Response serializer of handlers that return bytes."""
+    return response
+
+
+class ResponseCache(object):
+    """LRU cache of serialized responses bounded by their total size.
+
+    A value is one serialized message or a tuple of them for a streaming
+    response.  Values larger than max_entry_bytes are not kept, so a few
+    huge ListFeatures answers cannot flush the hot ones.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = (max_entry_bytes if max_entry_bytes is not None
+                                else max_bytes // 16)
+        self._lock = threading.Lock()
+        # key -> (value, size), least recently used first.
+        self._entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        """Returns the value cached under key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        """Caches value under key; size defaults to len(value)."""
+        if size is None:
+            size = len(value)
+        size += _ENTRY_OVERHEAD
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
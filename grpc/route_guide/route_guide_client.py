@@ -9,6 +9,9 @@ import route_guide_pb2
 import route_guide_pb2_grpc
 import route_guide_resources
 
+# Points sent per GetFeatures or StreamFeatures message.
+_BATCH_SIZE = 1000
+
 
 def make_route_note(message, latitude, longitude):
     return route_guide_pb2.RouteNote(
@@ -35,6 +38,40 @@ def guide_get_feature(stub):
     guide_get_one_feature(stub, route_guide_pb2.Point(latitude=0, longitude=0))
 
 
+def _point_batches(points, batch_size):
+    batch = []
+    for point in points:
+        batch.append(point)
+        if len(batch) == batch_size:
+            yield route_guide_pb2.PointBatch(points=batch)
+            batch = []
+    if batch:
+        yield route_guide_pb2.PointBatch(points=batch)
+
+
+def get_features(stub, points, batch_size=_BATCH_SIZE):
+    """Yields the Feature at each of points, in order, batch_size per RPC."""
+    for batch in _point_batches(points, batch_size):
+        for feature in stub.GetFeatures(batch).features:
+            yield feature
+
+
+def stream_features(stub, points, batch_size=_BATCH_SIZE):
+    """Like get_features() but over one StreamFeatures call."""
+    for response in stub.StreamFeatures(_point_batches(points, batch_size)):
+        for feature in response.features:
+            yield feature
+
+
+def guide_get_features(stub):
+    feature_list = route_guide_resources.read_route_guide_database()
+    points = [feature.location for feature in feature_list]
+    points.append(route_guide_pb2.Point(latitude=0, longitude=0))
+    features = list(get_features(stub, points, batch_size=32))
+    print("Resolved %s points, %s named features" % (
+        len(features), sum(1 for feature in features if feature.name)))
+
+
 def guide_list_features(stub):
     rectangle = route_guide_pb2.Rectangle(
         lo=route_guide_pb2.Point(latitude=400000000, longitude=-750000000),
@@ -47,6 +84,53 @@ def guide_list_features(stub):
         print("Feature called %s at %s" % (feature.name, feature.location))
 
 
+def list_feature_pages(stub, rectangle, page_size=100, max_results=0):
+    """Yields the features inside rectangle page by page.
+
+    Follows the page tokens over as many ListFeaturePages calls as the
+    server needs; with max_results, stops after that many features.
+    """
+    page_token = ""
+    remaining = max_results
+    while True:
+        # 0 asks for as many features as the server sends.
+        request = route_guide_pb2.ListFeaturesRequest(
+            rectangle=rectangle, page_size=page_size,
+            max_results=remaining if max_results else 0,
+            page_token=page_token)
+        for page in stub.ListFeaturePages(request):
+            for feature in page.features:
+                yield feature
+            remaining -= len(page.features)
+            page_token = page.next_page_token
+        if not page_token or (max_results and remaining <= 0):
+            return
+
+
+def guide_list_feature_pages(stub):
+    rectangle = route_guide_pb2.Rectangle(
+        lo=route_guide_pb2.Point(latitude=400000000, longitude=-750000000),
+        hi=route_guide_pb2.Point(latitude=420000000, longitude=-730000000))
+    print("Listing the first 10 features between 40, -75 and 42, -73")
+
+    for feature in list_feature_pages(stub, rectangle, page_size=4,
+                                      max_results=10):
+        print("Feature called %s at %s" % (feature.name, feature.location))
+
+
+def guide_nearest_features(stub):
+    point = route_guide_pb2.Point(latitude=407000000, longitude=-744000000)
+    nearest = stub.GetNearestFeature(point)
+    print("Nearest feature to 40.7, -74.4 is %s, %.0f meters away" % (
+        nearest.feature.name, nearest.distance))
+    request = route_guide_pb2.NearestRequest(point=point, k=3,
+                                             max_distance=50000)
+    print("Three nearest within 50 km")
+    for nearby in stub.ListNearestFeatures(request).features:
+        print("Feature called %s, %.0f meters away" % (nearby.feature.name,
+                                                      nearby.distance))
+
+
 def generate_route(feature_list):
     for _ in range(0, 10):
         random_feature = feature_list[random.randint(0, len(feature_list) - 1)]
@@ -93,8 +177,14 @@ def run():
         stub = route_guide_pb2_grpc.RouteGuideStub(channel)
         print("-------------- GetFeature --------------")
         guide_get_feature(stub)
+        print("-------------- GetFeatures --------------")
+        guide_get_features(stub)
         print("-------------- ListFeatures --------------")
         guide_list_features(stub)
+        print("-------------- ListFeaturePages --------------")
+        guide_list_feature_pages(stub)
+        print("-------------- NearestFeatures --------------")
+        guide_nearest_features(stub)
         print("-------------- RecordRoute --------------")
         guide_record_route(stub)
         print("-------------- RouteChat --------------")
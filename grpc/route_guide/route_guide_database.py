@@ -0,0 +1,98 @@
+"""Loading, and reloading, the feature database served by the route guide."""
+
+import itertools
+import logging
+import os
+import threading
+
+import route_guide_binary
+import route_guide_index
+import route_guide_resources
+
+_generations = itertools.count(1)
+
+
+class FeatureDatabase(object):
+    """An immutable snapshot of the features and their spatial index.
+
+    RPCs read the servicer's current snapshot once and use it to the end, so
+    a reload never changes the data under a stream.  generation is unique
+    per loaded snapshot.
+    """
+
+    def __init__(self, db, index, path=None):
+        self.db = db
+        self.index = index
+        self.path = path
+        self.generation = next(_generations)
+
+
+def load_database(path, index_factory=route_guide_index.GridIndex):
+    """Loads a JSON or binary route guide database into a FeatureDatabase."""
+    index = None
+    if route_guide_binary.is_database(path):
+        db, index = route_guide_binary.open_database(path)
+    else:
+        db = route_guide_resources.read_feature_store(path)
+    # A GridIndex stored in the binary database is used as is.
+    if index is None or index_factory is not route_guide_index.GridIndex:
+        index = index_factory(db.latitudes, db.longitudes)
+    return FeatureDatabase(db, index, path)
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class DatabaseWatcher(threading.Thread):
+    """Reloads a database file in the background whenever it changes.
+
+    The file is polled every interval seconds.  A changed file is loaded
+    once it has stayed the same for a whole interval, and the new
+    FeatureDatabase is handed to on_reload, which is expected to swap it in
+    with a single assignment.  If loading fails the old snapshot stays.
+
+    Writers should replace the file with a rename, as
+    route_guide_binary.write_database() does, rather than rewrite it in
+    place: a memory-mapped snapshot still in use keeps reading the old file.
+    """
+
+    def __init__(self, path, on_reload, interval=5.0,
+                 index_factory=route_guide_index.GridIndex):
+        super(DatabaseWatcher, self).__init__(name="DatabaseWatcher")
+        self.daemon = True
+        self.path = path
+        self.on_reload = on_reload
+        self.interval = interval
+        self.index_factory = index_factory
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        loaded = _file_version(self.path)
+        seen = loaded
+        while not self._stopped.wait(self.interval):
+            version = _file_version(self.path)
+            if version is None or version == loaded:
+                seen = version
+                continue
+            if version != seen:
+                # Still being written; wait for it to settle.
+                seen = version
+                continue
+            try:
+                database = load_database(self.path, self.index_factory)
+            except Exception:
+                logging.exception("Could not reload %s", self.path)
+                loaded = version
+                continue
+            loaded = version
+            logging.info("Reloaded %d features from %s", len(database.db),
+                         self.path)
+            self.on_reload(database)
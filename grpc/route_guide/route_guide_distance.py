@@ -0,0 +1,141 @@
+"""Great-circle distances between E7 route guide coordinates."""
+
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COORD_FACTOR = 10000000.0
+# metres
+EARTH_RADIUS = 6371000
+
+# Points buffered by RouteDistance before a vectorized flush.
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def haversine(latitude_1, longitude_1, latitude_2, longitude_2):
+    """Distance in metres between two E7 coordinates."""
+    lat_1 = latitude_1 / COORD_FACTOR
+    lat_2 = latitude_2 / COORD_FACTOR
+    lon_1 = longitude_1 / COORD_FACTOR
+    lon_2 = longitude_2 / COORD_FACTOR
+    lat_rad_1 = math.radians(lat_1)
+    lat_rad_2 = math.radians(lat_2)
+    delta_lat_rad = math.radians(lat_2 - lat_1)
+    delta_lon_rad = math.radians(lon_2 - lon_1)
+
+    # Formula is based on http://mathforum.org/library/drmath/view/51879.html
+    a = (pow(math.sin(delta_lat_rad / 2), 2) +
+         (math.cos(lat_rad_1) * math.cos(lat_rad_2) * pow(
+             math.sin(delta_lon_rad / 2), 2)))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+
+def bounding_boxes(latitude, longitude, distance):
+    """Rectangles holding every point within distance metres of a point.
+
+    Returns a list of (left, right, bottom, top) E7 rectangles, two when
+    the circle crosses the antimeridian.
+    """
+    # A little wider than the circle, against rounding.
+    angle = distance / EARTH_RADIUS * (1 + 1e-9) + 1e-9
+    lat = math.radians(latitude / COORD_FACTOR)
+    lon = math.radians(longitude / COORD_FACTOR)
+    bottom = lat - angle
+    top = lat + angle
+    if bottom <= -math.pi / 2 or top >= math.pi / 2:
+        # The circle holds a pole, and with it every longitude.
+        boxes = [(-math.pi, math.pi, max(bottom, -math.pi / 2),
+                  min(top, math.pi / 2))]
+    else:
+        delta_lon = math.asin(min(math.sin(angle) / math.cos(lat), 1.0))
+        left = lon - delta_lon
+        right = lon + delta_lon
+        if left < -math.pi:
+            boxes = [(left + 2 * math.pi, math.pi, bottom, top),
+                     (-math.pi, right, bottom, top)]
+        elif right > math.pi:
+            boxes = [(left, math.pi, bottom, top),
+                     (-math.pi, right - 2 * math.pi, bottom, top)]
+        else:
+            boxes = [(left, right, bottom, top)]
+    return [(_to_e7(left, math.floor), _to_e7(right, math.ceil),
+             _to_e7(bottom, math.floor), _to_e7(top, math.ceil))
+            for left, right, bottom, top in boxes]
+
+
+def _to_e7(radians, rounding):
+    return int(rounding(math.degrees(radians) * COORD_FACTOR))
+
+
+def haversine_segments(latitudes, longitudes):
+    """Distances in metres between consecutive points of numpy E7 arrays.
+
+    Performs the same operations as haversine(), in the same order, one
+    array at a time.
+    """
+    lat = latitudes / COORD_FACTOR
+    lon = longitudes / COORD_FACTOR
+    lat_rad = numpy.radians(lat)
+    delta_lat_rad = numpy.radians(lat[1:] - lat[:-1])
+    delta_lon_rad = numpy.radians(lon[1:] - lon[:-1])
+    a = (numpy.square(numpy.sin(delta_lat_rad / 2)) +
+         (numpy.cos(lat_rad[:-1]) * numpy.cos(lat_rad[1:]) * numpy.square(
+             numpy.sin(delta_lon_rad / 2))))
+    c = 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+
+class RouteDistance(object):
+    """Running length of a route that is streamed one point at a time.
+
+    Points are buffered and the segment distances are computed a chunk at a
+    time with numpy, falling back to haversine() per segment when numpy is
+    not installed.  Segments are summed in route order like a per-point
+    loop, so total() only differs from adding up haversine() point by point
+    by the last-bit rounding of numpy's trigonometric functions.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._distance = 0.0
+        # The last point of a flushed chunk stays buffered as the start of
+        # the next segment.
+        self._latitudes = array('i')
+        self._longitudes = array('i')
+
+    def add(self, latitude, longitude):
+        self._latitudes.append(latitude)
+        self._longitudes.append(longitude)
+        if len(self._latitudes) > self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        latitudes = self._latitudes
+        longitudes = self._longitudes
+        if len(latitudes) < 2:
+            return
+        if numpy is not None:
+            segments = haversine_segments(
+                numpy.frombuffer(latitudes, dtype=numpy.int32),
+                numpy.frombuffer(longitudes, dtype=numpy.int32))
+            # add.accumulate sums strictly left to right, unlike sum().
+            self._distance = float(numpy.add.accumulate(
+                numpy.concatenate(([self._distance], segments)))[-1])
+        else:
+            distance = self._distance
+            for i in range(1, len(latitudes)):
+                distance += haversine(latitudes[i - 1], longitudes[i - 1],
+                                      latitudes[i], longitudes[i])
+            self._distance = distance
+        self._latitudes = array('i', latitudes[-1:])
+        self._longitudes = array('i', longitudes[-1:])
+
+    def total(self):
+        """Distance in metres over every point added so far."""
+        self._flush()
+        return self._distance
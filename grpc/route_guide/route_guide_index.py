@@ -0,0 +1,209 @@
+"""Spatial indexes over the route guide feature coordinates.
+
+An index is built once from two parallel sequences of latitudes and
+longitudes (in the E7 representation used by route_guide_pb2.Point) and
+answers queries with row numbers into those sequences.  Every index class
+provides the same four methods:
+
+  lookup(latitude, longitude): the first row at exactly that location, or
+    None.
+  query(left, right, bottom, top): an iterator over the rows inside the
+    rectangle, bounds included.
+  scan(left, right, bottom, top, start=0): the rows of query() as
+    (position, row) pairs in increasing position order, from position
+    start on, so that a listing can be resumed after position p with
+    start=p + 1.
+  nearest(latitude, longitude, k=1, max_distance=None): up to k
+    (distance, row) pairs, nearest first, with distances in metres as
+    route_guide_distance.haversine() computes them, leaving out rows
+    farther than max_distance.
+"""
+
+from bisect import bisect_left, bisect_right
+from array import array
+import heapq
+import math
+
+import route_guide_distance
+
+# Valid E7 coordinates are shifted by these offsets so grid cells start at 0.
+_LATITUDE_OFFSET = 900000000
+_LONGITUDE_OFFSET = 1800000000
+
+# One tenth of a degree.
+DEFAULT_CELL_SIZE = 1000000
+
+
+class LinearScanIndex(object):
+    """Index that scans every row; the behaviour of the original servicer."""
+
+    def __init__(self, latitudes, longitudes):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+
+    def lookup(self, latitude, longitude):
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        for row in range(len(latitudes)):
+            if latitudes[row] == latitude and longitudes[row] == longitude:
+                return row
+        return None
+
+    def query(self, left, right, bottom, top):
+        for _, row in self.scan(left, right, bottom, top):
+            yield row
+
+    def scan(self, left, right, bottom, top, start=0):
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        for row in range(start, len(latitudes)):
+            if (left <= longitudes[row] <= right and
+                    bottom <= latitudes[row] <= top):
+                yield row, row
+
+    def nearest(self, latitude, longitude, k=1, max_distance=None):
+        haversine = route_guide_distance.haversine
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        distances = ((haversine(latitude, longitude, latitudes[row],
+                                longitudes[row]), row)
+                     for row in range(len(latitudes)))
+        if max_distance is not None:
+            distances = ((distance, row) for distance, row in distances
+                         if distance <= max_distance)
+        return heapq.nsmallest(k, distances)
+
+
+class GridIndex(object):
+    """Uniform grid over the coordinates, stored as sorted cell runs.
+
+    Rows are bucketed into square cells of cell_size E7 units.  The buckets
+    are laid out like a CSR matrix: rows holds every row number ordered by
+    cell (latitude band first, then longitude), cell_keys holds the sorted
+    keys of the non-empty cells and cell_starts[i]:cell_starts[i + 1] is the
+    slice of rows belonging to cell_keys[i].  Within a latitude band the
+    cells of a rectangle are therefore one contiguous slice of rows.
+
+    lookup() costs O(log C + cell occupancy) and query() costs
+    O(B log C + k) where C is the number of non-empty cells, B the number of
+    latitude bands crossed and k the number of rows examined.  nearest()
+    queries the bounding boxes of ever larger circles around the point,
+    so it examines about as many rows as the k nearest are spread over.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_size=DEFAULT_CELL_SIZE,
+                 cell_keys=None, cell_starts=None, rows=None):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.cell_size = cell_size
+        self._lat_cells = (2 * _LATITUDE_OFFSET) // cell_size + 1
+        self._lon_cells = (2 * _LONGITUDE_OFFSET) // cell_size + 1
+        if cell_keys is None:
+            cell_keys, cell_starts, rows = self._build()
+        self.cell_keys = cell_keys
+        self.cell_starts = cell_starts
+        self.rows = rows
+
+    def _lat_cell(self, latitude):
+        cell = (latitude + _LATITUDE_OFFSET) // self.cell_size
+        return min(max(cell, 0), self._lat_cells - 1)
+
+    def _lon_cell(self, longitude):
+        cell = (longitude + _LONGITUDE_OFFSET) // self.cell_size
+        return min(max(cell, 0), self._lon_cells - 1)
+
+    def cell_key(self, latitude, longitude):
+        return (self._lat_cell(latitude) * self._lon_cells +
+                self._lon_cell(longitude))
+
+    def _build(self):
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        keys = [self.cell_key(latitudes[row], longitudes[row])
+                for row in range(len(latitudes))]
+        # sorted() is stable, so rows sharing a cell stay in row order and
+        # lookup() still returns the first matching row.
+        rows = array('i', sorted(range(len(keys)), key=keys.__getitem__))
+        cell_keys = array('q')
+        cell_starts = array('i')
+        previous = None
+        for position, row in enumerate(rows):
+            if keys[row] != previous:
+                previous = keys[row]
+                cell_keys.append(previous)
+                cell_starts.append(position)
+        cell_starts.append(len(rows))
+        return cell_keys, cell_starts, rows
+
+    def lookup(self, latitude, longitude):
+        key = self.cell_key(latitude, longitude)
+        cell = bisect_left(self.cell_keys, key)
+        if cell == len(self.cell_keys) or self.cell_keys[cell] != key:
+            return None
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        rows = self.rows
+        for position in range(self.cell_starts[cell],
+                              self.cell_starts[cell + 1]):
+            row = rows[position]
+            if latitudes[row] == latitude and longitudes[row] == longitude:
+                return row
+        return None
+
+    def query(self, left, right, bottom, top):
+        for _, row in self.scan(left, right, bottom, top):
+            yield row
+
+    def scan(self, left, right, bottom, top, start=0):
+        """Positions are into rows, so results come cell by cell."""
+        if left > right or bottom > top:
+            return
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        rows = self.rows
+        cell_keys = self.cell_keys
+        cell_starts = self.cell_starts
+        first_lon_cell = self._lon_cell(left)
+        last_lon_cell = self._lon_cell(right)
+        for lat_cell in range(self._lat_cell(bottom),
+                              self._lat_cell(top) + 1):
+            band = lat_cell * self._lon_cells
+            first = bisect_left(cell_keys, band + first_lon_cell)
+            last = bisect_right(cell_keys, band + last_lon_cell, first)
+            if first == last or cell_starts[last] <= start:
+                continue
+            for position in range(max(cell_starts[first], start),
+                                  cell_starts[last]):
+                row = rows[position]
+                if (left <= longitudes[row] <= right and
+                        bottom <= latitudes[row] <= top):
+                    yield position, row
+
+    def nearest(self, latitude, longitude, k=1, max_distance=None):
+        if k <= 0 or not len(self.rows):
+            return []
+        haversine = route_guide_distance.haversine
+        bounding_boxes = route_guide_distance.bounding_boxes
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        half_circumference = math.pi * route_guide_distance.EARTH_RADIUS
+        limit = (half_circumference if max_distance is None
+                 else min(max_distance, half_circumference))
+        # Starts with a circle about a cell wide and doubles it until it
+        # holds k rows.  Every row within radius is inside its bounding
+        # boxes, so the k nearest inside the circle are the k nearest.
+        radius = min(self.cell_size / route_guide_distance.COORD_FACTOR *
+                     math.pi / 180 * route_guide_distance.EARTH_RADIUS,
+                     limit)
+        while True:
+            found = []
+            for left, right, bottom, top in bounding_boxes(
+                    latitude, longitude, radius):
+                for row in self.query(left, right, bottom, top):
+                    distance = haversine(latitude, longitude,
+                                         latitudes[row], longitudes[row])
+                    if distance <= radius:
+                        found.append((distance, row))
+            if len(found) >= k or radius >= limit:
+                return heapq.nsmallest(k, found)
+            radius = min(radius * 2, limit)
@@ -0,0 +1,317 @@
+"""Load generator for the route guide service.
+
+Starts a route guide server on localhost (or targets a running one), drives
+a weighted mix of RPCs from many concurrent clients and reports throughput
+and latency percentiles per RPC.
+
+Usage:
+  python route_guide_loadgen.py --features 1000000 --concurrency 32 \\
+      --mix GetFeature=70,ListFeatures=10,RecordRoute=10,RouteChat=10 \\
+      --output results.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import timeit
+
+import grpc
+
+import route_guide_pb2
+import route_guide_pb2_grpc
+import route_guide_benchmark
+import route_guide_binary
+import route_guide_database
+import route_guide_index
+import route_guide_store
+
+_SERVERS = {
+    "thread": "route_guide_server.py",
+    "aio": "route_guide_asyncio_server.py",
+}
+
+_RPCS = ("GetFeature", "GetFeatures", "ListFeatures", "ListFeaturePages",
+         "RecordRoute", "RouteChat")
+
+_DEFAULT_MIX = "GetFeature=70,ListFeatures=10,RecordRoute=10,RouteChat=10"
+
+
+def parse_mix(mix):
+    """Parses "GetFeature=70,ListFeatures=30" into {rpc: weight}."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in _RPCS:
+            raise ValueError("unknown RPC %r in mix" % name)
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def _load_points(args):
+    """Locations of the features the server is serving."""
+    if args.db is None:
+        return [route_guide_pb2.Point(latitude=latitude, longitude=longitude)
+                for _, latitude, longitude in
+                route_guide_benchmark.random_items(args.features, args.seed)]
+    store = route_guide_database.load_database(args.db).db
+    return [store.location(row) for row in range(len(store))]
+
+
+class _Workload(object):
+    """Builds the requests of each RPC from the served feature locations."""
+
+    def __init__(self, args, points, rng):
+        self.args = args
+        self.points = points
+        self.rng = rng
+
+    def point(self):
+        if self.points and self.rng.random() < self.args.hit_ratio:
+            return self.rng.choice(self.points)
+        return route_guide_pb2.Point(
+            latitude=self.rng.randint(-900000000, 900000000),
+            longitude=self.rng.randint(-1800000000, 1800000000))
+
+    def GetFeature(self, stub):
+        stub.GetFeature(self.point(), timeout=self.args.deadline)
+
+    def GetFeatures(self, stub):
+        batch = route_guide_pb2.PointBatch(
+            points=[self.point() for _ in range(self.args.batch_size)])
+        stub.GetFeatures(batch, timeout=self.args.deadline)
+
+    def rectangle(self):
+        center = self.point()
+        half = self.args.rectangle_span // 2
+        return route_guide_pb2.Rectangle(
+            lo=route_guide_pb2.Point(latitude=center.latitude - half,
+                                     longitude=center.longitude - half),
+            hi=route_guide_pb2.Point(latitude=center.latitude + half,
+                                     longitude=center.longitude + half))
+
+    def ListFeatures(self, stub):
+        for _ in stub.ListFeatures(self.rectangle(),
+                                   timeout=self.args.deadline):
+            pass
+
+    def ListFeaturePages(self, stub):
+        request = route_guide_pb2.ListFeaturesRequest(
+            rectangle=self.rectangle(), page_size=self.args.page_size)
+        for _ in stub.ListFeaturePages(request, timeout=self.args.deadline):
+            pass
+
+    def RecordRoute(self, stub):
+        route = [self.point() for _ in range(self.args.route_points)]
+        stub.RecordRoute(iter(route), timeout=self.args.deadline)
+
+    def RouteChat(self, stub):
+        locations = [self.point() for _ in range(3)]
+        notes = [
+            route_guide_pb2.RouteNote(message="note %d" % i,
+                                      location=self.rng.choice(locations))
+            for i in range(self.args.chat_notes)
+        ]
+        for _ in stub.RouteChat(iter(notes), timeout=self.args.deadline):
+            pass
+
+
+def _client_thread(args, target, points, seed, measure_from, end_time,
+                   results):
+    rng = random.Random(seed)
+    workload = _Workload(args, points, rng)
+    weights = parse_mix(args.mix)
+    names = list(weights)
+    cumulative = []
+    total = 0.0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+    latencies = dict((name, []) for name in names)
+    errors = dict((name, 0) for name in names)
+    # Each thread has its own channel, so the load is spread over
+    # connections and, with --server-processes, over server workers.
+    with grpc.insecure_channel(
+            target,
+            options=(('grpc.use_local_subchannel_pool', 1),)) as channel:
+        stub = route_guide_pb2_grpc.RouteGuideStub(channel)
+        while True:
+            start = timeit.default_timer()
+            if start >= end_time:
+                break
+            name = rng.choices(names, cum_weights=cumulative)[0]
+            try:
+                getattr(workload, name)(stub)
+                failed = False
+            except grpc.RpcError:
+                failed = True
+            # Calls started during the warmup, including the connection
+            # setup, are not measured.
+            if start < measure_from:
+                continue
+            if failed:
+                errors[name] += 1
+            else:
+                latencies[name].append(timeit.default_timer() - start)
+    results.append((latencies, errors))
+
+
+def _merge(runs):
+    latencies = {}
+    errors = {}
+    for run_latencies, run_errors in runs:
+        for name, values in run_latencies.items():
+            latencies.setdefault(name, []).extend(values)
+        for name, count in run_errors.items():
+            errors[name] = errors.get(name, 0) + count
+    return latencies, errors
+
+
+def run_clients(args, target, seed):
+    """Runs args.concurrency client threads; returns (latencies, errors)."""
+    points = _load_points(args)
+    results = []
+    measure_from = timeit.default_timer() + args.warmup
+    end_time = measure_from + args.duration
+    threads = [
+        threading.Thread(target=_client_thread,
+                         args=(args, target, points, seed * 1000 + i,
+                               measure_from, end_time, results))
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _merge(results)
+
+
+def _run_clients(args_and_seed):
+    args, target, seed = args_and_seed
+    return run_clients(args, target, seed)
+
+
+def summarize(latencies, errors, seconds):
+    """Per-RPC throughput and latency percentiles in milliseconds."""
+    summary = {}
+    for name in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(name, []))
+        summary[name] = {
+            "calls": len(values),
+            "errors": errors.get(name, 0),
+            "throughput": len(values) / seconds,
+            "latency_ms": None,
+        }
+        if values:
+            summary[name]["latency_ms"] = {
+                "p50": route_guide_benchmark.percentile(values, 50) * 1e3,
+                "p95": route_guide_benchmark.percentile(values, 95) * 1e3,
+                "p99": route_guide_benchmark.percentile(values, 99) * 1e3,
+                "mean": sum(values) / len(values) * 1e3,
+                "max": values[-1] * 1e3,
+            }
+    return summary
+
+
+def _write_database(args, directory):
+    path = os.path.join(directory, "route_guide_db.bin")
+    store = route_guide_store.FeatureStore.from_items(
+        route_guide_benchmark.random_items(args.features, args.seed))
+    route_guide_binary.write_database(
+        path, store,
+        route_guide_index.GridIndex(store.latitudes, store.longitudes))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=sorted(_SERVERS),
+                        default="thread", help="server to start")
+    parser.add_argument("--server-processes", type=int, default=1,
+                        help="worker processes of the thread server")
+    parser.add_argument("--target",
+                        help="host:port of a running server; none is started")
+    parser.add_argument("--db", help="database the server serves; a random "
+                        "one of --features features by default")
+    parser.add_argument("--features", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", default=_DEFAULT_MIX,
+                        help="weighted RPC mix, e.g. %s" % _DEFAULT_MIX)
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="client threads per client process")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="client processes")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--deadline", type=float, default=30.0)
+    parser.add_argument("--hit-ratio", type=float, default=0.5,
+                        help="share of points that are feature locations")
+    parser.add_argument("--rectangle-span", type=int, default=5000000)
+    parser.add_argument("--route-points", type=int, default=100)
+    parser.add_argument("--chat-notes", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", help="file to write the JSON results to")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+
+    directory = tempfile.mkdtemp()
+    server = None
+    try:
+        target = args.target
+        if target is None:
+            if args.db is None:
+                args.db = _write_database(args, directory)
+            port = route_guide_benchmark.free_port()
+            extra = ["--db", os.path.abspath(args.db)]
+            if args.server == "thread":
+                extra += ["--processes", str(args.server_processes)]
+            server = route_guide_benchmark.start_server(
+                _SERVERS[args.server], port, *extra)
+            target = "localhost:%d" % port
+
+        if args.processes > 1:
+            context = multiprocessing.get_context("spawn")
+            pool = context.Pool(args.processes)
+            try:
+                runs = pool.map(_run_clients,
+                                [(args, target, seed)
+                                 for seed in range(args.processes)])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            runs = [run_clients(args, target, 0)]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(directory)
+
+    latencies, errors = _merge(runs)
+    summary = summarize(latencies, errors, args.duration)
+
+    print("%-14s %10s %8s %12s %10s %10s %10s" % (
+        "RPC", "calls", "errors", "calls/s", "p50 ms", "p95 ms", "p99 ms"))
+    for name, result in sorted(summary.items()):
+        latency = result["latency_ms"] or dict.fromkeys(
+            ("p50", "p95", "p99"), float("nan"))
+        print("%-14s %10d %8d %12.1f %10.2f %10.2f %10.2f" % (
+            name, result["calls"], result["errors"], result["throughput"],
+            latency["p50"], latency["p95"], latency["p99"]))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"timestamp": time.time(), "config": vars(args),
+                       "rpcs": summary}, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
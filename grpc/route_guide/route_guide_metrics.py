@@ -0,0 +1,331 @@
+"""RPC metrics for the route guide server, exposed in Prometheus text format.
+
+MetricsInterceptor records for every method its latency histogram, the
+RPCs in flight and the messages received and sent per stream.
+start_http_server() serves a MetricsRegistry on /metrics.  Recording costs
+a few dictionary lookups and one uncontended lock per observation, so it
+can stay on in production; see "route_guide_benchmark.py metrics".
+"""
+
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import timeit
+
+import grpc
+
+# Seconds.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MESSAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 10000, 100000)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n'))
+        for name, value in labels)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter(object):
+    """A count, or a function read at every scrape when given one."""
+
+    def __init__(self, function=None):
+        self._lock = threading.Lock()
+        self._function = function
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        value = self.value if self._function is None else self._function()
+        yield name + _format_labels(labels), value
+
+
+class Gauge(Counter):
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        # The last count is the +Inf bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield (name + "_bucket" + _format_labels(
+                labels + (("le", _format_value(bound)),)), cumulative)
+        yield name + "_sum" + _format_labels(labels), total
+        yield name + "_count" + _format_labels(labels), cumulative
+
+
+class MetricsRegistry(object):
+    """Metric families, each with one child per label values tuple."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help, label names, {label values: metric})
+        self._families = {}
+
+    def _child(self, kind, name, documentation, labels, factory):
+        label_names = tuple(sorted(labels))
+        label_values = tuple(labels[label] for label in label_names)
+        with self._lock:
+            family = self._families.setdefault(
+                name, (kind, documentation, label_names, {}))
+            if family[0] != kind or family[2] != label_names:
+                raise ValueError("metric %s redefined" % name)
+            children = family[3]
+            if label_values not in children:
+                children[label_values] = factory()
+            return children[label_values]
+
+    def counter(self, name, documentation, function=None, **labels):
+        return self._child("counter", name, documentation, labels,
+                           lambda: Counter(function))
+
+    def gauge(self, name, documentation, function=None, **labels):
+        return self._child("gauge", name, documentation, labels,
+                           lambda: Gauge(function))
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS,
+                  **labels):
+        return self._child("histogram", name, documentation, labels,
+                           lambda: Histogram(buckets))
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            families = [(name, kind, documentation, label_names,
+                         list(children.items()))
+                        for name, (kind, documentation, label_names,
+                                   children) in self._families.items()]
+        lines = []
+        for name, kind, documentation, label_names, children in sorted(
+                families):
+            lines.append("# HELP %s %s" % (name, documentation))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for label_values, metric in sorted(children,
+                                               key=lambda child: child[0]):
+                labels = tuple(zip(label_names, label_values))
+                for sample, value in metric.samples(name, labels):
+                    lines.append("%s %s" % (sample, _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+class _MethodMetrics(object):
+
+    def __init__(self, registry, method):
+        self.latency = registry.histogram(
+            "route_guide_rpc_duration_seconds",
+            "Time from the start of an RPC to its last response.",
+            method=method)
+        self.in_flight = registry.gauge(
+            "route_guide_rpc_in_flight", "RPCs being handled.", method=method)
+        self.failures = registry.counter(
+            "route_guide_rpc_failures_total",
+            "RPCs whose handler raised.", method=method)
+        self.received = registry.histogram(
+            "route_guide_rpc_messages_received",
+            "Request messages per client-streaming RPC.",
+            buckets=MESSAGE_BUCKETS, method=method)
+        self.sent = registry.histogram(
+            "route_guide_rpc_messages_sent",
+            "Response messages per server-streaming RPC.",
+            buckets=MESSAGE_BUCKETS, method=method)
+
+
+class _Stream(object):
+    """Accounts for one streaming RPC until finish() is called."""
+
+    def __init__(self, metrics, request_streaming, response_streaming):
+        self.metrics = metrics
+        self.request_streaming = request_streaming
+        self.response_streaming = response_streaming
+        self.received = 0
+        self.sent = 0
+        self.start = timeit.default_timer()
+        metrics.in_flight.inc()
+
+    def count_requests(self, request_iterator):
+        for request in request_iterator:
+            self.received += 1
+            yield request
+
+    def count_responses(self, response_iterator):
+        try:
+            for response in response_iterator:
+                self.sent += 1
+                yield response
+        except Exception:
+            self.metrics.failures.inc()
+            raise
+        finally:
+            self.finish()
+
+    def finish(self):
+        metrics = self.metrics
+        metrics.latency.observe(timeit.default_timer() - self.start)
+        metrics.in_flight.dec()
+        if self.request_streaming:
+            metrics.received.observe(self.received)
+        if self.response_streaming:
+            metrics.sent.observe(self.sent)
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records per-method RPC metrics in a MetricsRegistry."""
+
+    def __init__(self, registry):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def _metrics(self, method):
+        metrics = self._methods.get(method)
+        if metrics is None:
+            with self._lock:
+                metrics = self._methods.get(method)
+                if metrics is None:
+                    metrics = self._methods[method] = _MethodMetrics(
+                        self._registry, method.rsplit('/', 1)[-1])
+        return metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        metrics = self._metrics(handler_call_details.method)
+        request_streaming = handler.request_streaming
+        response_streaming = handler.response_streaming
+        if request_streaming and response_streaming:
+            behavior = handler.stream_stream
+            factory = grpc.stream_stream_rpc_method_handler
+        elif request_streaming:
+            behavior = handler.stream_unary
+            factory = grpc.stream_unary_rpc_method_handler
+        elif response_streaming:
+            behavior = handler.unary_stream
+            factory = grpc.unary_stream_rpc_method_handler
+        else:
+            behavior = handler.unary_unary
+            factory = grpc.unary_unary_rpc_method_handler
+
+        def handle_unary(request, context):
+            # The common case, kept to one timer pair and two gauge updates.
+            start = timeit.default_timer()
+            metrics.in_flight.inc()
+            try:
+                return behavior(request, context)
+            except Exception:
+                metrics.failures.inc()
+                raise
+            finally:
+                metrics.latency.observe(timeit.default_timer() - start)
+                metrics.in_flight.dec()
+
+        def handle_stream(request_or_iterator, context):
+            stream = _Stream(metrics, request_streaming, response_streaming)
+            if request_streaming:
+                request_or_iterator = stream.count_requests(
+                    request_or_iterator)
+            try:
+                response = behavior(request_or_iterator, context)
+            except Exception:
+                metrics.failures.inc()
+                stream.finish()
+                raise
+            if response_streaming:
+                return stream.count_responses(response)
+            stream.finish()
+            return response
+
+        handle = (handle_stream if request_streaming or response_streaming
+                  else handle_unary)
+        return factory(handle,
+                       request_deserializer=handler.request_deserializer,
+                       response_serializer=handler.response_serializer)
+
+
+def monitor_executor(registry, executor):
+    """Exports the backlog of a concurrent.futures.ThreadPoolExecutor.
+
+    The backlog is read from the private _work_queue of the executor;
+    for an executor without one, no gauge is exported.
+    """
+    work_queue = getattr(executor, "_work_queue", None)
+    if work_queue is None:
+        return
+    registry.gauge("route_guide_executor_queue_depth",
+                   "RPCs waiting for a server thread.",
+                   function=work_queue.qsize)
+
+
+def monitor_cache(registry, cache):
+    """Exports the counters of a route_guide_cache.ResponseCache."""
+    registry.counter("route_guide_cache_hits_total",
+                     "Responses sent from the response cache.",
+                     function=lambda: cache.hits)
+    registry.counter("route_guide_cache_misses_total",
+                     "Responses not found in the response cache.",
+                     function=lambda: cache.misses)
+    registry.counter("route_guide_cache_evictions_total",
+                     "Responses evicted from the response cache.",
+                     function=lambda: cache.evictions)
+    registry.gauge("route_guide_cache_bytes",
+                   "Bytes held by the response cache.",
+                   function=lambda: cache.size)
+
+
+def start_http_server(registry, port, address='127.0.0.1'):
+    """Serves registry on http://address:port/metrics from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
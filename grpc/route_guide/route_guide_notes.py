@@ -0,0 +1,173 @@
+"""Route notes kept by location for RouteChat."""
+
+import collections
+import threading
+import time
+
+# Notes kept per RouteChat stream unless the servicer is told otherwise.
+DEFAULT_MAX_NOTES = 10000
+
+DEFAULT_SHARDS = 64
+DEFAULT_MAX_NOTES_PER_LOCATION = 100
+# Notes pushed to a shared RouteChat stream that may wait to be sent before
+# further ones are dropped.
+OUTBOX_SIZE = 1000
+
+
+def location_key(point):
+    return point.latitude, point.longitude
+
+
+class NoteIndex(object):
+    """Notes received on one RouteChat stream, keyed by location.
+
+    notes_at() costs O(notes at the location) instead of a scan over every
+    note of the stream.  With max_notes the index holds at most that many
+    notes, evicting the oldest note of the least recently used location
+    first; with max_age notes older than max_age seconds are no longer
+    returned and are dropped as the index is used.
+    """
+
+    def __init__(self, max_notes=DEFAULT_MAX_NOTES, max_age=None,
+                 clock=time.monotonic):
+        self.max_notes = max_notes
+        self.max_age = max_age
+        self._clock = clock
+        # location -> deque of (received, note), least recently used first.
+        self._locations = collections.OrderedDict()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _expire(self, key, notes, now):
+        while notes and now - notes[0][0] > self.max_age:
+            notes.popleft()
+            self._count -= 1
+        if not notes:
+            del self._locations[key]
+
+    def notes_at(self, location):
+        """Returns the notes at location, oldest first."""
+        key = location_key(location)
+        notes = self._locations.get(key)
+        if notes is None:
+            return []
+        if self.max_age is not None:
+            self._expire(key, notes, self._clock())
+            if not notes:
+                return []
+        self._locations.move_to_end(key)
+        return [note for _, note in notes]
+
+    def add(self, note):
+        key = location_key(note.location)
+        now = self._clock()
+        notes = self._locations.get(key)
+        if notes is None:
+            notes = self._locations[key] = collections.deque()
+        else:
+            self._locations.move_to_end(key)
+        notes.append((now, note))
+        self._count += 1
+        self._evict(now)
+
+    def _evict(self, now):
+        locations = self._locations
+        if self.max_age is not None:
+            while locations:
+                key, notes = next(iter(locations.items()))
+                if now - notes[0][0] <= self.max_age:
+                    break
+                self._expire(key, notes, now)
+        if self.max_notes is not None:
+            while self._count > self.max_notes:
+                key, notes = next(iter(locations.items()))
+                notes.popleft()
+                self._count -= 1
+                if not notes:
+                    del locations[key]
+
+
+class _Shard(object):
+
+    def __init__(self, max_notes_per_location):
+        self.lock = threading.Lock()
+        self.notes = collections.defaultdict(
+            lambda: collections.deque(maxlen=max_notes_per_location))
+        self.watchers = collections.defaultdict(set)
+
+
+class Subscription(object):
+    """One RouteChat stream attached to a SharedNoteStore.
+
+    deliver(note) is called with every note another subscription publishes
+    at a location this one has visited.  It runs on the publisher's thread
+    outside of any store lock and must not block.
+    """
+
+    def __init__(self, store, deliver):
+        self._store = store
+        self.deliver = deliver
+        # Always taken before a shard lock.
+        self._lock = threading.Lock()
+        self._visited = set()
+        self._closed = False
+
+    def publish(self, note):
+        """Leaves note at its location and starts watching the location.
+
+        Returns the notes left there before, oldest first.
+        """
+        key = location_key(note.location)
+        shard = self._store._shard(key)
+        with self._lock:
+            if self._closed:
+                return []
+            with shard.lock:
+                notes = shard.notes[key]
+                history = list(notes)
+                notes.append(note)
+                watchers = shard.watchers[key]
+                others = [watcher for watcher in watchers
+                          if watcher is not self]
+                watchers.add(self)
+            self._visited.add(key)
+        for watcher in others:
+            watcher.deliver(note)
+        return history
+
+    def close(self):
+        """Stops watching every visited location."""
+        with self._lock:
+            self._closed = True
+            for key in self._visited:
+                shard = self._store._shard(key)
+                with shard.lock:
+                    watchers = shard.watchers.get(key)
+                    if watchers is not None:
+                        watchers.discard(self)
+                        if not watchers:
+                            del shard.watchers[key]
+            self._visited.clear()
+
+
+class SharedNoteStore(object):
+    """Route notes shared by every RouteChat stream of a server.
+
+    Locations are spread over shards with one lock each, so streams at
+    different locations rarely contend.  Each location keeps its last
+    max_notes_per_location notes, and a note published at a location is
+    pushed to every subscription that has visited it.
+    """
+
+    def __init__(self, shards=DEFAULT_SHARDS,
+                 max_notes_per_location=DEFAULT_MAX_NOTES_PER_LOCATION):
+        self._shards = [_Shard(max_notes_per_location)
+                        for _ in range(shards)]
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def subscribe(self, deliver):
+        return Subscription(self, deliver)
@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
 # source: route_guide.proto
 
@@ -19,7 +20,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   package='routeguide',
   syntax='proto3',
   serialized_options=None,
-  serialized_pb=_b('\n\x11route_guide.proto\x12\nrouteguide\",\n\x05Point\x12\x10\n\x08latitude\x18\x01 \x01(\x05\x12\x11\n\tlongitude\x18\x02 \x01(\x05\"I\n\tRectangle\x12\x1d\n\x02lo\x18\x01 \x01(\x0b\x32\x11.routeguide.Point\x12\x1d\n\x02hi\x18\x02 \x01(\x0b\x32\x11.routeguide.Point\"<\n\x07\x46\x65\x61ture\x12\x0c\n\x04name\x18\x01 \x01(\t\x12#\n\x08location\x18\x02 \x01(\x0b\x32\x11.routeguide.Point\"A\n\tRouteNote\x12#\n\x08location\x18\x01 \x01(\x0b\x32\x11.routeguide.Point\x12\x0f\n\x07message\x18\x02 \x01(\t\"b\n\x0cRouteSummary\x12\x13\n\x0bpoint_count\x18\x01 \x01(\x05\x12\x15\n\rfeature_count\x18\x02 \x01(\x05\x12\x10\n\x08\x64istance\x18\x03 \x01(\x05\x12\x14\n\x0c\x65lapsed_time\x18\x04 \x01(\x05\x32\x85\x02\n\nRouteGuide\x12\x36\n\nGetFeature\x12\x11.routeguide.Point\x1a\x13.routeguide.Feature\"\x00\x12>\n\x0cListFeatures\x12\x15.routeguide.Rectangle\x1a\x13.routeguide.Feature\"\x00\x30\x01\x12>\n\x0bRecordRoute\x12\x11.routeguide.Point\x1a\x18.routeguide.RouteSummary\"\x00(\x01\x12?\n\tRouteChat\x12\x15.routeguide.RouteNote\x1a\x15.routeguide.RouteNote\"\x00(\x01\x30\x01\x62\x06proto3')
+  serialized_pb=_b('\n\x11route_guide.proto\x12\nrouteguide\",\n\x05Point\x12\x10\n\x08latitude\x18\x01 \x01(\x05\x12\x11\n\tlongitude\x18\x02 \x01(\x05\"I\n\tRectangle\x12\x1d\n\x02lo\x18\x01 \x01(\x0b\x32\x11.routeguide.Point\x12\x1d\n\x02hi\x18\x02 \x01(\x0b\x32\x11.routeguide.Point\"<\n\x07\x46\x65\x61ture\x12\x0c\n\x04name\x18\x01 \x01(\t\x12#\n\x08location\x18\x02 \x01(\x0b\x32\x11.routeguide.Point\"A\n\tRouteNote\x12#\n\x08location\x18\x01 \x01(\x0b\x32\x11.routeguide.Point\x12\x0f\n\x07message\x18\x02 \x01(\t\"b\n\x0cRouteSummary\x12\x13\n\x0bpoint_count\x18\x01 \x01(\x05\x12\x15\n\rfeature_count\x18\x02 \x01(\x05\x12\x10\n\x08\x64istance\x18\x03 \x01(\x05\x12\x14\n\x0c\x65lapsed_time\x18\x04 \x01(\x05\"/\n\nPointBatch\x12!\n\x06points\x18\x01 \x03(\x0b\x32\x11.routeguide.Point\"5\n\x0c\x46\x65\x61tureBatch\x12%\n\x08\x66\x65\x61tures\x18\x01 \x03(\x0b\x32\x13.routeguide.Feature\"{\n\x13ListFeaturesRequest\x12(\n\trectangle\x18\x01 \x01(\x0b\x32\x15.routeguide.Rectangle\x12\x13\n\x0bmax_results\x18\x02 \x01(\x05\x12\x11\n\tpage_size\x18\x03 \x01(\x05\x12\x12\n\npage_token\x18\x04 \x01(\t\"M\n\x0b\x46\x65\x61turePage\x12%\n\x08\x66\x65\x61tures\x18\x01 \x03(\x0b\x32\x13.routeguide.Feature\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"S\n\x0eNearestRequest\x12 \n\x05point\x18\x01 \x01(\x0b\x32\x11.routeguide.Point\x12\t\n\x01k\x18\x02 \x01(\x05\x12\x14\n\x0cmax_distance\x18\x03 \x01(\x05\"G\n\rNearbyFeature\x12$\n\x07\x66\x65\x61ture\x18\x01 \x01(\x0b\x32\x13.routeguide.Feature\x12\x10\n\x08\x64istance\x18\x02 \x01(\x01\"=\n\x0eNearbyFeatures\x12+\n\x08\x66\x65\x61tures\x18\x01 \x03(\x0b\x32\x19.routeguide.NearbyFeature2\xfa\x04\n\nRouteGuide\x12\x36\n\nGetFeature\x12\x11.routeguide.Point\x1a\x13.routeguide.Feature\"\x00\x12>\n\x0cListFeatures\x12\x15.routeguide.Rectangle\x1a\x13.routeguide.Feature\"\x00\x30\x01\x12>\n\x0bRecordRoute\x12\x11.routeguide.Point\x1a\x18.routeguide.RouteSummary\"\x00(\x01\x12?\n\tRouteChat\x12\x15.routeguide.RouteNote\x1a\x15.routeguide.RouteNote\"\x00(\x01\x30\x01\x12\x41\n\x0bGetFeatures\x12\x16.routeguide.PointBatch\x1a\x18.routeguide.FeatureBatch\"\x00\x12H\n\x0eStreamFeatures\x12\x16.routeguide.PointBatch\x1a\x18.routeguide.FeatureBatch\"\x00(\x01\x30\x01\x12P\n\x10ListFeaturePages\x12\x1f.routeguide.ListFeaturesRequest\x1a\x17.routeguide.FeaturePage\"\x00\x30\x01\x12\x43\n\x11GetNearestFeature\x12\x11.routeguide.Point\x1a\x19.routeguide.NearbyFeature\"\x00\x12O\n\x13ListNearestFeatures\x12\x1a.routeguide.NearestRequest\x1a\x1a.routeguide.NearbyFeatures\"\x00\x62\x06proto3')
 )
 
 
@@ -228,52 +229,381 @@ _ROUTESUMMARY = _descriptor.Descriptor(
   serialized_end=381,
 )
 
+
+_POINTBATCH = _descriptor.Descriptor(
+  name='PointBatch',
+  full_name='routeguide.PointBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='points', full_name='routeguide.PointBatch.points', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=383,
+  serialized_end=430,
+)
+
+
+_FEATUREBATCH = _descriptor.Descriptor(
+  name='FeatureBatch',
+  full_name='routeguide.FeatureBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='features', full_name='routeguide.FeatureBatch.features', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=432,
+  serialized_end=485,
+)
+
+
+_LISTFEATURESREQUEST = _descriptor.Descriptor(
+  name='ListFeaturesRequest',
+  full_name='routeguide.ListFeaturesRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='rectangle', full_name='routeguide.ListFeaturesRequest.rectangle', index=0,
+      number=1, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='max_results', full_name='routeguide.ListFeaturesRequest.max_results', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='page_size', full_name='routeguide.ListFeaturesRequest.page_size', index=2,
+      number=3, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='page_token', full_name='routeguide.ListFeaturesRequest.page_token', index=3,
+      number=4, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=487,
+  serialized_end=610,
+)
+
+
+_FEATUREPAGE = _descriptor.Descriptor(
+  name='FeaturePage',
+  full_name='routeguide.FeaturePage',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='features', full_name='routeguide.FeaturePage.features', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='next_page_token', full_name='routeguide.FeaturePage.next_page_token', index=1,
+      number=2, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=612,
+  serialized_end=689,
+)
+
+
+_NEARESTREQUEST = _descriptor.Descriptor(
+  name='NearestRequest',
+  full_name='routeguide.NearestRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='point', full_name='routeguide.NearestRequest.point', index=0,
+      number=1, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='k', full_name='routeguide.NearestRequest.k', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='max_distance', full_name='routeguide.NearestRequest.max_distance', index=2,
+      number=3, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=691,
+  serialized_end=774,
+)
+
+
+_NEARBYFEATURE = _descriptor.Descriptor(
+  name='NearbyFeature',
+  full_name='routeguide.NearbyFeature',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='feature', full_name='routeguide.NearbyFeature.feature', index=0,
+      number=1, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='distance', full_name='routeguide.NearbyFeature.distance', index=1,
+      number=2, type=1, cpp_type=5, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=776,
+  serialized_end=847,
+)
+
+
+_NEARBYFEATURES = _descriptor.Descriptor(
+  name='NearbyFeatures',
+  full_name='routeguide.NearbyFeatures',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='features', full_name='routeguide.NearbyFeatures.features', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=849,
+  serialized_end=910,
+)
+
 _RECTANGLE.fields_by_name['lo'].message_type = _POINT
 _RECTANGLE.fields_by_name['hi'].message_type = _POINT
 _FEATURE.fields_by_name['location'].message_type = _POINT
 _ROUTENOTE.fields_by_name['location'].message_type = _POINT
+_POINTBATCH.fields_by_name['points'].message_type = _POINT
+_FEATUREBATCH.fields_by_name['features'].message_type = _FEATURE
+_LISTFEATURESREQUEST.fields_by_name['rectangle'].message_type = _RECTANGLE
+_FEATUREPAGE.fields_by_name['features'].message_type = _FEATURE
+_NEARESTREQUEST.fields_by_name['point'].message_type = _POINT
+_NEARBYFEATURE.fields_by_name['feature'].message_type = _FEATURE
+_NEARBYFEATURES.fields_by_name['features'].message_type = _NEARBYFEATURE
 DESCRIPTOR.message_types_by_name['Point'] = _POINT
 DESCRIPTOR.message_types_by_name['Rectangle'] = _RECTANGLE
 DESCRIPTOR.message_types_by_name['Feature'] = _FEATURE
 DESCRIPTOR.message_types_by_name['RouteNote'] = _ROUTENOTE
 DESCRIPTOR.message_types_by_name['RouteSummary'] = _ROUTESUMMARY
+DESCRIPTOR.message_types_by_name['PointBatch'] = _POINTBATCH
+DESCRIPTOR.message_types_by_name['FeatureBatch'] = _FEATUREBATCH
+DESCRIPTOR.message_types_by_name['ListFeaturesRequest'] = _LISTFEATURESREQUEST
+DESCRIPTOR.message_types_by_name['FeaturePage'] = _FEATUREPAGE
+DESCRIPTOR.message_types_by_name['NearestRequest'] = _NEARESTREQUEST
+DESCRIPTOR.message_types_by_name['NearbyFeature'] = _NEARBYFEATURE
+DESCRIPTOR.message_types_by_name['NearbyFeatures'] = _NEARBYFEATURES
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
-Point = _reflection.GeneratedProtocolMessageType('Point', (_message.Message,), dict(
-  DESCRIPTOR = _POINT,
-  __module__ = 'route_guide_pb2'
+Point = _reflection.GeneratedProtocolMessageType('Point', (_message.Message,), {
+  'DESCRIPTOR' : _POINT,
+  '__module__' : 'route_guide_pb2'
   # @@protoc_insertion_point(class_scope:routeguide.Point)
-  ))
+  })
 _sym_db.RegisterMessage(Point)
 
-Rectangle = _reflection.GeneratedProtocolMessageType('Rectangle', (_message.Message,), dict(
-  DESCRIPTOR = _RECTANGLE,
-  __module__ = 'route_guide_pb2'
+Rectangle = _reflection.GeneratedProtocolMessageType('Rectangle', (_message.Message,), {
+  'DESCRIPTOR' : _RECTANGLE,
+  '__module__' : 'route_guide_pb2'
   # @@protoc_insertion_point(class_scope:routeguide.Rectangle)
-  ))
+  })
 _sym_db.RegisterMessage(Rectangle)
 
-Feature = _reflection.GeneratedProtocolMessageType('Feature', (_message.Message,), dict(
-  DESCRIPTOR = _FEATURE,
-  __module__ = 'route_guide_pb2'
+Feature = _reflection.GeneratedProtocolMessageType('Feature', (_message.Message,), {
+  'DESCRIPTOR' : _FEATURE,
+  '__module__' : 'route_guide_pb2'
   # @@protoc_insertion_point(class_scope:routeguide.Feature)
-  ))
+  })
 _sym_db.RegisterMessage(Feature)
 
-RouteNote = _reflection.GeneratedProtocolMessageType('RouteNote', (_message.Message,), dict(
-  DESCRIPTOR = _ROUTENOTE,
-  __module__ = 'route_guide_pb2'
+RouteNote = _reflection.GeneratedProtocolMessageType('RouteNote', (_message.Message,), {
+  'DESCRIPTOR' : _ROUTENOTE,
+  '__module__' : 'route_guide_pb2'
   # @@protoc_insertion_point(class_scope:routeguide.RouteNote)
-  ))
+  })
 _sym_db.RegisterMessage(RouteNote)
 
-RouteSummary = _reflection.GeneratedProtocolMessageType('RouteSummary', (_message.Message,), dict(
-  DESCRIPTOR = _ROUTESUMMARY,
-  __module__ = 'route_guide_pb2'
+RouteSummary = _reflection.GeneratedProtocolMessageType('RouteSummary', (_message.Message,), {
+  'DESCRIPTOR' : _ROUTESUMMARY,
+  '__module__' : 'route_guide_pb2'
   # @@protoc_insertion_point(class_scope:routeguide.RouteSummary)
-  ))
+  })
 _sym_db.RegisterMessage(RouteSummary)
 
+PointBatch = _reflection.GeneratedProtocolMessageType('PointBatch', (_message.Message,), {
+  'DESCRIPTOR' : _POINTBATCH,
+  '__module__' : 'route_guide_pb2'
+  # @@protoc_insertion_point(class_scope:routeguide.PointBatch)
+  })
+_sym_db.RegisterMessage(PointBatch)
+
+FeatureBatch = _reflection.GeneratedProtocolMessageType('FeatureBatch', (_message.Message,), {
+  'DESCRIPTOR' : _FEATUREBATCH,
+  '__module__' : 'route_guide_pb2'
+  # @@protoc_insertion_point(class_scope:routeguide.FeatureBatch)
+  })
+_sym_db.RegisterMessage(FeatureBatch)
+
+ListFeaturesRequest = _reflection.GeneratedProtocolMessageType('ListFeaturesRequest', (_message.Message,), {
+  'DESCRIPTOR' : _LISTFEATURESREQUEST,
+  '__module__' : 'route_guide_pb2'
+  # @@protoc_insertion_point(class_scope:routeguide.ListFeaturesRequest)
+  })
+_sym_db.RegisterMessage(ListFeaturesRequest)
+
+FeaturePage = _reflection.GeneratedProtocolMessageType('FeaturePage', (_message.Message,), {
+  'DESCRIPTOR' : _FEATUREPAGE,
+  '__module__' : 'route_guide_pb2'
+  # @@protoc_insertion_point(class_scope:routeguide.FeaturePage)
+  })
+_sym_db.RegisterMessage(FeaturePage)
+
+NearestRequest = _reflection.GeneratedProtocolMessageType('NearestRequest', (_message.Message,), {
+  'DESCRIPTOR' : _NEARESTREQUEST,
+  '__module__' : 'route_guide_pb2'
+  # @@protoc_insertion_point(class_scope:routeguide.NearestRequest)
+  })
+_sym_db.RegisterMessage(NearestRequest)
+
+NearbyFeature = _reflection.GeneratedProtocolMessageType('NearbyFeature', (_message.Message,), {
+  'DESCRIPTOR' : _NEARBYFEATURE,
+  '__module__' : 'route_guide_pb2'
+  # @@protoc_insertion_point(class_scope:routeguide.NearbyFeature)
+  })
+_sym_db.RegisterMessage(NearbyFeature)
+
+NearbyFeatures = _reflection.GeneratedProtocolMessageType('NearbyFeatures', (_message.Message,), {
+  'DESCRIPTOR' : _NEARBYFEATURES,
+  '__module__' : 'route_guide_pb2'
+  # @@protoc_insertion_point(class_scope:routeguide.NearbyFeatures)
+  })
+_sym_db.RegisterMessage(NearbyFeatures)
+
 
 
 _ROUTEGUIDE = _descriptor.ServiceDescriptor(
@@ -282,8 +612,8 @@ _ROUTEGUIDE = _descriptor.ServiceDescriptor(
   file=DESCRIPTOR,
   index=0,
   serialized_options=None,
-  serialized_start=384,
-  serialized_end=645,
+  serialized_start=913,
+  serialized_end=1547,
   methods=[
   _descriptor.MethodDescriptor(
     name='GetFeature',
@@ -321,6 +651,51 @@ _ROUTEGUIDE = _descriptor.ServiceDescriptor(
     output_type=_ROUTENOTE,
     serialized_options=None,
   ),
+  _descriptor.MethodDescriptor(
+    name='GetFeatures',
+    full_name='routeguide.RouteGuide.GetFeatures',
+    index=4,
+    containing_service=None,
+    input_type=_POINTBATCH,
+    output_type=_FEATUREBATCH,
+    serialized_options=None,
+  ),
+  _descriptor.MethodDescriptor(
+    name='StreamFeatures',
+    full_name='routeguide.RouteGuide.StreamFeatures',
+    index=5,
+    containing_service=None,
+    input_type=_POINTBATCH,
+    output_type=_FEATUREBATCH,
+    serialized_options=None,
+  ),
+  _descriptor.MethodDescriptor(
+    name='ListFeaturePages',
+    full_name='routeguide.RouteGuide.ListFeaturePages',
+    index=6,
+    containing_service=None,
+    input_type=_LISTFEATURESREQUEST,
+    output_type=_FEATUREPAGE,
+    serialized_options=None,
+  ),
+  _descriptor.MethodDescriptor(
+    name='GetNearestFeature',
+    full_name='routeguide.RouteGuide.GetNearestFeature',
+    index=7,
+    containing_service=None,
+    input_type=_POINT,
+    output_type=_NEARBYFEATURE,
+    serialized_options=None,
+  ),
+  _descriptor.MethodDescriptor(
+    name='ListNearestFeatures',
+    full_name='routeguide.RouteGuide.ListNearestFeatures',
+    index=8,
+    containing_service=None,
+    input_type=_NEARESTREQUEST,
+    output_type=_NEARBYFEATURES,
+    serialized_options=None,
+  ),
 ])
 _sym_db.RegisterServiceDescriptor(_ROUTEGUIDE)
 
@@ -34,6 +34,31 @@ class RouteGuideStub(object):
         request_serializer=route__guide__pb2.RouteNote.SerializeToString,
         response_deserializer=route__guide__pb2.RouteNote.FromString,
         )
+    self.GetFeatures = channel.unary_unary(
+        '/routeguide.RouteGuide/GetFeatures',
+        request_serializer=route__guide__pb2.PointBatch.SerializeToString,
+        response_deserializer=route__guide__pb2.FeatureBatch.FromString,
+        )
+    self.StreamFeatures = channel.stream_stream(
+        '/routeguide.RouteGuide/StreamFeatures',
+        request_serializer=route__guide__pb2.PointBatch.SerializeToString,
+        response_deserializer=route__guide__pb2.FeatureBatch.FromString,
+        )
+    self.ListFeaturePages = channel.unary_stream(
+        '/routeguide.RouteGuide/ListFeaturePages',
+        request_serializer=route__guide__pb2.ListFeaturesRequest.SerializeToString,
+        response_deserializer=route__guide__pb2.FeaturePage.FromString,
+        )
+    self.GetNearestFeature = channel.unary_unary(
+        '/routeguide.RouteGuide/GetNearestFeature',
+        request_serializer=route__guide__pb2.Point.SerializeToString,
+        response_deserializer=route__guide__pb2.NearbyFeature.FromString,
+        )
+    self.ListNearestFeatures = channel.unary_unary(
+        '/routeguide.RouteGuide/ListNearestFeatures',
+        request_serializer=route__guide__pb2.NearestRequest.SerializeToString,
+        response_deserializer=route__guide__pb2.NearbyFeatures.FromString,
+        )
 
 
 class RouteGuideServicer(object):
@@ -68,6 +93,43 @@ class RouteGuideServicer(object):
     context.set_details('Method not implemented!')
     raise NotImplementedError('Method not implemented!')
 
+  def GetFeatures(self, request, context):
+    """Obtains the features at a batch of positions.
+    """
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details('Method not implemented!')
+    raise NotImplementedError('Method not implemented!')
+
+  def StreamFeatures(self, request_iterator, context):
+    """A Bidirectional streaming RPC answering each batch of positions.
+    """
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details('Method not implemented!')
+    raise NotImplementedError('Method not implemented!')
+
+  def ListFeaturePages(self, request, context):
+    """A server-to-client streaming RPC sending the features inside a
+    rectangle in pages, spatially ordered, that can be resumed from a
+    page token.
+    """
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details('Method not implemented!')
+    raise NotImplementedError('Method not implemented!')
+
+  def GetNearestFeature(self, request, context):
+    """Obtains the feature nearest to a given position.
+    """
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details('Method not implemented!')
+    raise NotImplementedError('Method not implemented!')
+
+  def ListNearestFeatures(self, request, context):
+    """Obtains the k features nearest to a given position, nearest first.
+    """
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details('Method not implemented!')
+    raise NotImplementedError('Method not implemented!')
+
 
 def add_RouteGuideServicer_to_server(servicer, server):
   rpc_method_handlers = {
@@ -91,6 +153,31 @@ def add_RouteGuideServicer_to_server(servicer, server):
           request_deserializer=route__guide__pb2.RouteNote.FromString,
           response_serializer=route__guide__pb2.RouteNote.SerializeToString,
       ),
+      'GetFeatures': grpc.unary_unary_rpc_method_handler(
+          servicer.GetFeatures,
+          request_deserializer=route__guide__pb2.PointBatch.FromString,
+          response_serializer=route__guide__pb2.FeatureBatch.SerializeToString,
+      ),
+      'StreamFeatures': grpc.stream_stream_rpc_method_handler(
+          servicer.StreamFeatures,
+          request_deserializer=route__guide__pb2.PointBatch.FromString,
+          response_serializer=route__guide__pb2.FeatureBatch.SerializeToString,
+      ),
+      'ListFeaturePages': grpc.unary_stream_rpc_method_handler(
+          servicer.ListFeaturePages,
+          request_deserializer=route__guide__pb2.ListFeaturesRequest.FromString,
+          response_serializer=route__guide__pb2.FeaturePage.SerializeToString,
+      ),
+      'GetNearestFeature': grpc.unary_unary_rpc_method_handler(
+          servicer.GetNearestFeature,
+          request_deserializer=route__guide__pb2.Point.FromString,
+          response_serializer=route__guide__pb2.NearbyFeature.SerializeToString,
+      ),
+      'ListNearestFeatures': grpc.unary_unary_rpc_method_handler(
+          servicer.ListNearestFeatures,
+          request_deserializer=route__guide__pb2.NearestRequest.FromString,
+          response_serializer=route__guide__pb2.NearbyFeatures.SerializeToString,
+      ),
   }
   generic_handler = grpc.method_handlers_generic_handler(
       'routeguide.RouteGuide', rpc_method_handlers)
@@ -0,0 +1,253 @@
+"""A route guide client spreading calls over a pool of channels.
+
+RouteGuidePool keeps channels_per_target channels to each of several
+server addresses, each with a connection of its own, and sends every call
+over the channel picked by its policy:
+
+  round_robin: the channels in turn.
+  least_loaded: the channel with the fewest calls in flight.
+
+Unary calls get a deadline, are retried on another channel when the
+server is unavailable and, with hedge_delay, are sent again on another
+channel when no answer came within hedge_delay seconds; the first answer
+wins and the other attempts are cancelled.  map() keeps many calls in
+flight from one process, which is what it takes to saturate a server
+started with --processes.
+
+Usage:
+  with RouteGuidePool(["host1:50051", "host2:50051"]) as pool:
+      feature = pool.get_feature(point)
+      features = list(pool.map("GetFeature", points, concurrency=64))
+"""
+
+import collections
+from concurrent import futures
+import itertools
+import queue
+import random
+import threading
+import time
+
+import grpc
+
+import route_guide_pb2_grpc
+
+POLICIES = ("round_robin", "least_loaded")
+
+# Codes after which a unary call is sent again.  The server has not acted
+# on the request, or the methods are idempotent reads either way.
+RETRYABLE_CODES = frozenset((grpc.StatusCode.UNAVAILABLE,
+                             grpc.StatusCode.RESOURCE_EXHAUSTED))
+
+
+class _Channel(object):
+
+    def __init__(self, target, options):
+        self.target = target
+        self.channel = grpc.insecure_channel(target, options=options)
+        self.stub = route_guide_pb2_grpc.RouteGuideStub(self.channel)
+        self.in_flight = 0
+
+
+class _Stream(object):
+    """The responses of a streaming call, counted in flight on its channel.
+
+    The count is released when the call ends: all responses read, failed,
+    or cancelled by close(), which also runs when the stream is used as a
+    context manager or garbage collected unread.
+    """
+
+    def __init__(self, pool, channel, responses):
+        self._responses = responses
+        # grpc calls a done callback exactly once, right away if the call
+        # has already ended.
+        responses.add_done_callback(lambda call: pool._release(channel))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._responses)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Cancels the call if it is still running."""
+        self._responses.cancel()
+
+
+class RouteGuidePool(object):
+    """Load-balanced, retrying RouteGuide client over many channels.
+
+    Thread-safe; one pool is meant to be shared by a whole process.
+    """
+
+    def __init__(self, targets, channels_per_target=4, policy="round_robin",
+                 timeout=10.0, retries=2, hedge_delay=None, backoff=0.05,
+                 keepalive_time=30.0, options=()):
+        if policy not in POLICIES:
+            raise ValueError("unknown policy %r" % policy)
+        if isinstance(targets, str):
+            targets = [targets]
+        options = (
+            # Without a subchannel pool of its own every channel to a
+            # target would share one connection, and a server running
+            # several processes would see a single client.
+            ('grpc.use_local_subchannel_pool', 1),
+            ('grpc.keepalive_time_ms', int(keepalive_time * 1000)),
+            ('grpc.keepalive_timeout_ms', 10000),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.max_pings_without_data', 0),
+        ) + tuple(options)
+        self.policy = policy
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge_delay = hedge_delay
+        self.backoff = backoff
+        self._channels = [_Channel(target, options) for target in targets
+                          for _ in range(channels_per_target)]
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for channel in self._channels:
+            channel.channel.close()
+
+    def wait_for_ready(self, timeout=None):
+        """Blocks until every channel is connected."""
+        for channel in self._channels:
+            grpc.channel_ready_future(channel.channel).result(timeout=timeout)
+
+    def _pick(self, exclude=()):
+        with self._lock:
+            channels = [channel for channel in self._channels
+                        if channel not in exclude] or self._channels
+            if self.policy == "least_loaded":
+                least = min(channel.in_flight for channel in channels)
+                channel = random.choice([
+                    channel for channel in channels
+                    if channel.in_flight == least])
+            else:
+                channel = channels[next(self._next) % len(channels)]
+            channel.in_flight += 1
+        return channel
+
+    def _release(self, channel):
+        with self._lock:
+            channel.in_flight -= 1
+
+    def call(self, method, request, timeout=None):
+        """Makes the unary RPC named method, e.g. "GetFeature".
+
+        Raises:
+          grpc.RpcError: every attempt failed; the error of the last one.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        answers = queue.Queue()
+        attempts = []
+        tried = []
+        error = None
+
+        def start():
+            channel = self._pick(tried)
+            tried.append(channel)
+            future = getattr(channel.stub, method).future(
+                request, timeout=max(deadline - time.monotonic(), 0))
+            attempts.append(future)
+
+            def done(future):
+                self._release(channel)
+                answers.put(future)
+
+            future.add_done_callback(done)
+
+        start()
+        pending = 1
+        try:
+            while True:
+                hedge = (self.hedge_delay is not None and
+                         len(attempts) <= self.retries)
+                try:
+                    future = answers.get(
+                        timeout=self.hedge_delay if hedge else None)
+                except queue.Empty:
+                    start()
+                    pending += 1
+                    continue
+                pending -= 1
+                try:
+                    return future.result()
+                except grpc.RpcError as rpc_error:
+                    error = rpc_error
+                if (error.code() in RETRYABLE_CODES and
+                        len(attempts) <= self.retries):
+                    # Exponential backoff with full jitter, within the
+                    # deadline of the call.
+                    delay = random.uniform(
+                        0, self.backoff * 2 ** (len(attempts) - 1))
+                    remaining = deadline - time.monotonic()
+                    if remaining > delay:
+                        time.sleep(delay)
+                        start()
+                        pending += 1
+                        continue
+                if not pending:
+                    raise error
+        finally:
+            for future in attempts:
+                future.cancel()
+
+    def stream(self, method, request_or_iterator, timeout=None):
+        """Makes the response-streaming RPC named method.
+
+        Returns an iterator over the responses, which should be read to
+        the end or closed; with it as a context manager, it is closed
+        when the block ends.  Streams are neither retried nor hedged since
+        responses may already have been used.
+        """
+        channel = self._pick()
+        try:
+            responses = getattr(channel.stub, method)(
+                request_or_iterator, timeout=timeout or self.timeout)
+        except BaseException:
+            self._release(channel)
+            raise
+        return _Stream(self, channel, responses)
+
+    def map(self, method, requests, concurrency=64, timeout=None):
+        """Yields the responses to call(method, request) for every request.
+
+        Responses come in request order, with at most concurrency calls in
+        flight at a time.
+        """
+        pending = collections.deque()
+        with futures.ThreadPoolExecutor(concurrency) as executor:
+            for request in requests:
+                if len(pending) >= concurrency:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(self.call, method, request,
+                                               timeout))
+            while pending:
+                yield pending.popleft().result()
+
+    def get_feature(self, point, timeout=None):
+        return self.call("GetFeature", point, timeout)
+
+    def get_features(self, point_batch, timeout=None):
+        return self.call("GetFeatures", point_batch, timeout)
+
+    def list_features(self, rectangle, timeout=None):
+        return self.stream("ListFeatures", rectangle, timeout)
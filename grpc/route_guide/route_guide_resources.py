@@ -16,6 +16,7 @@
 import json
 
 import route_guide_pb2
+import route_guide_store
 
 
 def read_route_guide_database():
@@ -35,3 +36,17 @@ def read_route_guide_database():
                     longitude=item["location"]["longitude"]))
             feature_list.append(feature)
     return feature_list
+
+
+def read_feature_store(path="route_guide_db.json"):
+    """Reads the route guide database into a columnar store.
+
+  Returns:
+    A route_guide_store.FeatureStore with the full contents of the route
+      guide database.
+  """
+    with open(path) as route_guide_db_file:
+        return route_guide_store.FeatureStore.from_items(
+            (item["name"], item["location"]["latitude"],
+             item["location"]["longitude"])
+            for item in json.load(route_guide_db_file))
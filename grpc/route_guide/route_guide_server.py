@@ -1,15 +1,69 @@
 from concurrent import futures
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import threading
 import time
-import math
+import timeit
 import logging
 
 import grpc
 
 import route_guide_pb2
 import route_guide_pb2_grpc
-import route_guide_resources
+import route_guide_index
+import route_guide_cache
+import route_guide_database
+import route_guide_distance
+import route_guide_notes
+import route_guide_metrics
 
-_ONE_DAY_IN_SECONDS = 60 * 60 * 24
+# Seconds in-flight RPCs get to finish after SIGINT or SIGTERM.
+_SHUTDOWN_GRACE = 5
+
+# Bounds on one ListFeaturePages call, whatever the request asks for.  A
+# call that reaches one ends with a page token the client resumes from on
+# a new call, so a slow or greedy client holds a server thread for at most
+# _LIST_TIME_BUDGET seconds plus the time to send one page.
+_DEFAULT_PAGE_SIZE = 100
+_MAX_PAGE_SIZE = 1000
+_MAX_LIST_RESULTS = 10000
+_LIST_TIME_BUDGET = 10
+# Features ListNearestFeatures sends at most.
+_MAX_NEAREST = 1000
+
+
+def rectangle_bounds(rectangle):
+    """Returns the (left, right, bottom, top) bounds of a Rectangle."""
+    return (min(rectangle.lo.longitude, rectangle.hi.longitude),
+            max(rectangle.lo.longitude, rectangle.hi.longitude),
+            min(rectangle.lo.latitude, rectangle.hi.latitude),
+            max(rectangle.lo.latitude, rectangle.hi.latitude))
+
+
+def _page_token(database, position):
+    return "%d.%d" % (database.generation, position)
+
+
+def page_start(database, page_token):
+    """Returns the index position a page token continues from.
+
+    Raises:
+      ValueError: page_token is malformed.
+      LookupError: page_token was issued for another database snapshot.
+    """
+    if not page_token:
+        return 0
+    generation, _, position = page_token.partition(".")
+    generation = int(generation)
+    position = int(position)
+    if position < 0:
+        raise ValueError(page_token)
+    if generation != database.generation:
+        raise LookupError(page_token)
+    return position
 
 
 def get_feature(feature_db, point):
@@ -22,95 +76,443 @@ def get_feature(feature_db, point):
 
 def get_distance(start, end):
     """Distance between two points."""
-    coord_factor = 10000000.0
-    lat_1 = start.latitude / coord_factor
-    lat_2 = end.latitude / coord_factor
-    lon_1 = start.longitude / coord_factor
-    lon_2 = end.longitude / coord_factor
-    lat_rad_1 = math.radians(lat_1)
-    lat_rad_2 = math.radians(lat_2)
-    delta_lat_rad = math.radians(lat_2 - lat_1)
-    delta_lon_rad = math.radians(lon_2 - lon_1)
-
-    # Formula is based on http://mathforum.org/library/drmath/view/51879.html
-    a = (pow(math.sin(delta_lat_rad / 2), 2) +
-         (math.cos(lat_rad_1) * math.cos(lat_rad_2) * pow(
-             math.sin(delta_lon_rad / 2), 2)))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    R = 6371000
-    # metres
-    return R * c
+    return route_guide_distance.haversine(start.latitude, start.longitude,
+                                          end.latitude, end.longitude)
 
 
 class RouteGuideServicer(route_guide_pb2_grpc.RouteGuideServicer):
     """Provides methods that implement functionality of route guide server."""
 
-    def __init__(self):
-        self.db = route_guide_resources.read_route_guide_database()
+    def __init__(self, db_path="route_guide_db.json",
+                 index_factory=route_guide_index.GridIndex,
+                 chat_max_notes=route_guide_notes.DEFAULT_MAX_NOTES,
+                 chat_max_age=None, note_store=None, cache=None):
+        self.db_path = db_path
+        self.index_factory = index_factory
+        # Replaced as a whole on reload; RPCs read it once and keep using
+        # their snapshot.
+        self.database = route_guide_database.load_database(db_path,
+                                                           index_factory)
+        # Bounds on the notes RouteChat remembers per stream.
+        self.chat_max_notes = chat_max_notes
+        self.chat_max_age = chat_max_age
+        # With a route_guide_notes.SharedNoteStore, RouteChat streams see
+        # the notes of every other stream instead of only their own.
+        self.note_store = note_store
+        # A route_guide_cache.ResponseCache used by the handlers of
+        # add_cached_handlers().
+        self.cache = cache
+
+    @property
+    def db(self):
+        return self.database.db
+
+    @property
+    def index(self):
+        return self.database.index
+
+    def watch_database(self, interval):
+        """Reloads the database in the background whenever its file changes.
+
+        Returns the started route_guide_database.DatabaseWatcher.
+        """
+        watcher = route_guide_database.DatabaseWatcher(
+            self.db_path, self._swap_database, interval, self.index_factory)
+        watcher.start()
+        return watcher
+
+    def _swap_database(self, database):
+        self.database = database
+        if self.cache is not None:
+            # Entries of the old generation can no longer be hit; free them.
+            self.cache.clear()
+
+    def find_feature(self, point, database=None):
+        """Returns Feature at given location or None."""
+        if database is None:
+            database = self.database
+        row = database.index.lookup(point.latitude, point.longitude)
+        if row is None:
+            return None
+        return database.db[row]
+
+    def find_features(self, points, database=None):
+        """Resolves a batch of points in one pass over the index.
+
+        Returns a FeatureBatch with one Feature per point, in order, named ""
+        where no feature exists.
+        """
+        if database is None:
+            database = self.database
+        lookup = database.index.lookup
+        name = database.db.name
+        batch = route_guide_pb2.FeatureBatch()
+        for point in points:
+            row = lookup(point.latitude, point.longitude)
+            batch.features.add(name="" if row is None else name(row),
+                               location=point)
+        return batch
+
+    def find_nearest(self, point, k=1, max_distance=None):
+        """Returns a NearbyFeatures with the k features nearest to point.
+
+        Distances are the great-circle distances of get_distance().  k is
+        capped at _MAX_NEAREST.
+        """
+        database = self.database
+        nearby = route_guide_pb2.NearbyFeatures()
+        for distance, row in database.index.nearest(
+                point.latitude, point.longitude, min(k, _MAX_NEAREST),
+                max_distance):
+            nearby.features.add(feature=database.db[row], distance=distance)
+        return nearby
+
+    def cached_feature(self, point):
+        """Returns the serialized GetFeature response for point."""
+        database = self.database
+        key = ("GetFeature", database.generation, point.latitude,
+               point.longitude)
+        response = self.cache.get(key)
+        if response is None:
+            feature = self.find_feature(point, database)
+            if feature is None:
+                feature = route_guide_pb2.Feature(name="", location=point)
+            response = feature.SerializeToString()
+            self.cache.put(key, response)
+        return response
+
+    def cached_features(self, rectangle):
+        """Returns an iterator over the serialized ListFeatures responses.
+
+        A listing is cached once it has been sent in full.
+        """
+        database = self.database
+        bounds = rectangle_bounds(rectangle)
+        key = ("ListFeatures", database.generation) + bounds
+        responses = self.cache.get(key)
+        if responses is not None:
+            return iter(responses)
+        return self._cache_features(key, database, bounds)
+
+    def _cache_features(self, key, database, bounds):
+        max_size = self.cache.max_entry_bytes
+        db = database.db
+        responses = []
+        size = 0
+        for row in database.index.query(*bounds):
+            response = db[row].SerializeToString()
+            if responses is not None:
+                responses.append(response)
+                size += len(response)
+                if size > max_size:
+                    responses = None
+            yield response
+        if responses is not None:
+            self.cache.put(key, tuple(responses), size)
 
     def GetFeature(self, request, context):
-        feature = get_feature(self.db, request)
+        feature = self.find_feature(request)
         if feature is None:
             return route_guide_pb2.Feature(name="", location=request)
         else:
             return feature
 
+    def CachedGetFeature(self, request, context):
+        return self.cached_feature(request)
+
     def ListFeatures(self, request, context):
-        left = min(request.lo.longitude, request.hi.longitude)
-        right = max(request.lo.longitude, request.hi.longitude)
-        top = max(request.lo.latitude, request.hi.latitude)
-        bottom = min(request.lo.latitude, request.hi.latitude)
-        for feature in self.db:
-            if (feature.location.longitude >= left and
-                    feature.location.longitude <= right and
-                    feature.location.latitude >= bottom and
-                    feature.location.latitude <= top):
-                yield feature
+        left, right, bottom, top = rectangle_bounds(request)
+        database = self.database
+        for row in database.index.query(left, right, bottom, top):
+            yield database.db[row]
+
+    def CachedListFeatures(self, request, context):
+        return self.cached_features(request)
+
+    def feature_pages(self, request, start, database):
+        """Yields the FeaturePages answering a ListFeaturesRequest.
+
+        Features come in index order from position start.  Every page but
+        the last carries the token of the feature after it; the last is
+        sent even when empty.  Pages are built one at a time as the caller
+        asks for them, so a stream never holds more than one page.
+        """
+        left, right, bottom, top = rectangle_bounds(request.rectangle)
+        page_size = min(request.page_size or _DEFAULT_PAGE_SIZE,
+                        _MAX_PAGE_SIZE)
+        limit = min(request.max_results or _MAX_LIST_RESULTS,
+                    _MAX_LIST_RESULTS)
+        deadline = timeit.default_timer() + _LIST_TIME_BUDGET
+        db = database.db
+        sent = 0
+        page = route_guide_pb2.FeaturePage()
+        for position, row in database.index.scan(left, right, bottom, top,
+                                                  start):
+            if len(page.features) == page_size or sent == limit:
+                page.next_page_token = _page_token(database, position)
+                yield page
+                if sent == limit or timeit.default_timer() > deadline:
+                    return
+                page = route_guide_pb2.FeaturePage()
+            page.features.append(db[row])
+            sent += 1
+        yield page
 
     def RecordRoute(self, request_iterator, context):
         point_count = 0
         feature_count = 0
-        distance = 0.0
-        prev_point = None
+        distance = route_guide_distance.RouteDistance()
+        index = self.database.index
 
         start_time = time.time()
         for point in request_iterator:
             point_count += 1
-            if get_feature(self.db, point):
+            if index.lookup(point.latitude, point.longitude) is not None:
                 feature_count += 1
-            if prev_point:
-                distance += get_distance(prev_point, point)
-            prev_point = point
+            distance.add(point.latitude, point.longitude)
 
         elapsed_time = time.time() - start_time
         return route_guide_pb2.RouteSummary(
             point_count=point_count,
             feature_count=feature_count,
-            distance=int(distance),
+            distance=int(distance.total()),
             elapsed_time=int(elapsed_time))
 
+    def GetFeatures(self, request, context):
+        return self.find_features(request.points)
+
+    def StreamFeatures(self, request_iterator, context):
+        database = self.database
+        for request in request_iterator:
+            yield self.find_features(request.points, database)
+
+    def GetNearestFeature(self, request, context):
+        nearby = self.find_nearest(request).features
+        return nearby[0] if nearby else route_guide_pb2.NearbyFeature()
+
+    def ListNearestFeatures(self, request, context):
+        if request.k < 0 or request.max_distance < 0:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          "negative k or max_distance")
+        return self.find_nearest(request.point, request.k or 1,
+                                 request.max_distance or None)
+
+    def ListFeaturePages(self, request, context):
+        if request.page_size < 0 or request.max_results < 0:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          "negative page_size or max_results")
+        database = self.database
+        try:
+            start = page_start(database, request.page_token)
+        except ValueError:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          "invalid page token")
+        except LookupError:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION,
+                          "the database was reloaded; list again")
+        for page in self.feature_pages(request, start, database):
+            yield page
+
     def RouteChat(self, request_iterator, context):
-        prev_notes = []
+        if self.note_store is not None:
+            return self._shared_route_chat(request_iterator, context)
+        return self._route_chat(request_iterator, context)
+
+    def _route_chat(self, request_iterator, context):
+        notes = route_guide_notes.NoteIndex(self.chat_max_notes,
+                                            self.chat_max_age)
         for new_note in request_iterator:
-            for prev_note in prev_notes:
-                if prev_note.location == new_note.location:
-                    yield prev_note
-            prev_notes.append(new_note)
+            for prev_note in notes.notes_at(new_note.location):
+                yield prev_note
+            notes.add(new_note)
+
+    def _shared_route_chat(self, request_iterator, context):
+        # Notes pushed by other streams can arrive while this one waits for
+        # its next request, so requests are read on a separate thread and
+        # everything to send goes through one queue.
+        outbox = queue.Queue(maxsize=route_guide_notes.OUTBOX_SIZE)
+        end_of_requests = object()
+        stopped = threading.Event()
+        dropped_lock = threading.Lock()
+        dropped = [0]
+
+        def deliver(note):
+            # Other streams must not wait for this one; a stream too slow
+            # to keep up loses the notes pushed to it.
+            try:
+                outbox.put_nowait(note)
+            except queue.Full:
+                with dropped_lock:
+                    dropped[0] += 1
+
+        def put(note):
+            # The notes of this stream's own requests wait for room
+            # instead, until the stream ends.
+            while not stopped.is_set():
+                try:
+                    outbox.put(note, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        subscription = self.note_store.subscribe(deliver)
+
+        def read_requests():
+            try:
+                for new_note in request_iterator:
+                    for prev_note in subscription.publish(new_note):
+                        put(prev_note)
+            except grpc.RpcError:
+                pass
+            finally:
+                put(end_of_requests)
+
+        reader = threading.Thread(target=read_requests)
+        reader.daemon = True
+        reader.start()
+        try:
+            while True:
+                note = outbox.get()
+                if note is end_of_requests:
+                    break
+                yield note
+        finally:
+            stopped.set()
+            subscription.close()
+            if dropped[0]:
+                logging.warning("RouteChat stream fell behind and dropped "
+                                "%d notes", dropped[0])
+
 
+def add_cached_handlers(servicer, server):
+    """Answers GetFeature and ListFeatures from servicer.cache.
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    route_guide_pb2_grpc.add_RouteGuideServicer_to_server(
-        RouteGuideServicer(), server)
-    server.add_insecure_port('[::]:50051')
+    The handlers send the cached bytes without serializing them again.  They
+    must be added before add_RouteGuideServicer_to_server(), whose handlers
+    for the two methods they take the place of.
+    """
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(
+        'routeguide.RouteGuide', {
+            'GetFeature': grpc.unary_unary_rpc_method_handler(
+                servicer.CachedGetFeature,
+                request_deserializer=route_guide_pb2.Point.FromString,
+                response_serializer=route_guide_cache.serialized,
+            ),
+            'ListFeatures': grpc.unary_stream_rpc_method_handler(
+                servicer.CachedListFeatures,
+                request_deserializer=route_guide_pb2.Rectangle.FromString,
+                response_serializer=route_guide_cache.serialized,
+            ),
+        }),))
+
+
+def _wait_for_shutdown(server, grace):
+    """Blocks until SIGINT or SIGTERM, then stops server gracefully."""
+    stopping = threading.Event()
+
+    def handle_signal(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    stopping.wait()
+    server.stop(grace).wait()
+
+
+def _run_server(servicer, port, grace, options=(), metrics_port=None,
+                reload_interval=None):
+    if reload_interval:
+        # Started here rather than in serve() because threads do not
+        # survive the fork into worker processes.
+        servicer.watch_database(reload_interval)
+    executor = futures.ThreadPoolExecutor(max_workers=10)
+    interceptors = []
+    if metrics_port is not None:
+        registry = route_guide_metrics.MetricsRegistry()
+        route_guide_metrics.monitor_executor(registry, executor)
+        if servicer.cache is not None:
+            route_guide_metrics.monitor_cache(registry, servicer.cache)
+        interceptors.append(route_guide_metrics.MetricsInterceptor(registry))
+        route_guide_metrics.start_http_server(registry, metrics_port)
+    server = grpc.server(executor, interceptors=interceptors,
+                         options=options)
+    if servicer.cache is not None:
+        add_cached_handlers(servicer, server)
+    route_guide_pb2_grpc.add_RouteGuideServicer_to_server(servicer, server)
+    server.add_insecure_port('[::]:%d' % port)
     server.start()
-    try:
-        while True:
-            time.sleep(_ONE_DAY_IN_SECONDS)
-    except KeyboardInterrupt:
-        server.stop(0)
+    _wait_for_shutdown(server, grace)
+
+
+def serve(db_path="route_guide_db.json", port=50051, processes=1,
+          grace=_SHUTDOWN_GRACE, shared_notes=False, metrics_port=None,
+          reload_interval=None, cache_bytes=0):
+    """Serves the route guide until SIGINT or SIGTERM.
+
+    With metrics_port, RPC metrics are served on
+    http://127.0.0.1:metrics_port/metrics, or from metrics_port + i by
+    worker i when there are several processes.  With reload_interval, the
+    database file is checked for changes that often, in seconds, and
+    reloaded without restarting.  With cache_bytes, GetFeature and
+    ListFeatures responses are cached up to that size, per process.
+    """
+    note_store = route_guide_notes.SharedNoteStore() if shared_notes else None
+    cache = (route_guide_cache.ResponseCache(cache_bytes) if cache_bytes
+             else None)
+    servicer = RouteGuideServicer(db_path, note_store=note_store, cache=cache)
+    if processes <= 1:
+        _run_server(servicer, port, grace, metrics_port=metrics_port,
+                    reload_interval=reload_interval)
+        return
+
+    # The database is loaded before forking so every worker shares it, and
+    # no gRPC server exists in the parent since gRPC must not be started
+    # before a fork.  SO_REUSEPORT lets the kernel spread connections over
+    # the workers listening on the same port.
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_run_server,
+                        args=(servicer, port, grace,
+                              (('grpc.so_reuseport', 1),),
+                              None if metrics_port is None else
+                              metrics_port + i, reload_interval))
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logging.info("Started %d workers on port %d: %s", processes, port,
+                 ", ".join(str(worker.pid) for worker in workers))
+
+    def stop_workers(signum, frame):
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop_workers)
+    signal.signal(signal.SIGTERM, stop_workers)
+    for worker in workers:
+        worker.join()
 
 
 if __name__ == '__main__':
-    logging.basicConfig()
-    serve()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="route_guide_db.json",
+                        help="JSON or binary route guide database")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes sharing the port")
+    parser.add_argument("--shared-notes", action="store_true",
+                        help="share RouteChat notes between streams")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on this local port")
+    parser.add_argument("--reload-interval", type=float,
+                        help="seconds between checks for a changed database")
+    parser.add_argument("--cache-mb", type=int, default=0,
+                        help="megabytes of GetFeature and ListFeatures "
+                        "responses to cache")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.db, args.port, args.processes,
+          shared_notes=args.shared_notes, metrics_port=args.metrics_port,
+          reload_interval=args.reload_interval,
+          cache_bytes=args.cache_mb * 1024 * 1024)
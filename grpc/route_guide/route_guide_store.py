@@ -0,0 +1,76 @@
+"""Columnar storage for the route guide features."""
+
+from array import array
+
+import route_guide_pb2
+
+
+class FeatureStore(object):
+    """Route guide features kept as parallel int32 columns.
+
+    Row i has location (latitudes[i], longitudes[i]) and the name
+    names[name_offsets[name_ids[i]]:name_offsets[name_ids[i] + 1]], where
+    names is one UTF-8 blob holding every distinct name once.  The columns
+    may be arrays or memoryviews over a shared buffer.  route_guide_pb2
+    messages are only built when a row is read through feature() or
+    indexing, so the store costs about 12 bytes per feature plus the
+    distinct names.
+    """
+
+    def __init__(self, latitudes, longitudes, name_ids, name_offsets, names):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.name_ids = name_ids
+        self.name_offsets = name_offsets
+        self.names = names
+
+    @classmethod
+    def from_items(cls, items):
+        """Builds a store from (name, latitude, longitude) tuples."""
+        latitudes = array('i')
+        longitudes = array('i')
+        name_ids = array('i')
+        name_offsets = array('I', [0])
+        names = bytearray()
+        interned = {}
+        for name, latitude, longitude in items:
+            name_id = interned.get(name)
+            if name_id is None:
+                name_id = interned[name] = len(interned)
+                names += name.encode('utf-8')
+                name_offsets.append(len(names))
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+            name_ids.append(name_id)
+        return cls(latitudes, longitudes, name_ids, name_offsets,
+                   bytes(names))
+
+    @classmethod
+    def from_features(cls, features):
+        """Builds a store from route_guide_pb2.Features."""
+        return cls.from_items(
+            (feature.name, feature.location.latitude,
+             feature.location.longitude) for feature in features)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def __getitem__(self, row):
+        return self.feature(row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.feature(row)
+
+    def name(self, row):
+        name_id = self.name_ids[row]
+        return str(self.names[self.name_offsets[name_id]:
+                              self.name_offsets[name_id + 1]], 'utf-8')
+
+    def location(self, row):
+        return route_guide_pb2.Point(latitude=self.latitudes[row],
+                                     longitude=self.longitudes[row])
+
+    def feature(self, row):
+        return route_guide_pb2.Feature(name=self.name(row),
+                                       location=self.location(row))
@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
-from kubernetes import client, config
+from kubernetes import client, config, watch
 from kubernetes.client import ApiClient
 from kubernetes.stream import stream
 import logging
+import random
 import select
 import six
 import errno
 import os
 import sys
+import threading
 from copy import deepcopy
 
 logger = logging.getLogger("k8s handler")
@@ -20,14 +22,266 @@ logger.setLevel(logging.DEBUG)
 COMMAND = ["/bin/sh", "-c",
            "ps -aux|awk '{print$3\" \"$4\" \"$11}';nvidia-smi | grep % |awk '{print$9\" \"$11\" \"$13}'"]
 
+# Seconds a watch request lasts before ResourceCache renews it.
+WATCH_TIMEOUT = 300
+# Seconds of the longest wait before watching again after the first
+# failure; doubles with every failure up to MAX_WATCH_BACKOFF.
+WATCH_BACKOFF = 1
+MAX_WATCH_BACKOFF = 60
+MEMORY_UNITS = [("Ki", 1024),
+                ("K",  1000),
+                ("Mi", 1024*1024),
+                ("M",  1000*1000),
+                ("Gi", 1024*1024*1024),
+                ("G",  1000*1000*1000),
+                ("Ti", 1024*1024*1024*1024),
+                ("T",  1000*1000*1000*1000),
+                ("Pi", 1024*1024*1024*1024*1024),
+                ("P",  1000*1000*1000*1000*1000),
+                ("Ei", 1024*1024*1024*1024*1024*1024),
+                ("E",  1000*1000*1000*1000*1000*1000)]
+
+
+def transfer_memory_to_byte(memory):
+    for suffix, factor in MEMORY_UNITS:
+        if suffix in memory:
+            return int(float(memory.strip(suffix)) * factor)
+    return int(memory)
+
+
+def transfer_cpu_to_millicore(cpu):
+    if "m" in cpu:
+        return int(cpu.strip("m"))
+    return int(float(cpu) * 1000)
+
+
+def resources_released(pod):
+    if not pod.status.container_statuses:
+        return True
+    for item in pod.status.container_statuses:
+        if item.state.running:
+            return False
+    return True
+
+
+def node_allocatable(node):
+    """Returns the gpu, cpu (millicores) and memory (bytes) of a node."""
+    resources = node.status.allocatable or {}
+    allocatable = {
+        "gpu": int(resources.get("nvidia.com/gpu", 0)),
+        "cpu": transfer_cpu_to_millicore(resources.get("cpu", "0")),
+        "memory": transfer_memory_to_byte(resources.get("memory", "0")),
+    }
+    labels = node.metadata.labels or {}
+    if "gpu" in labels:
+        allocatable["gpuType"] = labels["gpu"]
+    return allocatable
+
+
+def pod_requests(pod):
+    """Returns the (gpu limits, cpu millicores, memory bytes) a pod holds."""
+    gpu_limits = 0
+    cpu_requests = 0
+    memory_request = 0
+    for con in pod.spec.containers:
+        resources_limits = con.resources.limits
+        resources_requests = con.resources.requests
+        if resources_limits and "nvidia.com/gpu" in resources_limits:
+            gpu_limits += int(resources_limits["nvidia.com/gpu"])
+        if resources_requests and "cpu" in resources_requests:
+            cpu_requests += transfer_cpu_to_millicore(resources_requests["cpu"])
+        if resources_requests and "memory" in resources_requests:
+            memory_request += transfer_memory_to_byte(resources_requests["memory"])
+    return gpu_limits, cpu_requests, memory_request
+
+
+class ResourceCache(object):
+    """Informer-style cache of the free resources of the cluster.
+
+    Lists nodes and pods once, then applies the events of a watch on each,
+    from threads of its own.  A pod event changes the accounting of its
+    node by the difference between what the pod holds now and what it held
+    before, so remain_resources() answers from memory without listing.  A
+    watch that fell too far behind (410 Gone) lists again.
+    """
+
+    def __init__(self, core_api, watch_timeout=WATCH_TIMEOUT):
+        self.core_api = core_api
+        self.watch_timeout = watch_timeout
+        self.lock = threading.Lock()
+        # node name -> node_allocatable()
+        self.allocatable = {}
+        # node name -> [gpu, cpu, memory] held by the pods on the node
+        self.used = {}
+        # pod uid -> (node name, gpu, cpu, memory) of pods holding resources
+        self.pods = {}
+        # What remain_resources() returns.  Node entries are replaced,
+        # never changed, so copying the dictionary takes a snapshot.
+        self.remain = {"cpu": 0, "memory": 0, "gpu": 0}
+        self.kinds = {
+            "node": (core_api.list_node, self.replace_nodes, self.apply_node),
+            "pod": (core_api.list_pod_for_all_namespaces, self.replace_pods,
+                    self.apply_pod),
+        }
+        self.stopped = threading.Event()
+        self.watches = {}
+        self.events = 0
+        self.relists = 0
+
+    def start(self):
+        """Lists nodes and pods, then keeps watching them."""
+        for kind in ("node", "pod"):
+            resource_version = self.load(kind)
+            t = threading.Thread(target=self.follow, args=(kind, resource_version))
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        self.stopped.set()
+        for w in list(self.watches.values()):
+            w.stop()
+
+    def remain_resources(self, copy=True):
+        """Returns what remains free, as K8sHandler.remain_resources().
+
+        With copy=False the node entries are those of the cache, which
+        saves copying them for callers that only read them.
+        """
+        with self.lock:
+            remain = dict(self.remain)
+        if not copy:
+            return remain
+        for k, v in remain.items():
+            if isinstance(v, dict):
+                remain[k] = dict(v)
+        return remain
+
+    def load(self, kind):
+        list_func, replace, _ = self.kinds[kind]
+        items = list_func()
+        replace(items.items)
+        return items.metadata.resource_version
+
+    def follow(self, kind, resource_version):
+        list_func, _, apply = self.kinds[kind]
+        failures = 0
+        while not self.stopped.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self.load(kind)
+                    self.relists += 1
+                w = watch.Watch()
+                self.watches[kind] = w
+                for event in w.stream(list_func,
+                                      resource_version=resource_version,
+                                      timeout_seconds=self.watch_timeout,
+                                      allow_watch_bookmarks=True):
+                    if event["type"] != "BOOKMARK":
+                        apply(event["type"], event["object"])
+                        self.events += 1
+                    resource_version = w.resource_version
+                    failures = 0
+                continue
+            except client.rest.ApiException as e:
+                if e.status == 410:
+                    logger.info('%s watch expired, listing again' % kind)
+                    resource_version = None
+                    continue
+                logger.error('%s watch error %s' % (kind, e))
+            except Exception as e:
+                logger.error('%s watch error %s' % (kind, e))
+            failures += 1
+            self.stopped.wait(random.uniform(
+                0, min(MAX_WATCH_BACKOFF, WATCH_BACKOFF * 2 ** failures)))
+
+    def replace_nodes(self, nodes):
+        allocatable = dict((node.metadata.name, node_allocatable(node))
+                           for node in nodes)
+        with self.lock:
+            self.allocatable = allocatable
+            self.rebuild()
+
+    def replace_pods(self, pods):
+        held = {}
+        for pod in pods:
+            if pod.spec.node_name and not resources_released(pod):
+                held[pod.metadata.uid] = (pod.spec.node_name,) + pod_requests(pod)
+        with self.lock:
+            self.pods = held
+            self.used = {}
+            for node_name, gpu, cpu, memory in held.values():
+                used = self.used.setdefault(node_name, [0, 0, 0])
+                used[0] += gpu
+                used[1] += cpu
+                used[2] += memory
+            self.rebuild()
+
+    def apply_node(self, event_type, node):
+        name = node.metadata.name
+        with self.lock:
+            if event_type == "DELETED":
+                self.allocatable.pop(name, None)
+            else:
+                self.allocatable[name] = node_allocatable(node)
+            self.refresh(name)
+
+    def apply_pod(self, event_type, pod):
+        held = None
+        if (event_type != "DELETED" and pod.spec.node_name and
+                not resources_released(pod)):
+            held = (pod.spec.node_name,) + pod_requests(pod)
+        with self.lock:
+            previous = self.pods.get(pod.metadata.uid)
+            if previous == held:
+                return
+            if held is None:
+                del self.pods[pod.metadata.uid]
+            else:
+                self.pods[pod.metadata.uid] = held
+            for entry, sign in ((previous, -1), (held, 1)):
+                if entry is None:
+                    continue
+                used = self.used.setdefault(entry[0], [0, 0, 0])
+                for i in range(3):
+                    used[i] += sign * entry[i + 1]
+                if not any(used):
+                    del self.used[entry[0]]
+                self.refresh(entry[0])
+
+    def rebuild(self):
+        self.remain = {"cpu": 0, "memory": 0, "gpu": 0}
+        for name in self.allocatable:
+            self.refresh(name)
+
+    def refresh(self, name):
+        """Recomputes what remains on a node, and the cluster totals."""
+        old = self.remain.pop(name, None)
+        new = None
+        if name in self.allocatable:
+            new = dict(self.allocatable[name])
+            used = self.used.get(name, (0, 0, 0))
+            new["gpu"] -= used[0]
+            new["cpu"] -= used[1]
+            new["memory"] -= used[2]
+            self.remain[name] = new
+        for resource in ("gpu", "cpu", "memory"):
+            self.remain[resource] += ((new[resource] if new else 0) -
+                                      (old[resource] if old else 0))
+
 
 class K8sHandler(object):
-    def __init__(self):
+    def __init__(self, cache_resources=False):
         self.load_k8s_cfg()
         self.k8s_batch = client.BatchV1Api()
         self.k8s_coreapi = client.CoreV1Api()
         self.api_client = ApiClient()
         self.allocatable_resources = self.allocatable_resources()
+        # With cache_resources, remain_resources() answers from a
+        # ResourceCache instead of listing every pod.
+        self.resource_cache = None
+        if cache_resources:
+            self.resource_cache = ResourceCache(self.k8s_coreapi)
+            self.resource_cache.start()
 
     def load_k8s_cfg(self, cfg_file=None):
         try:
@@ -123,62 +377,23 @@ class K8sHandler(object):
                              "gpu": 0}
         nodes = self.k8s_coreapi.list_node().items
         for node in nodes:
-            name = node.metadata.name
-            cluster_resources[name] = {}
-            resources = node.status.allocatable
-            if "nvidia.com/gpu" in resources.keys():
-                gpu_number = int(resources["nvidia.com/gpu"])
-                cluster_resources["gpu"] += gpu_number
-            else:
-                gpu_number = 0
-
-            if "cpu" in resources.keys():
-                cpu_allocatable = int(resources["cpu"].strip("m"))
-                cluster_resources["cpu"] += cpu_allocatable
-            else:
-                cpu_allocatable = 0
-
-            if "memory" in resources.keys():
-                memory_allocatable = int(resources["memory"])
-                cluster_resources["memory"] += memory_allocatable
-            else:
-                memory_allocatable = 0
-
-            cluster_resources[name]["gpu"] = gpu_number
-            cluster_resources[name]["cpu"] = cpu_allocatable
-            cluster_resources[name]["memory"] = memory_allocatable
-            labels = node.metadata.labels
-            if "gpu" in labels.keys():
-                cluster_resources[name]["gpuType"] = labels["gpu"]
+            allocatable = node_allocatable(node)
+            cluster_resources[node.metadata.name] = allocatable
+            cluster_resources["gpu"] += allocatable["gpu"]
+            cluster_resources["cpu"] += allocatable["cpu"]
+            cluster_resources["memory"] += allocatable["memory"]
 
         return cluster_resources
 
-    def remain_resources(self):
+    def remain_resources(self, copy=True):
+        if self.resource_cache is not None:
+            return self.resource_cache.remain_resources(copy)
         remain_resources = deepcopy(self.allocatable_resources)
         pods = self.k8s_coreapi.list_pod_for_all_namespaces().items
         for pod in pods:
-            if not self.resources_released(pod):
+            if not resources_released(pod):
                 node_name = pod.spec.node_name
-                containers = pod.spec.containers
-                gpu_limits = 0
-                cpu_requests = 0
-                memory_request = 0
-                for con in containers:
-                    resources_limits = con.resources.limits
-                    resources_requests = con.resources.requests
-                    if resources_limits and "nvidia.com/gpu" in resources_limits.keys():
-                        gpu_limits += int(resources_limits["nvidia.com/gpu"])
-
-                    if resources_requests and "cpu" in resources_requests.keys():
-                        requested_cpu = resources_requests["cpu"]
-                        if "m" not in requested_cpu:
-                            requested_cpu = int(float(requested_cpu) * 1000)
-                        else:
-                            requested_cpu = int(requested_cpu.strip("m"))
-                        cpu_requests += requested_cpu
-
-                    if resources_requests and "memory" in resources_requests.keys():
-                        memory_request += self.transfer_memory_to_byte(resources_requests["memory"])
+                gpu_limits, cpu_requests, memory_request = pod_requests(pod)
                 remain_resources["gpu"] -= gpu_limits
                 remain_resources["cpu"] -= cpu_requests
                 remain_resources["memory"] -= memory_request
@@ -189,41 +404,13 @@ class K8sHandler(object):
         return remain_resources
 
     def transfer_memory_to_byte(self, memory):
-        result = 0
-        memory_list = [("Ki", 1024),
-                       ("K",  1000),
-                       ("Mi", 1024*1024),
-                       ("M",  1000*1000),
-                       ("Gi", 1024*1024*1024),
-                       ("G",  1000*1000*1000),
-                       ("Ti", 1024*1024*1024*1024),
-                       ("T",  1000*1000*1000*1000),
-                       ("Pi", 1024*1024*1024*1024*1024),
-                       ("P",  1000*1000*1000*1000*1000),
-                       ("Ei", 1024*1024*1024*1024*1024*1024),
-                       ("E",  1000*1000*1000*1000*1000*1000)]
-        small_request = True
-        for item in memory_list:
-            if item[0] in memory:
-                small_request = False
-                result = int(float(memory.strip(item[0])) * item[1])
-                break
-        if small_request:
-            return int(memory)
-        else:
-            return result
+        return transfer_memory_to_byte(memory)
 
     def resources_released(self, pod):
-        resources_released = True
-        if not pod.status.container_statuses:
-            return resources_released
-        for item in pod.status.container_statuses:
-            if item.state.running:
-                resources_released = False
-        return resources_released
+        return resources_released(pod)
 
     def gpu_requests_meet(self, num_workers, num_gpu_per_worker, gpu_type=None):
-        remain_resources = self.get_remain_resources()
+        remain_resources = self.remain_resources(copy=False)
         if remain_resources["gpu"] < (num_gpu_per_worker * num_workers):
             return False
         count = 0
@@ -236,6 +423,8 @@ class K8sHandler(object):
                 else:
                     if "gpu" in v.keys() and v["gpu"] >= num_gpu_per_worker:
                         count += 1
+                if count >= num_workers:
+                    return True
         if count >= num_workers:
             return True
         else:
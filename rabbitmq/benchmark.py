@@ -0,0 +1,758 @@
+"""Throughput benchmarks for rabbitmq.py against a RabbitMQ broker.
+
+With --fake they run against fake_broker.py, launched in a process of its
+own, instead.  suite measures everything at once and writes it as JSON,
+and with --baseline fails when a result got worse than a saved one.
+
+Usage:
+  python benchmark.py --host localhost publish --windows 1 10 100 1000
+  python benchmark.py --host localhost consume --prefetch 1 10 100 1000
+  python benchmark.py --host localhost --messages 2000 parallel --work 5
+  python benchmark.py --host localhost batch --sizes 1 10 100 --call 2
+  python benchmark.py --host localhost loop --channels 1 4 16
+  python benchmark.py --host localhost --messages 2000 pool --threads 1 8
+  python benchmark.py --host localhost --messages 5000 codec --records 200
+  python benchmark.py --fake suite --output results.json
+  python benchmark.py --fake suite --baseline results.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import timeit
+
+import pika
+
+import rabbitmq
+import rabbitmq_async
+import rabbitmq_codec
+import rabbitmq_pool
+
+
+def _purge(args):
+    producer = rabbitmq.Producer(args.user, args.password, args.host,
+                                 args.port, args.queue)
+    producer.channel.queue_purge(args.queue)
+    producer.close()
+
+
+def _publish_rate(args, producer_class=rabbitmq.Producer, **producer_args):
+    """Messages per second of args.messages publishes, confirms included."""
+    _purge(args)
+    producer = producer_class(args.user, args.password, args.host,
+                              args.port, args.queue, **producer_args)
+    body = b'x' * args.size
+    try:
+        start = timeit.default_timer()
+        if args.batch:
+            for _ in range(0, args.messages, args.batch):
+                producer.publish_batch([body] * args.batch)
+        else:
+            for _ in range(args.messages):
+                producer.publish(body)
+            producer.wait_for_confirms()
+        return args.messages / (timeit.default_timer() - start)
+    finally:
+        producer.close()
+
+
+def bench_publish(args):
+    print("%d messages of %d bytes" % (args.messages, args.size))
+    batch = args.batch
+    args.batch = None
+    print("%-28s %12.0f msg/s" % ("no confirms", _publish_rate(args)))
+    print("%-28s %12.0f msg/s" % ("confirm each",
+                                  _publish_rate(args, confirm=True)))
+    for window in args.windows:
+        print("%-28s %12.0f msg/s" % (
+            "async confirm window %d" % window,
+            _publish_rate(args, rabbitmq_async.Producer, confirm=True,
+                          window=window)))
+    if batch:
+        args.batch = batch
+        print("%-28s %12.0f msg/s" % (
+            "async confirm batches of %d" % batch,
+            _publish_rate(args, rabbitmq_async.Producer, confirm=True,
+                          window=batch)))
+    _purge(args)
+
+
+def percentile(sorted_values, percent):
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class _CountingConsumer(rabbitmq.Consumer):
+    """Records when each message arrived and stops after expected ones."""
+
+    def __init__(self, args, expected, **consumer_args):
+        super(_CountingConsumer, self).__init__(
+            args.user, args.password, args.host, args.port, args.queue,
+            **consumer_args)
+        self.expected = expected
+        self.received = []
+
+    def on_message(self, body, user_data=None):
+        self.received.append((timeit.default_timer(), body))
+        if len(self.received) == self.expected:
+            self.channel.stop_consuming()
+        return True
+
+
+class _PolledConsumer(rabbitmq.Consumer):
+
+    def heartbeat(self):
+        # The heartbeat thread of start() would outlive the benchmark.
+        pass
+
+
+def _fill(args, count):
+    producer = rabbitmq_async.Producer(args.user, args.password, args.host,
+                                       args.port, args.queue, confirm=True)
+    producer.publish_batch([b'x' * args.size] * count)
+    producer.close()
+
+
+def _consume_rate(args, prefetch_count):
+    _purge(args)
+    _fill(args, args.messages)
+    consumer = _CountingConsumer(args, args.messages,
+                                 prefetch_count=prefetch_count)
+    start = timeit.default_timer()
+    consumer.consume()
+    return args.messages / (timeit.default_timer() - start)
+
+
+def _idle_latency(args, consumer=None):
+    """Seconds from publish to on_message for messages sent one by one.
+
+    consumer records (time, body) in received and returns from consume()
+    after args.samples messages; a _CountingConsumer by default.
+    """
+    _purge(args)
+    if consumer is None:
+        consumer = _CountingConsumer(args, args.samples)
+    thread = threading.Thread(target=consumer.consume)
+    thread.start()
+    producer = rabbitmq.Producer(args.user, args.password, args.host,
+                                 args.port, args.queue)
+    sent = []
+    for _ in range(args.samples):
+        time.sleep(0.05)
+        sent.append(timeit.default_timer())
+        producer.publish(b'x')
+    producer.close()
+    thread.join()
+    return sorted(received - published for published, (received, _) in
+                  zip(sent, consumer.received))
+
+
+def bench_consume(args):
+    print("%d messages of %d bytes" % (args.messages, args.size))
+    _purge(args)
+    _fill(args, args.polled)
+    start = timeit.default_timer()
+    for _ in range(args.polled):
+        # One message per connection, as start() reads them.
+        _PolledConsumer(args.user, args.password, args.host, args.port,
+                        args.queue).start()
+    print("%-28s %12.1f msg/s" % (
+        "start() per message", args.polled / (timeit.default_timer() - start)))
+    for prefetch_count in args.prefetch:
+        print("%-28s %12.0f msg/s" % (
+            "consume() prefetch %d" % prefetch_count,
+            _consume_rate(args, prefetch_count)))
+    latencies = _idle_latency(args)
+    print("consume() idle latency: p50 %.2f ms, p99 %.2f ms" % (
+        percentile(latencies, 50) * 1e3, percentile(latencies, 99) * 1e3))
+    _purge(args)
+
+
+class _SlowConsumer(_CountingConsumer):
+
+    def __init__(self, args, expected, **consumer_args):
+        super(_SlowConsumer, self).__init__(args, expected, **consumer_args)
+        self.lock = threading.Lock()
+
+    def on_message(self, body, user_data=None):
+        time.sleep(user_data)
+        with self.lock:
+            self.received.append((timeit.default_timer(), body))
+            done = len(self.received) == self.expected
+        if done:
+            self.stop()
+        return True
+
+
+def bench_parallel(args):
+    seconds = args.work / 1e3
+    print("%d messages taking %.1f ms each to handle" % (args.messages,
+                                                        args.work))
+    _purge(args)
+    _fill(args, args.messages)
+    consumer = _SlowConsumer(args, args.messages)
+    start = timeit.default_timer()
+    consumer.consume(user_data=seconds)
+    print("%-36s %12.0f msg/s" % (
+        "consume()", args.messages / (timeit.default_timer() - start)))
+    # Every message has the queue as routing key, so the ordered run
+    # shows the cost of ordering at its worst: one message at a time.
+    for ordered in (False, True):
+        _purge(args)
+        _fill(args, args.messages)
+        consumer = _SlowConsumer(args, args.messages)
+        start = timeit.default_timer()
+        consumer.consume_parallel(args.workers, ordered=ordered,
+                                  user_data=seconds)
+        print("%-36s %12.0f msg/s" % (
+            "consume_parallel() %d threads%s" % (
+                args.workers, ", ordered" if ordered else ""),
+            args.messages / (timeit.default_timer() - start)))
+    _purge(args)
+
+
+class _BulkConsumer(_CountingConsumer):
+    """Handles batches at a fixed cost per call, like a bulk insert."""
+
+    def on_batch(self, bodies, user_data=None):
+        time.sleep(user_data)
+        self.received.extend((timeit.default_timer(), body)
+                             for body in bodies)
+        if len(self.received) >= self.expected:
+            self.stop()
+
+    def on_message(self, body, user_data=None):
+        self.on_batch([body], user_data)
+        return True
+
+
+def bench_batch(args):
+    seconds = args.call / 1e3
+    print("%d messages, %.1f ms per handler call" % (args.messages,
+                                                    args.call))
+    _purge(args)
+    _fill(args, args.messages)
+    consumer = _BulkConsumer(args, args.messages)
+    start = timeit.default_timer()
+    consumer.consume(user_data=seconds)
+    print("%-28s %12.0f msg/s" % (
+        "consume()", args.messages / (timeit.default_timer() - start)))
+    for size in args.sizes:
+        _purge(args)
+        _fill(args, args.messages)
+        consumer = _BulkConsumer(args, args.messages)
+        start = timeit.default_timer()
+        consumer.consume_batches(size, user_data=seconds)
+        print("%-28s %12.0f msg/s" % (
+            "consume_batches() of %d" % size,
+            args.messages / (timeit.default_timer() - start)))
+    _purge(args)
+
+
+def _cpu(function, *args):
+    """Wall clock and CPU seconds, of every thread, function takes."""
+    wall = timeit.default_timer()
+    cpu = time.process_time()
+    function(*args)
+    return timeit.default_timer() - wall, time.process_time() - cpu
+
+
+def _print_cpu(name, messages, wall, cpu):
+    print("%-38s %9.0f msg/s %9.1f us CPU/msg" % (
+        name, messages / wall, cpu / messages * 1e6))
+
+
+def _idle_heartbeat_thread(args):
+    consumer = _PolledConsumer(args.user, args.password, args.host,
+                               args.port, args.queue, interval=0)
+    thread = threading.Thread(target=rabbitmq.Consumer.heartbeat,
+                              args=(consumer,))
+    thread.start()
+    wall, cpu = _cpu(time.sleep, args.idle)
+    with consumer.mutex:
+        consumer.connection.close()
+    thread.join()
+    return cpu / wall
+
+
+def _idle_consume(args):
+    consumer = _CountingConsumer(args, None)
+    thread = threading.Thread(target=consumer.consume)
+    thread.start()
+    time.sleep(0.5)
+    wall, cpu = _cpu(time.sleep, args.idle)
+    consumer.stop()
+    thread.join()
+    return cpu / wall
+
+
+def _idle_event_loop(args):
+    consumer = rabbitmq_async.Consumer(args.user, args.password, args.host,
+                                       args.port, args.queue)
+    consumer.subscribe()
+    wall, cpu = _cpu(time.sleep, args.idle)
+    consumer.close()
+    return cpu / wall
+
+
+class _LoopConsumer(rabbitmq_async.Consumer):
+    """Records into received, shared by the consumers of a run."""
+
+    def __init__(self, args, received, expected, done, **consumer_args):
+        super(_LoopConsumer, self).__init__(
+            args.user, args.password, args.host, args.port, args.queue,
+            **consumer_args)
+        self.received = received
+        self.expected = expected
+        self.done = done
+
+    def on_message(self, body, user_data=None):
+        # Runs on the loop thread, as do the other consumers of the loop.
+        self.received.append((timeit.default_timer(), body))
+        if len(self.received) == self.expected:
+            self.done.set()
+            self.stop()
+        return True
+
+
+def _loop_consume(args, channels):
+    loop = rabbitmq_async.EventLoop(args.user, args.password, args.host,
+                                    args.port)
+    received = []
+    done = threading.Event()
+    consumers = [_LoopConsumer(args, received, args.messages, done,
+                               loop=loop) for _ in range(channels)]
+
+    def consume():
+        for consumer in consumers:
+            consumer.subscribe()
+        done.wait()
+
+    try:
+        return _cpu(consume)
+    finally:
+        loop.close()
+
+
+def _loop_publish(args):
+    producer = rabbitmq_async.Producer(args.user, args.password, args.host,
+                                       args.port, args.queue, confirm=True)
+    try:
+        return _cpu(producer.publish_batch, [b'x' * args.size] * args.messages)
+    finally:
+        producer.close()
+
+
+def _blocking_publish(args):
+    producer = rabbitmq.Producer(args.user, args.password, args.host,
+                                 args.port, args.queue, confirm=True)
+    try:
+        return _cpu(producer.publish_batch, [b'x' * args.size] * args.messages)
+    finally:
+        producer.close()
+
+
+def bench_loop(args):
+    print("CPU of a consumer waiting on an empty queue for %.0f s" %
+          args.idle)
+    _purge(args)
+    print("%-38s %9.1f%%" % ("Consumer.start() heartbeat thread",
+                             _idle_heartbeat_thread(args) * 100))
+    print("%-38s %9.1f%%" % ("Consumer.consume()",
+                             _idle_consume(args) * 100))
+    print("%-38s %9.1f%%" % ("rabbitmq_async.Consumer",
+                             _idle_event_loop(args) * 100))
+
+    print("%d messages of %d bytes, CPU of every thread" % (args.messages,
+                                                            args.size))
+    _purge(args)
+    _print_cpu("Producer confirms", args.messages, *_blocking_publish(args))
+    consumer = _CountingConsumer(args, args.messages)
+    _print_cpu("Consumer.consume()", args.messages, *_cpu(consumer.consume))
+    _purge(args)
+    _print_cpu("rabbitmq_async.Producer confirms", args.messages,
+               *_loop_publish(args))
+    for channels in args.channels:
+        if channels > 1:
+            _purge(args)
+            _fill(args, args.messages)
+        _print_cpu("rabbitmq_async.Consumer x %d channels" % channels,
+                   args.messages, *_loop_consume(args, channels))
+    _purge(args)
+
+
+def _publish_latencies(args, publish, threads):
+    """Seconds each of args.messages publish() calls took, sorted."""
+    latencies = []
+
+    def run(count):
+        for _ in range(count):
+            start = timeit.default_timer()
+            publish(b'x' * args.size)
+            latencies.append(timeit.default_timer() - start)
+
+    workers = [threading.Thread(target=run, args=(args.messages // threads,))
+               for _ in range(threads)]
+    start = timeit.default_timer()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(latencies) / (timeit.default_timer() - start), sorted(latencies)
+
+
+def _producer_per_message(args):
+    def publish(data):
+        producer = rabbitmq.Producer(args.user, args.password, args.host,
+                                     args.port, args.queue)
+        producer.publish(data)
+        producer.close()
+    return publish
+
+
+def bench_pool(args):
+    print("%d messages of %d bytes" % (args.messages, args.size))
+    pool = rabbitmq_pool.ConnectionPool(args.user, args.password, args.host,
+                                        args.port, size=args.connections,
+                                        confirm=args.confirm)
+    # Opens the connections, as a long-running service would have.
+    with contextlib.ExitStack() as stack:
+        for _ in range(args.connections):
+            stack.enter_context(pool.borrow()).declare(args.queue)
+    runs = [("Producer per message", _producer_per_message(args)),
+            ("ConnectionPool.publish()",
+             lambda data: pool.publish(args.queue, data))]
+    for threads in args.threads:
+        for name, publish in runs:
+            _purge(args)
+            rate, latencies = _publish_latencies(args, publish, threads)
+            print("%-36s %9.0f msg/s  p50 %6.2f ms  p99 %6.2f ms" % (
+                "%s, %d threads" % (name, threads), rate,
+                percentile(latencies, 50) * 1e3,
+                percentile(latencies, 99) * 1e3))
+    pool.close()
+    _purge(args)
+
+
+def _document(records):
+    """A JSON document of records like the ones our services publish."""
+    rand = random.Random(0)
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot"]
+    return {
+        "source": "benchmark",
+        "records": [{
+            "id": index,
+            "name": " ".join(rand.choice(words) for _ in range(3)),
+            "score": round(rand.random() * 100, 3),
+            "tags": rand.sample(words, 2),
+            "active": rand.random() < 0.5,
+        } for index in range(records)],
+    }
+
+
+def _codec_rate(args, codec):
+    """Messages per second published with confirms, then consumed."""
+    document = _document(args.records)
+    _purge(args)
+    producer = rabbitmq_async.Producer(args.user, args.password, args.host,
+                                       args.port, args.queue, confirm=True,
+                                       codec=codec)
+    start = timeit.default_timer()
+    producer.publish_batch([document] * args.messages)
+    producer.close()
+    publish_rate = args.messages / (timeit.default_timer() - start)
+    consumer = _CountingConsumer(args, args.messages, codec=codec)
+    start = timeit.default_timer()
+    consumer.consume()
+    return publish_rate, args.messages / (timeit.default_timer() - start)
+
+
+def bench_codec(args):
+    document = _document(args.records)
+    raw = rabbitmq_codec.SERIALIZERS[rabbitmq_codec.JSON][0](document)
+    print("%d messages of a %d byte JSON document" % (args.messages,
+                                                      len(raw)))
+    print("%-22s %9s %10s %10s %10s %10s" % (
+        "codec", "bytes", "encode us", "decode us", "publish/s", "consume/s"))
+    for content_type in sorted(rabbitmq_codec.SERIALIZERS):
+        for compression in [None] + sorted(rabbitmq_codec.COMPRESSORS):
+            codec = rabbitmq_codec.Codec(content_type, compression,
+                                         args.threshold)
+            body, _, content_encoding = codec.encode(document)
+            encode = timeit.timeit(lambda: codec.encode(document),
+                                   number=args.repeat) / args.repeat
+            decode = timeit.timeit(
+                lambda: codec.decode(body, content_type, content_encoding),
+                number=args.repeat) / args.repeat
+            publish_rate, consume_rate = _codec_rate(args, codec)
+            print("%-22s %9d %10.1f %10.1f %10.0f %10.0f" % (
+                "%s %s" % (content_type.split("/")[-1],
+                           content_encoding or "-"),
+                len(body), encode * 1e6, decode * 1e6, publish_rate,
+                consume_rate))
+    _purge(args)
+
+
+def _launch_fake_broker():
+    """Starts fake_broker.py on a free port; returns (process, port).
+
+    A process of its own keeps the broker's CPU out of the measurements.
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(
+            __file__)), "fake_broker.py"), "--port", "0"],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    return process, int(process.stdout.readline())
+
+
+def _consumer_modes(args):
+    """(name, function returning (wall, CPU) seconds) of every consumer."""
+
+    def consume():
+        return _cpu(_CountingConsumer(args, args.messages).consume)
+
+    def consume_parallel():
+        consumer = _SlowConsumer(args, args.messages)
+        return _cpu(lambda: consumer.consume_parallel(args.workers,
+                                                      user_data=0))
+
+    def consume_batches():
+        consumer = _BulkConsumer(args, args.messages)
+        return _cpu(lambda: consumer.consume_batches(args.batch_size,
+                                                     user_data=0))
+
+    return [("consume", consume),
+            ("consume_parallel", consume_parallel),
+            ("consume_batches", consume_batches),
+            ("async", lambda: _loop_consume(args, 1))]
+
+
+def _suite_run(args):
+    """Measures every result once; returns {name: value}."""
+    results = {}
+    args.batch = None
+    results["publish.no_confirm.msg_per_s"] = _publish_rate(args)
+    results["publish.confirm.msg_per_s"] = _publish_rate(args, confirm=True)
+    results["publish.async_confirm.msg_per_s"] = _publish_rate(
+        args, rabbitmq_async.Producer, confirm=True, window=args.window)
+    pool = rabbitmq_pool.ConnectionPool(args.user, args.password, args.host,
+                                        args.port, size=1)
+    _purge(args)
+    results["publish.pool.msg_per_s"] = _publish_latencies(
+        args, lambda data: pool.publish(args.queue, data), 1)[0]
+    pool.close()
+
+    for name, consume in _consumer_modes(args):
+        _purge(args)
+        _fill(args, args.messages)
+        wall, cpu = consume()
+        results["consume.%s.msg_per_s" % name] = args.messages / wall
+        results["consume.%s.us_cpu_per_msg" % name] = (
+            cpu / args.messages * 1e6)
+
+    latencies = {
+        "consume": _idle_latency(args),
+        "async": _idle_latency(args, _LoopConsumer(
+            args, [], args.samples, threading.Event())),
+    }
+    for name, values in latencies.items():
+        for percent in (50, 90, 99):
+            results["latency.%s.p%d_ms" % (name, percent)] = (
+                percentile(values, percent) * 1e3)
+
+    results["idle.heartbeat_thread.cpu_percent"] = (
+        _idle_heartbeat_thread(args) * 100)
+    results["idle.consume.cpu_percent"] = _idle_consume(args) * 100
+    results["idle.async.cpu_percent"] = _idle_event_loop(args) * 100
+    _purge(args)
+    return results
+
+
+# Differences smaller than these are noise, whatever the tolerance, since
+# the baseline values can be close to zero.
+_NOISE = {"cpu_percent": 1.0, "ms": 0.05, "us_cpu_per_msg": 1.0,
+          "msg_per_s": 0.0}
+
+
+def _regressions(results, baseline, tolerance):
+    """(name, baseline value, value) of the results worse than baseline."""
+    worse = []
+    for name in sorted(set(results) & set(baseline)):
+        metric = name.rsplit(".", 1)[1]
+        value, base = results[name], baseline[name]
+        # Rates are better higher, latencies and CPU lower.
+        change = base - value if metric.endswith("per_s") else value - base
+        noise = next(_NOISE[unit] for unit in _NOISE if metric.endswith(unit))
+        if change > abs(base) * tolerance and change > noise:
+            worse.append((name, base, value))
+    return worse
+
+
+def bench_suite(args):
+    runs = []
+    for run in range(args.repeat):
+        print("run %d of %d" % (run + 1, args.repeat))
+        runs.append(_suite_run(args))
+    # The median of the runs, so that one disturbed run does not count.
+    results = dict((name, statistics.median(run[name] for run in runs))
+                   for name in runs[0])
+    report = {
+        "environment": {
+            "broker": "fake_broker" if args.fake else "%s:%d" % (args.host,
+                                                                 args.port),
+            "python": platform.python_version(),
+            "pika": pika.__version__,
+            "platform": platform.platform(),
+        },
+        "parameters": dict((name, getattr(args, name)) for name in (
+            "messages", "size", "repeat", "window", "workers", "batch_size",
+            "samples", "idle")),
+        "results": results,
+    }
+    for name in sorted(results):
+        print("%-44s %12.2f" % (name, results[name]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["parameters"] != report["parameters"]:
+        print("warning: baseline was measured with %s" %
+              baseline["parameters"])
+    worse = _regressions(results, baseline["results"], args.tolerance)
+    for name, base, value in worse:
+        print("REGRESSION %-33s %12.2f -> %.2f" % (name, base, value))
+    return 1 if worse else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5672)
+    parser.add_argument("--user", default="guest")
+    parser.add_argument("--password", default="guest")
+    parser.add_argument("--queue", default="benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=1024,
+                        help="message body bytes")
+    parser.add_argument("--fake", action="store_true",
+                        help="run against fake_broker.py, launched locally, "
+                        "instead of the broker at --host")
+    subparsers = parser.add_subparsers(dest="benchmark")
+    subparsers.required = True
+
+    publish_parser = subparsers.add_parser(
+        "publish", help="publish rate by publisher-confirm window")
+    publish_parser.add_argument("--windows", type=int, nargs="+",
+                                default=[1, 10, 100, 1000])
+    publish_parser.add_argument("--batch", type=int, default=100,
+                                help="also publish in batches of this many, "
+                                "waiting for every confirm of a batch")
+    publish_parser.set_defaults(func=bench_publish)
+
+    consume_parser = subparsers.add_parser(
+        "consume", help="consume rate by prefetch, against start()")
+    consume_parser.add_argument("--prefetch", type=int, nargs="+",
+                                default=[1, 10, 100, 1000])
+    consume_parser.add_argument("--polled", type=int, default=20,
+                                help="messages read with start()")
+    consume_parser.add_argument("--samples", type=int, default=100,
+                                help="messages timed for idle latency")
+    consume_parser.set_defaults(func=bench_consume)
+
+    parallel_parser = subparsers.add_parser(
+        "parallel", help="consume_parallel() against consume() with a slow "
+        "handler")
+    parallel_parser.add_argument("--work", type=float, default=5.0,
+                                 help="milliseconds each message takes")
+    parallel_parser.add_argument("--workers", type=int,
+                                 default=rabbitmq.DEFAULT_WORKERS)
+    parallel_parser.set_defaults(func=bench_parallel)
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="consume_batches() by batch size against consume()")
+    batch_parser.add_argument("--sizes", type=int, nargs="+",
+                              default=[1, 10, 100])
+    batch_parser.add_argument("--call", type=float, default=2.0,
+                              help="milliseconds each handler call takes")
+    batch_parser.set_defaults(func=bench_batch)
+
+    loop_parser = subparsers.add_parser(
+        "loop", help="CPU of rabbitmq_async against the blocking classes")
+    loop_parser.add_argument("--idle", type=float, default=5.0,
+                             help="seconds to measure idle CPU over")
+    loop_parser.add_argument("--channels", type=int, nargs="+",
+                             default=[1, 4, 16],
+                             help="consumers sharing one connection")
+    loop_parser.set_defaults(func=bench_loop)
+
+    pool_parser = subparsers.add_parser(
+        "pool", help="publish latency with a connection pool against a "
+        "Producer per message")
+    pool_parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    pool_parser.add_argument("--connections", type=int,
+                             default=rabbitmq_pool.DEFAULT_POOL_SIZE)
+    pool_parser.add_argument("--confirm", action="store_true",
+                             help="wait for the broker to confirm each "
+                             "message")
+    pool_parser.set_defaults(func=bench_pool)
+
+    codec_parser = subparsers.add_parser(
+        "codec", help="bytes on the wire and message rates by codec")
+    codec_parser.add_argument("--records", type=int, default=200,
+                              help="records in the JSON document published")
+    codec_parser.add_argument("--threshold", type=int,
+                              default=rabbitmq_codec.DEFAULT_THRESHOLD)
+    codec_parser.add_argument("--repeat", type=int, default=200,
+                              help="encodes and decodes timed")
+    codec_parser.set_defaults(func=bench_codec)
+
+    suite_parser = subparsers.add_parser(
+        "suite", help="every rate, latency and CPU measurement, as JSON")
+    suite_parser.add_argument("--repeat", type=int, default=3,
+                              help="runs to take the median of")
+    suite_parser.add_argument("--window", type=int,
+                              default=rabbitmq.DEFAULT_CONFIRM_WINDOW)
+    suite_parser.add_argument("--workers", type=int,
+                              default=rabbitmq.DEFAULT_WORKERS)
+    suite_parser.add_argument("--batch-size", type=int,
+                              default=rabbitmq.DEFAULT_BATCH_SIZE)
+    suite_parser.add_argument("--samples", type=int, default=100,
+                              help="messages timed for idle latency")
+    suite_parser.add_argument("--idle", type=float, default=2.0,
+                              help="seconds to measure idle CPU over")
+    suite_parser.add_argument("--output", help="file to write results to")
+    suite_parser.add_argument("--baseline",
+                              help="results file to compare against")
+    suite_parser.add_argument("--tolerance", type=float, default=0.2,
+                              help="fraction a result may be worse than "
+                              "the baseline by")
+    suite_parser.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    broker = None
+    if args.fake:
+        broker, args.port = _launch_fake_broker()
+        args.host = "127.0.0.1"
+    try:
+        sys.exit(args.func(args))
+    finally:
+        if broker is not None:
+            broker.terminate()
+            broker.wait()
+
+
+if __name__ == '__main__':
+    main()
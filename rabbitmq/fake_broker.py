@@ -0,0 +1,365 @@
+"""A stand-in AMQP 0-9-1 broker for benchmarks and local runs.
+
+Speaks the wire protocol, with the frame codec of pika itself, so the
+real pika connections of rabbitmq.py run against it unchanged.  It keeps
+queues in memory and implements what rabbitmq.py uses: the default
+exchange, durable queue declares and purges, qos, publisher confirms,
+basic_consume and basic_get, acks, nacks and rejects with requeueing,
+and heartbeats.  Settling an unknown delivery tag closes the channel, as
+with RabbitMQ.  It never persists, refuses or drops anything, so it
+measures the client side and not a broker.
+
+Usage:
+  python fake_broker.py --port 5672
+  broker = FakeBroker(); ... broker.port ...; broker.close()
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import socket
+import sys
+import threading
+
+from pika import frame, spec
+
+# Largest frame the broker accepts, as told to clients in Connection.Tune.
+FRAME_MAX = 131072
+# Heartbeat timeout proposed to clients; heartbeats are sent every half.
+HEARTBEAT = 60
+PRECONDITION_FAILED = 406
+
+
+class _Queue(object):
+
+    def __init__(self, name):
+        self.name = name
+        # (body, properties, redelivered), oldest first
+        self.messages = collections.deque()
+        # (channel, consumer tag), served in turn
+        self.consumers = []
+        self.turn = 0
+
+
+class _Channel(object):
+
+    def __init__(self, connection, number):
+        self.connection = connection
+        self.number = number
+        self.prefetch_count = 0
+        # delivery tag -> (queue, body, properties) awaiting an ack
+        self.unacked = collections.OrderedDict()
+        self.delivery_tag = 0
+        self.confirm = False
+        self.published = 0
+        # [Basic.Publish, properties, body size, body fragments] being read
+        self.incoming = None
+
+    def can_take(self):
+        return (not self.prefetch_count or
+                len(self.unacked) < self.prefetch_count)
+
+    def deliver(self, queue, consumer_tag, body, properties, redelivered):
+        self.delivery_tag += 1
+        self.unacked[self.delivery_tag] = (queue, body, properties)
+        self.connection.send(self.number, spec.Basic.Deliver(
+            consumer_tag, self.delivery_tag, redelivered, '', queue.name),
+            properties, body)
+
+
+class FakeBroker(object):
+    """Serves AMQP on host:port, port 0 picking a free one, from threads."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.lock = threading.RLock()
+        self.queues = {}
+        self.socket = socket.socket()
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(128)
+        self.host = host
+        self.port = self.socket.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stops accepting connections."""
+        self.socket.close()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.socket.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            thread = threading.Thread(target=_Connection(self, sock).run)
+            thread.daemon = True
+            thread.start()
+
+    def queue(self, name):
+        if name not in self.queues:
+            self.queues[name] = _Queue(name)
+        return self.queues[name]
+
+    def dispatch(self, queue):
+        """Pushes messages of queue to its consumers with room for them."""
+        while queue.messages:
+            ready = [consumer for consumer in queue.consumers
+                     if consumer[0].can_take()]
+            if not ready:
+                return
+            channel, consumer_tag = ready[queue.turn % len(ready)]
+            queue.turn += 1
+            body, properties, redelivered = queue.messages.popleft()
+            channel.deliver(queue, consumer_tag, body, properties,
+                            redelivered)
+
+    def requeue(self, messages):
+        """Puts (queue, body, properties) back at the head of their queues."""
+        for queue, body, properties in reversed(messages):
+            queue.messages.appendleft((body, properties, True))
+        for queue in set(queue for queue, _, _ in messages):
+            self.dispatch(queue)
+
+
+class _Connection(object):
+
+    def __init__(self, broker, sock):
+        self.broker = broker
+        self.socket = sock
+        self.send_lock = threading.Lock()
+        self.channels = {}
+        self.closed = threading.Event()
+
+    def send(self, number, method, properties=None, body=None):
+        data = [frame.Method(number, method).marshal()]
+        if properties is not None:
+            data.append(frame.Header(number, len(body), properties).marshal())
+            # Each frame has 8 bytes of framing.
+            for start in range(0, len(body), FRAME_MAX - 8):
+                data.append(frame.Body(
+                    number, body[start:start + FRAME_MAX - 8]).marshal())
+        with self.send_lock:
+            try:
+                self.socket.sendall(b''.join(data))
+            except OSError:
+                pass
+
+    def run(self):
+        data = b''
+        try:
+            while True:
+                received = self.socket.recv(65536)
+                if not received:
+                    return
+                data += received
+                while True:
+                    consumed, received_frame = frame.decode_frame(data)
+                    if not consumed:
+                        break
+                    data = data[consumed:]
+                    if self.handle(received_frame) is False:
+                        return
+        except OSError:
+            pass
+        finally:
+            self.closed.set()
+            with self.broker.lock:
+                for channel in list(self.channels.values()):
+                    self.close_channel(channel)
+            self.socket.close()
+
+    def send_heartbeats(self, interval):
+        while not self.closed.wait(interval):
+            with self.send_lock:
+                try:
+                    self.socket.sendall(frame.Heartbeat().marshal())
+                except OSError:
+                    return
+
+    def close_channel(self, channel):
+        for queue in self.broker.queues.values():
+            queue.consumers = [consumer for consumer in queue.consumers
+                               if consumer[0] is not channel]
+        self.broker.requeue(list(channel.unacked.values()))
+        channel.unacked.clear()
+        self.channels.pop(channel.number, None)
+
+    def handle(self, received_frame):
+        """Acts on a frame; returns False once the connection is closed."""
+        if isinstance(received_frame, frame.ProtocolHeader):
+            self.send(0, spec.Connection.Start(
+                server_properties={
+                    'product': 'fake_broker',
+                    'capabilities': {'publisher_confirms': True,
+                                     'basic.nack': True,
+                                     'consumer_cancel_notify': True}},
+                mechanisms=b'PLAIN', locales=b'en_US'))
+            return True
+        if isinstance(received_frame, frame.Heartbeat):
+            return True
+        channel = self.channels.get(received_frame.channel_number)
+        if channel is None and received_frame.channel_number:
+            # Frames on a channel the broker closed, its CloseOk too, are
+            # dropped until the channel is opened again.
+            if (isinstance(received_frame, frame.Method) and
+                    isinstance(received_frame.method, spec.Channel.Open)):
+                return self.handle_method(received_frame.channel_number,
+                                          None, received_frame.method)
+            return True
+        if isinstance(received_frame, frame.Header):
+            channel.incoming[1] = received_frame.properties
+            channel.incoming[2] = received_frame.body_size
+            if not received_frame.body_size:
+                self.publish(channel)
+            return True
+        if isinstance(received_frame, frame.Body):
+            channel.incoming[3].append(received_frame.fragment)
+            if (sum(len(fragment) for fragment in channel.incoming[3]) >=
+                    channel.incoming[2]):
+                self.publish(channel)
+            return True
+        return self.handle_method(received_frame.channel_number, channel,
+                                  received_frame.method)
+
+    def handle_method(self, number, channel, method):
+        broker = self.broker
+        if isinstance(method, spec.Connection.StartOk):
+            self.send(0, spec.Connection.Tune(2047, FRAME_MAX, HEARTBEAT))
+        elif isinstance(method, spec.Connection.Open):
+            self.send(0, spec.Connection.OpenOk())
+        elif isinstance(method, spec.Connection.Close):
+            self.send(0, spec.Connection.CloseOk())
+            return False
+        elif isinstance(method, spec.Channel.Open):
+            self.channels[number] = _Channel(self, number)
+            self.send(number, spec.Channel.OpenOk())
+        elif isinstance(method, spec.Channel.Close):
+            with broker.lock:
+                self.close_channel(channel)
+            self.send(number, spec.Channel.CloseOk())
+        elif isinstance(method, spec.Queue.Declare):
+            with broker.lock:
+                queue = broker.queue(method.queue)
+                self.send(number, spec.Queue.DeclareOk(
+                    method.queue, len(queue.messages), len(queue.consumers)))
+        elif isinstance(method, spec.Queue.Purge):
+            with broker.lock:
+                queue = broker.queue(method.queue)
+                count = len(queue.messages)
+                queue.messages.clear()
+            self.send(number, spec.Queue.PurgeOk(count))
+        elif isinstance(method, spec.Basic.Qos):
+            channel.prefetch_count = method.prefetch_count
+            self.send(number, spec.Basic.QosOk())
+        elif isinstance(method, spec.Confirm.Select):
+            channel.confirm = True
+            self.send(number, spec.Confirm.SelectOk())
+        elif isinstance(method, spec.Basic.Publish):
+            channel.incoming = [method, None, 0, []]
+        elif isinstance(method, spec.Basic.Consume):
+            consumer_tag = method.consumer_tag or 'ctag%d.%d' % (id(self),
+                                                                 number)
+            self.send(number, spec.Basic.ConsumeOk(consumer_tag))
+            with broker.lock:
+                queue = broker.queue(method.queue)
+                queue.consumers.append((channel, consumer_tag))
+                broker.dispatch(queue)
+        elif isinstance(method, spec.Basic.Cancel):
+            with broker.lock:
+                for queue in broker.queues.values():
+                    queue.consumers = [
+                        consumer for consumer in queue.consumers
+                        if consumer[1] != method.consumer_tag]
+            self.send(number, spec.Basic.CancelOk(method.consumer_tag))
+        elif isinstance(method, spec.Basic.Get):
+            self.get(number, channel, method)
+        elif isinstance(method, (spec.Basic.Ack, spec.Basic.Nack,
+                                 spec.Basic.Reject)):
+            self.settle(channel, method)
+        elif isinstance(method, spec.Connection.TuneOk):
+            if method.heartbeat:
+                thread = threading.Thread(target=self.send_heartbeats,
+                                          args=(method.heartbeat / 2.0,))
+                thread.daemon = True
+                thread.start()
+        else:
+            print('fake_broker: ignoring %s' % method.NAME, file=sys.stderr)
+        return True
+
+    def get(self, number, channel, method):
+        with self.broker.lock:
+            queue = self.broker.queue(method.queue)
+            if not queue.messages:
+                self.send(number, spec.Basic.GetEmpty())
+                return
+            body, properties, redelivered = queue.messages.popleft()
+            channel.delivery_tag += 1
+            channel.unacked[channel.delivery_tag] = (queue, body, properties)
+            self.send(number, spec.Basic.GetOk(
+                channel.delivery_tag, redelivered, '', queue.name,
+                len(queue.messages)), properties, body)
+
+    def settle(self, channel, method):
+        with self.broker.lock:
+            if getattr(method, 'multiple', False):
+                tags = [tag for tag in channel.unacked
+                        if tag <= method.delivery_tag]
+            elif method.delivery_tag in channel.unacked:
+                tags = [method.delivery_tag]
+            else:
+                self.close_channel(channel)
+                self.send(channel.number, spec.Channel.Close(
+                    PRECONDITION_FAILED,
+                    'PRECONDITION_FAILED - unknown delivery tag %d' %
+                    method.delivery_tag, method.INDEX >> 16,
+                    method.INDEX & 0xffff))
+                return
+            messages = [channel.unacked.pop(tag) for tag in tags]
+            if isinstance(method, spec.Basic.Ack) or not method.requeue:
+                messages = []
+            self.broker.requeue(messages)
+            # Acks make room under the prefetch count of the channel.
+            for queue in self.broker.queues.values():
+                if any(consumer[0] is channel for consumer in queue.consumers):
+                    self.broker.dispatch(queue)
+
+    def publish(self, channel):
+        method, properties, _, fragments = channel.incoming
+        channel.incoming = None
+        with self.broker.lock:
+            queue = self.broker.queue(method.routing_key)
+            queue.messages.append((b''.join(fragments), properties, False))
+            self.broker.dispatch(queue)
+        if channel.confirm:
+            channel.published += 1
+            self.send(channel.number, spec.Basic.Ack(channel.published))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5672,
+                        help="0 picks a free port")
+    args = parser.parse_args()
+    broker = FakeBroker(args.host, args.port)
+    # The port first, for whoever launched the broker to read.
+    print(broker.port)
+    sys.stdout.flush()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
+import collections
+from concurrent import futures
+import functools
 import pika
+import random
 import time
 import threading
 import logging
 
+import rabbitmq_codec
+
 logger = logging.getLogger("rabbitmq")
 logger.setLevel(level=logging.DEBUG)
 formatter = logging.Formatter('%(asctime)s %(filename)s[line:%(lineno)d] %(levelname)s  %(message)s',
@@ -17,26 +23,137 @@ console_handler.setLevel(logging.DEBUG)
 logger.addHandler(console_handler)
 logger.addHandler(console_handler)
 
+# Messages a confirming rabbitmq_async.Producer publishes before waiting
+# for the broker to confirm the oldest of them.
+DEFAULT_CONFIRM_WINDOW = 1000
+# Unacked messages the broker pushes to a consuming Consumer at a time.
+DEFAULT_PREFETCH = 100
+DEFAULT_WORKERS = 8
+DEFAULT_BATCH_SIZE = 100
+# Seconds consume_batches() waits for a batch to fill.
+DEFAULT_BATCH_WAIT = 0.05
+DEFAULT_CONNECT_ATTEMPTS = 3
+# Seconds of the longest wait before the first retry; doubles every retry.
+DEFAULT_BACKOFF = 0.5
+# What Consumer.decode() returns for a message it rejected.
+REJECTED = object()
+
+
+def connect(user, password, host, port, attempts=DEFAULT_CONNECT_ATTEMPTS,
+            backoff=DEFAULT_BACKOFF):
+    """Opens a BlockingConnection, retrying with exponential backoff.
+
+    Raises:
+      pika.exceptions.AMQPConnectionError: every attempt failed; the error
+        of the last one.
+    """
+    credentials = pika.PlainCredentials(user, password)
+    parameters = pika.ConnectionParameters(host, port, '/', credentials)
+    for attempt in range(attempts):
+        try:
+            return pika.BlockingConnection(parameters)
+        except pika.exceptions.AMQPConnectionError as e:
+            logger.error('pika connection error:%r' % e)
+            if attempt + 1 >= attempts:
+                raise
+            # Full jitter, so that clients cut off together do not all
+            # come back at the same moment.
+            time.sleep(random.uniform(0, backoff * 2 ** attempt))
+
+
+def _handle_encoded(handler, codec, body, content_type, content_encoding,
+                    user_data):
+    return handler(codec.decode(body, content_type, content_encoding),
+                   user_data)
+
+
+class BaseProducer(object):
+    """Encoding shared by Producer and rabbitmq_async.Producer, which set
+    codec.
+    """
 
-class Producer(object):
-    def __init__(self, user, password, host, port, queue):
+    def encode(self, data):
+        """Returns the body and properties to publish data with."""
+        if self.codec is None:
+            return data, pika.BasicProperties(delivery_mode=2)
+        body, content_type, content_encoding = self.codec.encode(data)
+        return body, pika.BasicProperties(delivery_mode=2,
+                                          content_type=content_type,
+                                          content_encoding=content_encoding)
+
+
+class BaseConsumer(object):
+    """Decoding and settling of single messages, shared by Consumer and
+    rabbitmq_async.Consumer, which set codec and requeue.
+    """
+
+    def on_message(self, body, user_data=None):
+        logger.info("current received body is {}, current received user data is {}".format(body, user_data))
+        return True
+
+    def decode(self, channel, method, properties, body):
+        """Returns body decoded by the codec.
+
+        Rejects the message and returns REJECTED if it cannot be decoded;
+        requeueing it would only have it fail again.
+        """
+        if self.codec is None:
+            return body
+        try:
+            return self.codec.decode(body, properties.content_type,
+                                     properties.content_encoding)
+        except rabbitmq_codec.DecodeError as e:
+            logger.error('message %s rejected: %s' % (method.delivery_tag, e))
+            channel.basic_nack(method.delivery_tag, requeue=False)
+            return REJECTED
+
+    def on_delivery(self, channel, method, properties, body, user_data=None):
+        body = self.decode(channel, method, properties, body)
+        if body is REJECTED:
+            return
+        try:
+            ret = self.on_message(body, user_data=user_data)
+        except Exception as e:
+            logger.exception('on_message failed: %s' % e)
+            ret = False
+        if ret is False:
+            channel.basic_nack(method.delivery_tag, requeue=self.requeue)
+        else:
+            channel.basic_ack(method.delivery_tag)
+
+
+class Producer(BaseProducer):
+    """Publishes persistent messages to queue.
+
+    With confirm=True the channel is in publisher-confirm mode: publish()
+    returns once the broker has confirmed the message, and
+    wait_for_confirms() reports the messages the broker refused.  That is
+    a round trip per message; rabbitmq_async.Producer keeps a window of
+    messages awaiting their confirms instead.
+
+    With a rabbitmq_codec.Codec, publish() takes any object the codec
+    serializes and sends it encoded.
+    """
+
+    def __init__(self, user, password, host, port, queue, confirm=False,
+                 codec=None):
         self.user = user
         self.password = password
         self.host = host
         self.port = port
         self.queue = queue
+        self.confirm = confirm
+        self.codec = codec
+        # (delivery tag, body) of the messages the broker refused
+        self.failures = []
+        self.delivery_tag = 0
         self.connection = self.connect()
         self.channel = self.get_channel()
+        if confirm:
+            self.channel.confirm_delivery()
 
     def connect(self):
-        credentials = pika.PlainCredentials(self.user, self.password)
-        parameters = pika.ConnectionParameters(self.host, self.port, '/', credentials)
-        try:
-            connection = pika.BlockingConnection(parameters)
-        except Exception as e:
-            logger.error('pika connection error:%s' % e)
-            connection = None
-        return connection
+        return connect(self.user, self.password, self.host, self.port)
 
     def get_channel(self):
         channel = self.connection.channel()
@@ -44,19 +161,62 @@ class Producer(object):
         return channel
 
     def publish(self, data):
-        self.channel.basic_publish(exchange='',
-                                   routing_key=self.queue,
-                                   body=data,
-                                   properties=pika.BasicProperties(
-                                       delivery_mode=2,
-                                   ))
+        """Publishes data; with confirm=True returns its delivery tag."""
+        body, properties = self.encode(data)
+        try:
+            self.channel.basic_publish(exchange='',
+                                       routing_key=self.queue,
+                                       body=body,
+                                       properties=properties)
+        except (pika.exceptions.NackError,
+                pika.exceptions.UnroutableError) as e:
+            logger.error('message %s was refused by the broker: %r' %
+                         (self.delivery_tag + 1, e))
+            self.failures.append((self.delivery_tag + 1, data))
+        if not self.confirm:
+            return None
+        self.delivery_tag += 1
+        return self.delivery_tag
+
+    def wait_for_confirms(self):
+        """Returns the (delivery tag, body) of the messages the broker
+        refused since the last call.
+
+        Every message is confirmed by the time publish() returns.
+        """
+        failures, self.failures = self.failures, []
+        return failures
+
+    def publish_batch(self, messages):
+        """Publishes messages and waits for their confirms.
+
+        Returns the (delivery tag, body) of the messages the broker nacked.
+        """
+        for data in messages:
+            self.publish(data)
+        return self.wait_for_confirms()
 
     def close(self):
         self.connection.close()
 
 
-class Consumer(object):
-    def __init__(self, user, password, host, port, queue, interval=50):
+class Consumer(BaseConsumer):
+    """Hands the messages of queue to on_message().
+
+    start() reads a single message with basic_get and closes the
+    connection.  consume() keeps the connection and has the broker push up
+    to prefetch_count messages ahead, acking each one once on_message()
+    has handled it, until stop() is called.  consume_parallel() does the
+    same with the messages handled by a pool of workers, and
+    consume_batches() hands on_batch() lists of messages.
+
+    With a rabbitmq_codec.Codec, messages are decoded as their
+    content_type and content_encoding say before they are handed over,
+    and the ones that cannot be are rejected without requeueing.
+    """
+
+    def __init__(self, user, password, host, port, queue, interval=50,
+                 prefetch_count=DEFAULT_PREFETCH, requeue=True, codec=None):
         self.user = user
         self.password = password
         self.host = host
@@ -64,6 +224,12 @@ class Consumer(object):
         self.queue = queue
         self.mutex = threading.Lock()
         self.interval = interval
+        self.prefetch_count = prefetch_count
+        # Whether consume() requeues messages on_message() fails, or drops
+        # them (or dead-letters them when the queue has a dead letter
+        # exchange).
+        self.requeue = requeue
+        self.codec = codec
         self.connection = self.connect()
         self.channel = self.get_channel()
 
@@ -82,19 +248,8 @@ class Consumer(object):
                     self.mutex.release()
                     break
 
-    def on_message(self, body, user_data=None):
-        logger.info("current received body is {}, current received user data is {}".format(body, user_data))
-        return True
-
     def connect(self):
-        credentials = pika.PlainCredentials(self.user, self.password)
-        parameters = pika.ConnectionParameters(self.host, self.port, '/', credentials)
-        try:
-            connection = pika.BlockingConnection(parameters)
-        except Exception as e:
-            logger.error('pika connection error:%s' % e)
-            connection = None
-        return connection
+        return connect(self.user, self.password, self.host, self.port)
 
     def get_channel(self):
         channel = self.connection.channel()
@@ -121,6 +276,9 @@ class Consumer(object):
                 count += 1
             self.mutex.release()
         if method_frame:
+            body = self.decode(self.channel, method_frame, header_frame, body)
+            if body is REJECTED:
+                return False
             ret = self.on_message(body, user_data=user_data)
             if ret is False:
                 return False
@@ -131,4 +289,222 @@ class Consumer(object):
                 logger.debug("=====sending ack done=====")
                 self.connection.close()
                 logger.debug("=====connection closed=====")
-                self.mutex.release()
\ No newline at end of file
+                self.mutex.release()
+
+    def on_batch(self, bodies, user_data=None):
+        """Handles a list of message bodies; see consume_batches().
+
+        By default calls on_message() for each body and reports the ones
+        it returned False for.
+        """
+        return [index for index, body in enumerate(bodies)
+                if self.on_message(body, user_data=user_data) is False]
+
+    def consume(self, user_data=None):
+        """Handles messages as the broker pushes them until stop().
+
+        Heartbeats are answered by start_consuming() itself, so no
+        heartbeat thread is needed.
+        """
+        self.channel.basic_qos(prefetch_count=self.prefetch_count)
+        self.channel.basic_consume(
+            self.queue,
+            lambda channel, method, properties, body: self.on_delivery(
+                channel, method, properties, body, user_data))
+        try:
+            self.channel.start_consuming()
+        finally:
+            if self.connection.is_open:
+                self.connection.close()
+
+    def stop(self):
+        """Makes consume() return; may be called from any thread."""
+        self.connection.add_callback_threadsafe(self.channel.stop_consuming)
+
+    def consume_parallel(self, workers=DEFAULT_WORKERS, handler=None,
+                         processes=False, ordered=False, user_data=None):
+        """Like consume(), with messages handled by a pool of workers.
+
+        handler(body, user_data) defaults to on_message() and must be a
+        picklable function with processes=True.  At most prefetch_count
+        messages are delivered and unacked at a time, which bounds the work
+        queued for the pool.  pika connections are not thread-safe, so
+        workers hand their results back to the connection thread, which
+        sends every ack and nack.  With ordered, messages sharing a routing
+        key are handled one after the other in delivery order.
+        """
+        if handler is None:
+            if processes:
+                raise ValueError('processes=True needs a picklable handler')
+            handler = self.on_message
+        if processes:
+            executor = futures.ProcessPoolExecutor(workers)
+        else:
+            executor = futures.ThreadPoolExecutor(workers)
+        connection = self.connection
+        channel = self.channel
+        # Only used on the connection thread.
+        state = {'handling': 0}
+        # routing key -> messages waiting for the one being handled
+        waiting = {}
+
+        def settle(method, future):
+            state['handling'] -= 1
+            requeue = self.requeue
+            try:
+                ret = future.result()
+            except rabbitmq_codec.DecodeError as e:
+                logger.error('message %s rejected: %s' % (
+                    method.delivery_tag, e))
+                ret = False
+                requeue = False
+            except Exception as e:
+                logger.error('message handler failed: %s' % e)
+                ret = False
+            if ret is False:
+                channel.basic_nack(method.delivery_tag, requeue=requeue)
+            else:
+                channel.basic_ack(method.delivery_tag)
+            if ordered:
+                key = method.routing_key
+                if waiting[key]:
+                    submit(*waiting[key].popleft())
+                else:
+                    del waiting[key]
+
+        def submit(method, properties, body):
+            state['handling'] += 1
+            if self.codec is None:
+                future = executor.submit(handler, body, user_data)
+            else:
+                # Decoded by the worker, off the connection thread.
+                future = executor.submit(
+                    _handle_encoded, handler, self.codec, body,
+                    properties.content_type, properties.content_encoding,
+                    user_data)
+            future.add_done_callback(
+                lambda future: connection.add_callback_threadsafe(
+                    functools.partial(settle, method, future)))
+
+        def on_delivery(channel, method, properties, body):
+            if ordered:
+                key = method.routing_key
+                if key in waiting:
+                    waiting[key].append((method, properties, body))
+                    return
+                waiting[key] = collections.deque()
+            submit(method, properties, body)
+
+        channel.basic_qos(prefetch_count=self.prefetch_count)
+        channel.basic_consume(self.queue, on_delivery)
+        try:
+            channel.start_consuming()
+            # Ack what the workers are still handling before closing.
+            while state['handling']:
+                connection.process_data_events(time_limit=None)
+            for messages in waiting.values():
+                for method, _, _ in messages:
+                    channel.basic_nack(method.delivery_tag, requeue=True)
+        finally:
+            executor.shutdown(wait=True)
+            if connection.is_open:
+                connection.close()
+
+    def consume_batches(self, batch_size=DEFAULT_BATCH_SIZE,
+                        max_wait=DEFAULT_BATCH_WAIT, handler=None,
+                        user_data=None):
+        """Like consume(), handing the messages over in batches.
+
+        handler(bodies, user_data), on_batch() by default, is called with
+        up to batch_size bodies, or fewer once the first of them has waited
+        max_wait seconds.  What it returns decides what happens to the
+        batch:
+
+          None or True: every message is acked, with one multiple ack.
+          False, or raising: every message is nacked, with one multiple
+            nack, and requeued unless requeue is false.
+          a collection of indexes into bodies: those messages are nacked
+            and the others acked.
+          anything else is logged, and the batch nacked as for False.
+
+        The prefetch count is raised to batch_size if it is lower, so that
+        a batch can fill.
+        """
+        if handler is None:
+            handler = self.on_batch
+        connection = self.connection
+        channel = self.channel
+        batch = []
+        timer = []
+
+        def settle(failed):
+            last = batch[-1][0].delivery_tag
+            if failed is True:
+                channel.basic_nack(last, multiple=True, requeue=self.requeue)
+                return
+            failed = set(index for index in failed
+                         if 0 <= index < len(batch))
+            if not failed:
+                channel.basic_ack(last, multiple=True)
+                return
+            first_failed = min(failed)
+            if first_failed > 0:
+                # Everything before the first failure in one ack.
+                channel.basic_ack(batch[first_failed - 1][0].delivery_tag,
+                                  multiple=True)
+            for index in range(first_failed, len(batch)):
+                tag = batch[index][0].delivery_tag
+                if index in failed:
+                    channel.basic_nack(tag, requeue=self.requeue)
+                else:
+                    channel.basic_ack(tag)
+
+        def flush():
+            if timer:
+                connection.remove_timeout(timer.pop())
+            if not batch:
+                return
+            try:
+                ret = handler([body for _, body in batch], user_data)
+            except Exception as e:
+                logger.exception('batch handler failed: %s' % e)
+                ret = False
+            if ret is None or ret is True:
+                failed = ()
+            elif ret is False:
+                failed = True
+            else:
+                try:
+                    failed = list(ret)
+                except TypeError:
+                    failed = None
+                if (failed is None or isinstance(ret, (str, bytes)) or
+                        not all(isinstance(index, int) for index in failed)):
+                    logger.error('batch handler returned %r, not the failed '
+                                 'indexes; nacking the batch' % (ret,))
+                    failed = True
+            settle(failed)
+            del batch[:]
+
+        def on_timeout():
+            timer[:] = []
+            flush()
+
+        def on_delivery(channel, method, properties, body):
+            body = self.decode(channel, method, properties, body)
+            if body is REJECTED:
+                return
+            batch.append((method, body))
+            if len(batch) >= batch_size:
+                flush()
+            elif len(batch) == 1:
+                timer.append(connection.call_later(max_wait, on_timeout))
+
+        channel.basic_qos(prefetch_count=max(self.prefetch_count, batch_size))
+        channel.basic_consume(self.queue, on_delivery)
+        try:
+            channel.start_consuming()
+            flush()
+        finally:
+            if connection.is_open:
+                connection.close()
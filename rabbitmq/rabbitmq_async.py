@@ -0,0 +1,341 @@
+"""Producer and Consumer on a pika SelectConnection event loop.
+
+The classes of rabbitmq.py each own a BlockingConnection, and
+Consumer.start() answers heartbeats from a thread spinning on
+process_data_events().  Here one EventLoop thread runs the ioloop of a
+SelectConnection, which sleeps in select() until a socket is ready or a
+timer is due, and so sends heartbeats, publishes and deliveries without
+polling.  Any number of Producers and Consumers can share one EventLoop,
+each on a channel of its own.
+
+Usage:
+  loop = EventLoop(user, password, host, port)
+  producer = Producer(user, password, host, port, queue, loop=loop)
+  producer.publish(b'...')
+  consumer = MyConsumer(user, password, host, port, queue, loop=loop)
+  consumer.subscribe()
+  ...
+  loop.close()
+
+Callbacks, on_message() included, run on the loop thread and must not
+block it.  The other methods may be called from any thread.
+"""
+
+import collections
+from concurrent import futures
+import functools
+import threading
+
+import pika
+
+import rabbitmq
+
+logger = rabbitmq.logger
+
+# Seconds the broker and the loop wait for each other before giving up on
+# the connection; None takes what the broker proposes.
+DEFAULT_HEARTBEAT = None
+# Seconds a blocking call waits for the broker to answer.
+DEFAULT_TIMEOUT = 30
+
+
+class EventLoop(object):
+    """One connection whose ioloop runs on a daemon thread."""
+
+    def __init__(self, user, password, host, port, heartbeat=DEFAULT_HEARTBEAT,
+                 timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        credentials = pika.PlainCredentials(user, password)
+        parameters = pika.ConnectionParameters(host, port, '/', credentials,
+                                               heartbeat=heartbeat)
+        opened = futures.Future()
+        self.closed = threading.Event()
+
+        def on_open_error(connection, error):
+            opened.set_exception(
+                error if isinstance(error, Exception) else
+                pika.exceptions.AMQPConnectionError(error))
+
+        self.connection = pika.SelectConnection(
+            parameters,
+            on_open_callback=opened.set_result,
+            on_open_error_callback=on_open_error,
+            on_close_callback=self.on_close)
+        self.thread = threading.Thread(target=self.run, name='pika-ioloop')
+        self.thread.daemon = True
+        self.thread.start()
+        try:
+            opened.result(timeout)
+        except Exception as e:
+            logger.error('pika connection error:%r' % e)
+            self.connection.ioloop.add_callback_threadsafe(
+                self.connection.ioloop.stop)
+            self.thread.join(timeout)
+            raise
+
+    def run(self):
+        try:
+            self.connection.ioloop.start()
+        finally:
+            self.closed.set()
+
+    def on_close(self, connection, reason):
+        if not isinstance(reason, pika.exceptions.ConnectionClosedByClient):
+            logger.error('connection closed: %s' % reason)
+        connection.ioloop.stop()
+
+    def in_loop(self):
+        return threading.current_thread() is self.thread
+
+    def call(self, function, *args, **kwargs):
+        """Runs function on the loop thread, after the calls made before."""
+        self.connection.ioloop.add_callback_threadsafe(
+            functools.partial(function, *args, **kwargs))
+
+    def wait(self, start):
+        """Runs start(callback) on the loop and returns what it calls back.
+
+        For the asynchronous pika methods, e.g.
+        loop.wait(lambda callback: channel.basic_qos(callback=callback)).
+        Must not be called from the loop thread.
+        """
+        done = futures.Future()
+
+        def run():
+            try:
+                start(done.set_result)
+            except Exception as e:
+                done.set_exception(e)
+
+        self.call(run)
+        return done.result(self.timeout)
+
+    def channel(self):
+        """Opens a channel on the connection."""
+        channel = self.wait(
+            lambda callback: self.connection.channel(on_open_callback=callback))
+        channel.add_on_close_callback(self.on_channel_close)
+        return channel
+
+    def on_channel_close(self, channel, reason):
+        if not isinstance(reason, pika.exceptions.ChannelClosedByClient):
+            logger.error('channel %s closed: %s' % (channel.channel_number,
+                                                    reason))
+
+    def close(self):
+        """Closes the connection and waits for the loop to stop."""
+        if not self.closed.is_set():
+            def close():
+                if self.connection.is_open:
+                    self.connection.close()
+            self.call(close)
+            self.closed.wait(self.timeout)
+        self.thread.join(self.timeout)
+
+
+class Producer(rabbitmq.BaseProducer):
+    """Publishes persistent messages to queue from any thread.
+
+    Opens an EventLoop of its own unless given one to share.  With
+    confirm=True publish() returns the delivery tag of the message, blocks
+    while window messages await their confirm, and wait_for_confirms()
+    reports the messages the broker refused.  Publishes are written in the
+    order they were made, by the loop thread.  With a codec, messages are
+    encoded as by rabbitmq.Producer, on the publishing thread.
+    """
+
+    def __init__(self, user, password, host, port, queue, confirm=False,
+                 window=rabbitmq.DEFAULT_CONFIRM_WINDOW, loop=None,
+                 codec=None):
+        self.queue = queue
+        self.confirm = confirm
+        self.window = window
+        self.codec = codec
+        self.own_loop = loop is None
+        self.loop = loop or EventLoop(user, password, host, port)
+        self.condition = threading.Condition()
+        # delivery tag -> body of the messages not confirmed yet, oldest first
+        self.unconfirmed = collections.OrderedDict()
+        # (delivery tag, body) of the messages the broker nacked
+        self.failures = []
+        self.delivery_tag = 0
+        self.channel = self.loop.channel()
+        self.channel.add_on_close_callback(self.on_channel_close)
+        self.loop.wait(lambda callback: self.channel.queue_declare(
+            self.queue, durable=True, callback=callback))
+        if confirm:
+            self.loop.wait(lambda callback: self.channel.confirm_delivery(
+                ack_nack_callback=self.on_confirm, callback=callback))
+
+    def on_confirm(self, frame):
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        with self.condition:
+            if method.multiple:
+                tags = []
+                for tag in self.unconfirmed:
+                    if tag > method.delivery_tag:
+                        break
+                    tags.append(tag)
+            else:
+                tags = [method.delivery_tag]
+            for tag in tags:
+                body = self.unconfirmed.pop(tag, None)
+                if not acked:
+                    logger.error('message %s was nacked by the broker' % tag)
+                    self.failures.append((tag, body))
+            self.condition.notify_all()
+
+    def on_channel_close(self, channel, reason):
+        # Wakes the threads waiting for confirms that will never come.
+        with self.condition:
+            self.condition.notify_all()
+
+    def _wait_until(self, predicate):
+        with self.condition:
+            while not predicate():
+                if self.channel.is_closed:
+                    raise pika.exceptions.ChannelWrongStateError(
+                        'channel closed with messages unconfirmed')
+                self.condition.wait()
+
+    def _publish(self, body, properties):
+        if not self.channel.is_open:
+            # Closed after publish() checked it.
+            logger.error('message to %s lost: channel %s is closed' %
+                         (self.queue, self.channel.channel_number))
+            return
+        self.channel.basic_publish(exchange='',
+                                   routing_key=self.queue,
+                                   body=body,
+                                   properties=properties)
+
+    def publish(self, data):
+        """Publishes data; with confirm=True returns its delivery tag.
+
+        Raises:
+          pika.exceptions.ChannelWrongStateError: the channel is closed.
+        """
+        if self.channel.is_closed:
+            raise pika.exceptions.ChannelWrongStateError('channel is closed')
+        body, properties = self.encode(data)
+        if not self.confirm:
+            self.loop.call(self._publish, body, properties)
+            return None
+        if not self.loop.in_loop():
+            # On the loop thread waiting would stop the confirms coming in.
+            self._wait_until(lambda: len(self.unconfirmed) < self.window)
+        with self.condition:
+            # Tags are handed out in the order the loop publishes in.
+            self.delivery_tag += 1
+            self.unconfirmed[self.delivery_tag] = data
+            self.loop.call(self._publish, body, properties)
+            return self.delivery_tag
+
+    def wait_for_confirms(self):
+        """Blocks until every published message is confirmed.
+
+        Returns the (delivery tag, body) of the messages nacked since the
+        last call.  Must not be called from the loop thread.
+        """
+        self._wait_until(lambda: not self.unconfirmed)
+        with self.condition:
+            failures, self.failures = self.failures, []
+        return failures
+
+    def publish_batch(self, messages):
+        """Publishes messages and waits for their confirms.
+
+        Returns the (delivery tag, body) of the messages the broker nacked.
+        """
+        for data in messages:
+            self.publish(data)
+        return self.wait_for_confirms()
+
+    def close(self):
+        """Closes the channel, or the loop if it is the producer's own.
+
+        Messages published before are still sent.
+        """
+        if self.own_loop:
+            self.loop.close()
+        else:
+            self.loop.call(self._close_channel)
+
+    def _close_channel(self):
+        if self.channel.is_open:
+            self.channel.close()
+
+
+class Consumer(rabbitmq.BaseConsumer):
+    """Hands the messages of queue to on_message() on the loop thread.
+
+    subscribe() has the broker push up to prefetch_count messages ahead
+    and acks each one once on_message() has handled it, or nacks it when
+    on_message() returns False or raises.  consume() does the same and
+    blocks until stop() is called.  Opens an EventLoop of its own unless
+    given one to share.  With a codec, messages are decoded as by
+    rabbitmq.Consumer.
+    """
+
+    def __init__(self, user, password, host, port, queue,
+                 prefetch_count=rabbitmq.DEFAULT_PREFETCH, requeue=True,
+                 loop=None, codec=None):
+        self.queue = queue
+        self.prefetch_count = prefetch_count
+        self.requeue = requeue
+        self.codec = codec
+        self.own_loop = loop is None
+        self.loop = loop or EventLoop(user, password, host, port)
+        self.consumer_tag = None
+        self.stopped = threading.Event()
+        self.channel = self.loop.channel()
+        self.channel.add_on_close_callback(
+            lambda channel, reason: self.stopped.set())
+        self.loop.wait(lambda callback: self.channel.queue_declare(
+            self.queue, durable=True, callback=callback))
+        self.loop.wait(lambda callback: self.channel.basic_qos(
+            prefetch_count=self.prefetch_count, callback=callback))
+
+    def subscribe(self, user_data=None):
+        """Starts handing messages to on_message() and returns."""
+        self.stopped.clear()
+        self.consumer_tag = self.loop.wait(
+            lambda callback: self.channel.basic_consume(
+                self.queue,
+                lambda channel, method, properties, body: self.on_delivery(
+                    channel, method, properties, body, user_data),
+                callback=callback)).method.consumer_tag
+
+    def consume(self, user_data=None):
+        """Handles messages until stop(), then closes."""
+        self.subscribe(user_data)
+        try:
+            self.stopped.wait()
+        finally:
+            self.close()
+
+    def stop(self):
+        """Stops deliveries; may be called from any thread.
+
+        The broker requeues the messages it had sent ahead.
+        """
+        def cancel():
+            if self.channel.is_open and self.consumer_tag is not None:
+                self.channel.basic_cancel(
+                    self.consumer_tag,
+                    callback=lambda frame: self.stopped.set())
+            else:
+                self.stopped.set()
+        self.loop.call(cancel)
+
+    def close(self):
+        """Closes the channel, or the loop if it is the consumer's own."""
+        if self.own_loop:
+            self.loop.close()
+        else:
+            self.loop.call(self._close_channel)
+
+    def _close_channel(self):
+        if self.channel.is_open:
+            self.channel.close()
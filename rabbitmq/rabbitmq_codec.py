@@ -0,0 +1,143 @@
+"""Message body encoding for rabbitmq.py, negotiated through AMQP properties.
+
+A Codec serializes what is published (JSON, or msgpack) and compresses
+bodies of at least threshold bytes (zlib, zstd or lz4), and records both
+in the content_type and content_encoding properties of the message.
+Decoding reads those properties alone, so a consumer handles messages
+from producers with any codec, and raw ones without a content_type.
+
+msgpack, zstd (the zstandard package) and lz4 are used when installed.
+"""
+
+import json
+import threading
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+# Bodies published as bytes, which are compressed but not serialized.
+BINARY = 'application/octet-stream'
+
+# Bodies smaller than this many bytes are sent uncompressed, since
+# compressing them saves little and costs a call each way.
+DEFAULT_THRESHOLD = 1024
+
+
+class DecodeError(ValueError):
+    """A body could not be decoded as its properties say."""
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+def _msgpack_dumps(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _msgpack_loads(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+# zstd contexts are costly to make and may not be shared between threads.
+_zstd = threading.local()
+
+
+def _zstd_compress(data):
+    if not hasattr(_zstd, 'compressor'):
+        _zstd.compressor = zstandard.ZstdCompressor()
+    return _zstd.compressor.compress(data)
+
+
+def _zstd_decompress(data):
+    if not hasattr(_zstd, 'decompressor'):
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.decompressor.decompress(data)
+
+
+# content_type -> (serialize, deserialize)
+SERIALIZERS = {JSON: (_json_dumps, json.loads)}
+if msgpack is not None:
+    SERIALIZERS[MSGPACK] = (_msgpack_dumps, _msgpack_loads)
+# content_encoding -> (compress, decompress)
+COMPRESSORS = {'zlib': (zlib.compress, zlib.decompress)}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = (_zstd_compress, _zstd_decompress)
+if lz4 is not None:
+    COMPRESSORS['lz4'] = (lz4.frame.compress, lz4.frame.decompress)
+
+
+def decode(body, content_type, content_encoding):
+    """Returns the object in body, or body itself for unknown types.
+
+    Raises:
+      DecodeError: the encoding is unknown or the body is corrupt.
+    """
+    try:
+        if content_encoding:
+            if content_encoding not in COMPRESSORS:
+                raise DecodeError('unsupported content encoding %r' %
+                                  content_encoding)
+            body = COMPRESSORS[content_encoding][1](body)
+        if content_type in SERIALIZERS:
+            return SERIALIZERS[content_type][1](body)
+    except DecodeError:
+        raise
+    except Exception as e:
+        raise DecodeError('cannot decode %s body: %s' % (
+            '/'.join(filter(None, (content_type, content_encoding))), e))
+    return body
+
+
+class Codec(object):
+    """Serializes with content_type, and compresses with compression
+    bodies of at least threshold bytes.
+
+    Holds names only, so that it can be sent to worker processes.
+    """
+
+    def __init__(self, content_type=JSON, compression='zlib',
+                 threshold=DEFAULT_THRESHOLD):
+        if content_type not in SERIALIZERS:
+            raise ValueError('no serializer for %s; is it installed?' %
+                             content_type)
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError('%s compression is not available' % compression)
+        self.content_type = content_type
+        self.compression = compression
+        self.threshold = threshold
+
+    def encode(self, obj):
+        """Returns (body, content_type, content_encoding) for obj.
+
+        bytes are sent as they are, compressed if they are large enough.
+        """
+        if isinstance(obj, bytes):
+            body = obj
+            content_type = BINARY
+        else:
+            body = SERIALIZERS[self.content_type][0](obj)
+            content_type = self.content_type
+        if self.compression is not None and len(body) >= self.threshold:
+            compressed = COMPRESSORS[self.compression][0](body)
+            # Incompressible bodies are not worth decompressing.
+            if len(compressed) < len(body):
+                return compressed, content_type, self.compression
+        return body, content_type, None
+
+    def decode(self, body, content_type, content_encoding):
+        return decode(body, content_type, content_encoding)
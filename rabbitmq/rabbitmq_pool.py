@@ -0,0 +1,279 @@
+"""A process-wide pool of RabbitMQ connections to publish through.
+
+Opening a BlockingConnection takes a TCP handshake, the AMQP handshake
+and a channel open, several round trips before the first message can go
+out.  ConnectionPool keeps up to size connections open, each with its
+channel, and publish() borrows one that is already open, so a service
+publishing per request pays for a connection once per process instead of
+once per request.
+
+pika connections are not thread-safe, so a borrowed connection and its
+channel belong to the borrowing thread until they are given back; size
+also bounds how many threads publish at the same time.  Idle connections
+are checked every check_interval seconds, which also sends their
+heartbeats, and a connection found closed is replaced, with exponential
+backoff, the next time one is needed.
+
+Usage:
+  pool = shared_pool(user, password, host, port)
+  pool.publish(queue, b'...')
+"""
+
+import collections
+import contextlib
+import copy
+import os
+import random
+import threading
+import time
+
+import pika
+
+import rabbitmq
+
+logger = rabbitmq.logger
+
+DEFAULT_POOL_SIZE = 8
+# Seconds a connection may sit idle before it is checked.  Well below the
+# heartbeat timeout the broker proposes, 60 seconds by default.
+DEFAULT_CHECK_INTERVAL = 10
+
+# Errors after which publish() tries again on another connection.  The
+# connection or channel is gone, not refused by the broker.
+RETRYABLE_ERRORS = (pika.exceptions.AMQPConnectionError,
+                    pika.exceptions.ChannelWrongStateError)
+
+
+class PooledConnection(object):
+    """A connection and its channel, as lent out by ConnectionPool."""
+
+    def __init__(self, connection, confirm=False):
+        self.connection = connection
+        self.channel = connection.channel()
+        if confirm:
+            self.channel.confirm_delivery()
+        # Queues declared on this channel, to declare each one once.
+        self.declared = set()
+        self.used = time.monotonic()
+
+    def is_open(self):
+        return self.connection.is_open and self.channel.is_open
+
+    def check(self):
+        """Whether the connection still works; sends a due heartbeat."""
+        if not self.is_open():
+            return False
+        try:
+            self.connection.process_data_events(0)
+        except pika.exceptions.AMQPError as e:
+            logger.warning('pooled connection failed its check: %r' % e)
+            return False
+        self.used = time.monotonic()
+        return self.is_open()
+
+    def declare(self, queue):
+        if queue not in self.declared:
+            self.channel.queue_declare(queue=queue, durable=True)
+            self.declared.add(queue)
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except pika.exceptions.AMQPError:
+            pass
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of up to size open connections to one broker.
+
+    Connections are opened as they are first needed.  With confirm=True
+    their channels are in publisher-confirm mode, so publish() returns once
+    the broker has the message.  With a codec, messages are encoded as by
+    rabbitmq.Producer.
+    """
+
+    def __init__(self, user, password, host, port, size=DEFAULT_POOL_SIZE,
+                 confirm=False, retries=2, backoff=rabbitmq.DEFAULT_BACKOFF,
+                 check_interval=DEFAULT_CHECK_INTERVAL, codec=None):
+        self.user = user
+        self.password = password
+        self.host = host
+        self.port = port
+        self.size = size
+        self.confirm = confirm
+        self.retries = retries
+        self.backoff = backoff
+        self.check_interval = check_interval
+        self.codec = codec
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        # Idle connections, most recently used last.
+        self._idle = collections.deque()
+        # Connections idle, lent out or being opened.
+        self._count = 0
+        self._closed = threading.Event()
+        # Connections found broken and closed.
+        self.dropped = 0
+        if check_interval:
+            thread = threading.Thread(target=self._check_idle)
+            thread.daemon = True
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _take(self, timeout):
+        """Returns an idle connection, or None for the caller to open one."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed.is_set():
+                    raise RuntimeError('connection pool is closed')
+                if self._idle:
+                    return self._idle.pop()
+                if self._count < self.size:
+                    self._count += 1
+                    return None
+                remaining = (None if deadline is None
+                             else deadline - time.monotonic())
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError('no connection free within %s seconds'
+                                       % timeout)
+                self._condition.wait(remaining)
+
+    def _give_back(self, pooled):
+        with self._condition:
+            if pooled.is_open() and not self._closed.is_set():
+                pooled.used = time.monotonic()
+                self._idle.append(pooled)
+                pooled = None
+            else:
+                if not self._closed.is_set():
+                    self.dropped += 1
+                self._count -= 1
+            self._condition.notify()
+        if pooled is not None:
+            pooled.close()
+
+    def _open(self):
+        try:
+            return PooledConnection(
+                # publish() does the retrying.
+                rabbitmq.connect(self.user, self.password, self.host,
+                                 self.port, attempts=1),
+                self.confirm)
+        except BaseException:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise
+
+    @contextlib.contextmanager
+    def borrow(self, timeout=None):
+        """Lends out an open PooledConnection to the calling thread.
+
+        Blocks while all size connections are lent out, up to timeout
+        seconds.  The connection is given back when the block ends, or
+        closed if it failed.
+
+        Raises:
+          TimeoutError: no connection was given back within timeout.
+          pika.exceptions.AMQPConnectionError: opening one failed.
+        """
+        pooled = self._take(timeout)
+        if pooled is not None:
+            stale = (self.check_interval and
+                     time.monotonic() - pooled.used > self.check_interval)
+            if not (pooled.check() if stale else pooled.is_open()):
+                pooled.close()
+                pooled = None
+                with self._condition:
+                    self.dropped += 1
+        if pooled is None:
+            pooled = self._open()
+        try:
+            yield pooled
+        finally:
+            self._give_back(pooled)
+
+    def publish(self, queue, data, properties=None, timeout=None):
+        """Publishes a persistent message to queue on a pooled connection.
+
+        If no connection can be opened, or the one borrowed turns out to
+        be broken, publishing is tried again up to retries times with
+        backoff.  A message may then reach the queue twice.
+
+        Raises:
+          pika.exceptions.NackError: confirm is on and the broker refused
+            the message.
+          pika.exceptions.AMQPConnectionError: the last attempt failed.
+        """
+        if properties is None:
+            properties = pika.BasicProperties(delivery_mode=2)
+        if self.codec is not None:
+            data, content_type, content_encoding = self.codec.encode(data)
+            properties = copy.copy(properties)
+            properties.content_type = content_type
+            properties.content_encoding = content_encoding
+        for attempt in range(self.retries + 1):
+            try:
+                with self.borrow(timeout) as pooled:
+                    pooled.declare(queue)
+                    pooled.channel.basic_publish(exchange='',
+                                                 routing_key=queue,
+                                                 body=data,
+                                                 properties=properties)
+                return
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning('publish failed, retrying: %r' % e)
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _check_idle(self):
+        while not self._closed.wait(self.check_interval):
+            now = time.monotonic()
+            with self._condition:
+                due = [pooled for pooled in self._idle
+                       if now - pooled.used >= self.check_interval]
+                for pooled in due:
+                    self._idle.remove(pooled)
+            for pooled in due:
+                if not pooled.check():
+                    pooled.close()
+                self._give_back(pooled)
+
+    def close(self):
+        """Closes the idle connections, and the others once given back."""
+        self._closed.set()
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._count -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            pooled.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(user, password, host, port, **pool_args):
+    """Returns the pool of this process for the broker at host:port.
+
+    The pool is made by the first call, with its pool_args.  A child
+    process gets a pool of its own, since connections opened before a
+    fork cannot be used by both processes.
+    """
+    key = (user, host, port)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = ConnectionPool(user, password, host, port, **pool_args)
+            _pools[key] = pool
+        return pool